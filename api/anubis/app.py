@@ -9,7 +9,7 @@ def init_services(app: Flask):
     :return:
     """
     from anubis.models import db
-    from anubis.utils.cache import cache
+    from anubis.utils.cache import cache, init_cache_invalidation
     from anubis.utils.exceptions import add_app_exception_handlers
     from anubis.utils.migrate import migrate
     from anubis.utils.healthcheck import add_healthcheck
@@ -18,6 +18,7 @@ def init_services(app: Flask):
     # Init services
     db.init_app(app)
     cache.init_app(app)
+    init_cache_invalidation()
     migrate.init_app(app, db)
     add_app_exception_handlers(app)
     add_healthcheck(app)
@@ -85,3 +86,24 @@ def create_pipeline_app() -> Flask:
     register_pipeline_views(app)
 
     return app
+
+
+def create_job_app() -> Flask:
+    """
+    Create a Flask app instance for running jobs
+
+    This app will have the basic services (db and cache), but
+    no views. Jobs only need the app for its context.
+
+    :return: Flask app
+    """
+    from anubis.env import env
+
+    # Create app
+    app = Flask(__name__)
+    app.config.from_object(env)
+
+    # Initialize app with all the extra services
+    init_services(app)
+
+    return app
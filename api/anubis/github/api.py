@@ -1,10 +1,51 @@
+import hashlib
+import json
 import os
+import time
 import traceback
-from typing import Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, TypeVar
 
 import requests
+from flask import current_app
+from redis.exceptions import RedisError
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+from anubis.utils.config import get_config_int
+from anubis.utils.data import is_job
 from anubis.utils.logging import logger, verbose_call
+from anubis.utils.redis import redis
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# resource (core, graphql, ...) -> "remaining:reset"
+_RATE_LIMIT_KEY = "anubis-github-rate-limit"
+
+# Cached GET responses are kept for a day
+_ETAG_CACHE_PREFIX = "anubis-github-etag-"
+_ETAG_CACHE_TTL = 24 * 60 * 60
+
+
+def _create_github_session() -> requests.Session:
+    # Connections are pooled and reused across calls (and threads). Server
+    # errors and connection failures are retried with backoff.
+    retry = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=(500, 502, 503, 504),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    return session
+
+
+_session = _create_github_session()
 
 
 def get_github_token() -> str | None:
@@ -18,6 +59,89 @@ def get_github_token() -> str | None:
 
     return token
 
+
+def _record_rate_limit(r: requests.Response):
+    remaining = r.headers.get("X-RateLimit-Remaining", None)
+    reset = r.headers.get("X-RateLimit-Reset", None)
+    if remaining is None or reset is None:
+        return
+
+    resource = r.headers.get("X-RateLimit-Resource", "core")
+    try:
+        redis.hset(_RATE_LIMIT_KEY, resource, f"{remaining}:{reset}")
+    except RedisError as e:
+        logger.warning(f"Unable to record github rate limit {e}")
+
+
+def get_github_rate_limits() -> dict[str, dict[str, int]]:
+    """
+    Get the last rate limit budget github reported for each resource.
+
+    response = {
+      "core": {"remaining": 4200, "reset": 1700000000},
+      "graphql": {...},
+    }
+
+    :return:
+    """
+    try:
+        limits = redis.hgetall(_RATE_LIMIT_KEY)
+    except RedisError as e:
+        logger.warning(f"Unable to get github rate limit {e}")
+        return {}
+
+    budgets = {}
+    for resource, value in limits.items():
+        remaining, reset = value.decode().split(":")
+        budgets[resource.decode()] = {"remaining": int(remaining), "reset": int(reset)}
+    return budgets
+
+
+def _wait_for_rate_limit(resource: str):
+    """
+    Background jobs hold off once the rate limit budget drops below
+    GITHUB_RATE_LIMIT_RESERVE, until github resets it. The reserve is left
+    for the interactive (request) path, which is never held up.
+
+    :param resource:
+    :return:
+    """
+    if not is_job():
+        return
+
+    reserve = get_config_int("GITHUB_RATE_LIMIT_RESERVE", default=500)
+    while True:
+        budget = get_github_rate_limits().get(resource, None)
+        if budget is None or budget["remaining"] > reserve:
+            return
+
+        wait = budget["reset"] - time.time()
+        if wait <= 0:
+            return
+
+        logger.warning(f"Github {resource} rate limit at {budget['remaining']}, waiting {wait:.0f}s for reset")
+        time.sleep(min(wait, 60))
+
+
+def _get_etag_cache(url: str) -> dict[bytes, bytes]:
+    try:
+        return redis.hgetall(_ETAG_CACHE_PREFIX + hashlib.sha256(url.encode()).hexdigest())
+    except RedisError as e:
+        logger.warning(f"Unable to get github etag cache {e}")
+        return {}
+
+
+def _set_etag_cache(url: str, etag: str, content: bytes):
+    key = _ETAG_CACHE_PREFIX + hashlib.sha256(url.encode()).hexdigest()
+    try:
+        with redis.pipeline() as pipe:
+            pipe.hset(key, mapping={"etag": etag, "content": content})
+            pipe.expire(key, _ETAG_CACHE_TTL)
+            pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Unable to set github etag cache {e}")
+
+
 @verbose_call()
 def github_rest(url, body=None, method: str = "get", api_domain: str = "api.github.com", accept: str = "application/vnd.github.v3+json") -> dict | bytes | None:
     # Get the github api token
@@ -29,23 +153,40 @@ def github_rest(url, body=None, method: str = "get", api_domain: str = "api.gith
         "Authorization": f"token {token}",
     }
 
-    req_function = {
-        "put": requests.put,
-        "get": requests.get,
-        "del": requests.delete,
-        "delete": requests.delete,
+    method = {
+        "put": "PUT",
+        "get": "GET",
+        "del": "DELETE",
+        "delete": "DELETE",
     }[method.lower()]
 
+    # Make GETs conditional on the last response we got. A 304 does
+    # not count against the rate limit.
+    cached = {}
+    if method == "GET":
+        cached = _get_etag_cache(f"{accept} {url}")
+        if b"etag" in cached:
+            headers["If-None-Match"] = cached[b"etag"].decode()
+
+    _wait_for_rate_limit("core")
+
     r = None
     try:
         if body is not None:
-            r: requests.Response = req_function(url, headers=headers, json=body)
+            r: requests.Response = _session.request(method, url, headers=headers, json=body)
         else:
-            r: requests.Response = req_function(url, headers=headers)
+            r: requests.Response = _session.request(method, url, headers=headers)
+        _record_rate_limit(r)
+
+        if r.status_code == 304 and b"content" in cached:
+            return json.loads(cached[b"content"])
+
         is_json = 'Content-Type' in r.headers and 'application/json' in r.headers.get('Content-Type')
         if is_json:
             if r.status_code == 204:
                 return dict()
+            if method == "GET" and r.status_code == 200 and "ETag" in r.headers:
+                _set_etag_cache(f"{accept} {url}", r.headers["ETag"], r.content)
             return r.json()
         else:
             return r.content
@@ -70,9 +211,13 @@ def github_graphql(query: str, variables: dict[str, Any] = None) -> dict[str, An
     json = {"query": query, "variables": variables}
     headers = {"Authorization": "token %s" % token}
 
+    _wait_for_rate_limit("graphql")
+
     # Make the graph request over http
+    r = None
     try:
-        r = requests.post(url=url, json=json, headers=headers)
+        r = _session.post(url=url, json=json, headers=headers)
+        _record_rate_limit(r)
         return r.json()["data"]
     except KeyError as e:
         logger.error(traceback.format_exc())
@@ -82,3 +227,34 @@ def github_graphql(query: str, variables: dict[str, Any] = None) -> dict[str, An
         logger.error(traceback.format_exc())
         logger.error(f"Request to github api Failed {e}")
         return None
+
+
+def github_batch(function: Callable[[T], R], items: Iterable[T], workers: int = None) -> list[R]:
+    """
+    Call function for each item concurrently (on GITHUB_BATCH_WORKERS
+    threads), returning the results in order. This is meant for per-repo
+    github calls. Each call gets an app context, but should not use the
+    database session.
+
+    >>> github_batch(lambda repo: list_collaborators(org, repo), repo_names)
+
+    :param function:
+    :param items:
+    :param workers:
+    :return:
+    """
+    items = list(items)
+    if len(items) == 0:
+        return []
+
+    if workers is None:
+        workers = get_config_int("GITHUB_BATCH_WORKERS", default=8)
+
+    app = current_app._get_current_object()
+
+    def _call(item: T) -> R:
+        with app.app_context():
+            return function(item)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="github-batch") as executor:
+        return list(executor.map(_call, items))
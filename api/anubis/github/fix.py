@@ -5,6 +5,7 @@ from sqlalchemy.sql import or_
 
 from anubis.github.api import github_graphql
 from anubis.github.repos import create_assignment_student_repo
+from anubis.lms.repo_index import index_repos
 from anubis.models import Assignment, AssignmentRepo, Submission, User, db
 from anubis.utils.logging import logger
 
@@ -41,7 +42,8 @@ def fix_github_broken_repos():
 def fix_github_missing_submissions(org_name: str):
     from anubis.lms.submissions import init_submission
     from anubis.lms.webhook import check_repo, guess_github_repo_owner
-    from anubis.rpc.enqueue import enqueue_autograde_pipeline
+    from anubis.k8s.pipeline.scheduler import PRIORITY_BULK_REGRADE
+    from anubis.rpc.enqueue import enqueue_autograde_pipeline, enqueue_autograde_pipelines
 
     # Do graphql nonsense
     # Refer to here for graphql over https: https://graphql.org/learn/serving-over-http/
@@ -139,7 +141,7 @@ def fix_github_missing_submissions(org_name: str):
                             db.session.commit()
                             init_submission(submission)
                             if submission.assignment.autograde_enabled:
-                                enqueue_autograde_pipeline(submission.id)
+                                enqueue_autograde_pipeline(submission.id, priority=PRIORITY_BULK_REGRADE)
                         except sqlalchemy.exc.IntegrityError:
                             db.session.rollback()
                             logger.warning(f'Failed to create submission that already exists {user.netid=} {assignment=} {commit=}')
@@ -157,8 +159,8 @@ def fix_github_missing_submissions(org_name: str):
                         enqueue_submission_pipelines.append(submission.id)
 
                     db.session.commit()
-                    for sid in enqueue_submission_pipelines:
-                        enqueue_autograde_pipeline(sid)
+                    index_repos([r])
+                    enqueue_autograde_pipelines(enqueue_submission_pipelines, priority=PRIORITY_BULK_REGRADE)
 
             if repo:
                 print(f"checked repo: {repo_name} {user.github_username} {user} {repo.id}")
@@ -1,13 +1,24 @@
 import json
+import random
 import re
 import string
+import time
 import traceback
+from typing import Any, Callable
 
-from anubis.github.api import github_graphql, github_rest
+from redis.exceptions import RedisError
+from sqlalchemy.orm import joinedload
+
+from anubis.github.api import github_batch, github_graphql, github_rest
+from anubis.lms.autograde import delete_best_submissions
+from anubis.lms.repo_index import index_repos, unindex_repo
 from anubis.models import Assignment, AssignmentRepo, Submission, SubmissionBuild, SubmissionTestResult, User, db
 from anubis.rpc.safety_nets import create_repo_safety_net
+from anubis.utils.cache import bulk_cache_tags, cache_tag
+from anubis.utils.config import get_config_int
 from anubis.utils.data import is_debug
 from anubis.utils.logging import logger
+from anubis.utils.redis import redis
 
 
 def _split_github_object_org_repo(object_str: str, object_re: re.Pattern) -> tuple[str, str] | None:
@@ -99,6 +110,11 @@ def add_collaborator(github_org: str, repo_name: str, github_username: str) -> d
     )
 
 
+def github_repo_exists(github_org: str, repo_name: str) -> bool:
+    data = github_rest(f"/repos/{github_org}/{repo_name}", method="get")
+    return isinstance(data, dict) and "id" in data
+
+
 def list_collaborators(github_org: str, repo_name: str) -> list[str]:
     return [
         collaborator.get('login', None)
@@ -109,6 +125,52 @@ def list_collaborators(github_org: str, repo_name: str) -> list[str]:
     ]
 
 
+def list_collaborators_batch(repos: list[tuple[str, str]]) -> dict[tuple[str, str], list[str]]:
+    """
+    List the collaborators of many repos with aliased graphql queries,
+    GITHUB_GRAPHQL_BATCH_SIZE repos per request. Only the first 100
+    collaborators of each repo are listed. Repos that could not be
+    read are left out of the response.
+
+    response = {
+      (github_org, repo_name): [github_username, ...],
+    }
+
+    :param repos: list of (github_org, repo_name)
+    :return:
+    """
+    batch_size = get_config_int('GITHUB_GRAPHQL_BATCH_SIZE', default=50)
+
+    collaborators: dict[tuple[str, str], list[str]] = {}
+    for start in range(0, len(repos), batch_size):
+        batch = repos[start:start + batch_size]
+
+        # One aliased repository field per repo, with the names passed as variables
+        params = ', '.join(f'$o{i}: String!, $n{i}: String!' for i in range(len(batch)))
+        fields = '\n'.join(
+            f'r{i}: repository(owner: $o{i}, name: $n{i}) {{ collaborators(first: 100) {{ nodes {{ login }} }} }}'
+            for i in range(len(batch))
+        )
+        variables = {}
+        for i, (github_org, repo_name) in enumerate(batch):
+            variables[f'o{i}'] = github_org
+            variables[f'n{i}'] = repo_name
+
+        data = github_graphql(f'query githubCollaborators({params}) {{\n{fields}\n}}', variables)
+        if data is None:
+            logger.error(f'Unable to list collaborators for {len(batch)} repos')
+            continue
+
+        for i, repo in enumerate(batch):
+            repository = data.get(f'r{i}', None)
+            if repository is None or repository.get('collaborators', None) is None:
+                logger.warning(f'Unable to list collaborators for {repo[0]}/{repo[1]}')
+                continue
+            collaborators[repo] = [node['login'] for node in repository['collaborators']['nodes']]
+
+    return collaborators
+
+
 def get_github_repo_default_branch(github_org: str, repo_name: str) -> str:
     repo_information = github_rest(f'/repos/{github_org}/{repo_name}')
     logger.debug(f'repo_information = {json.dumps(repo_information, indent=2)}')
@@ -186,26 +248,34 @@ def delete_assignment_repo(user: User, assignment: Assignment, commit: bool = Tr
         submission_ids = list(map(lambda x: x.id, submissions))
         logger.info(f'Deleting submissions len = {len(submission_ids)}')
 
-        # Go through all the submissions, deleting builds
-        # and tests as we go
-        logger.info(f'Deleting submission builds')
-        SubmissionBuild.query.filter(SubmissionBuild.submission_id.in_(submission_ids)).delete()
-
-        logger.info(f'Deleting submission results')
-        SubmissionTestResult.query.filter(SubmissionTestResult.submission_id.in_(submission_ids)).delete()
-
-        # Delete submissions themselves
-        logger.info(f'Deleting submissions')
-        Submission.query.filter(
-            Submission.id.in_(submission_ids),
-        ).delete()
-
-        # Parse out github org and repo_name from url before deletion
-        github_org, repo_name = split_github_repo_url(repo.repo_url)
-
-        # Delete the repo
-        logger.info(f'Deleting assignment repo db record')
-        AssignmentRepo.query.filter(AssignmentRepo.id == repo.id).delete(synchronize_session=False)
+        # Everything deleted here belongs to this student and assignment
+        with bulk_cache_tags(
+            cache_tag("user", user.id),
+            cache_tag("assignment", assignment.id),
+            *(cache_tag("submission", submission_id) for submission_id in submission_ids),
+        ):
+            # Go through all the submissions, deleting builds
+            # and tests as we go
+            logger.info(f'Deleting submission builds')
+            SubmissionBuild.query.filter(SubmissionBuild.submission_id.in_(submission_ids)).delete()
+
+            logger.info(f'Deleting submission results')
+            delete_best_submissions(submission_ids)
+            SubmissionTestResult.query.filter(SubmissionTestResult.submission_id.in_(submission_ids)).delete()
+
+            # Delete submissions themselves
+            logger.info(f'Deleting submissions')
+            Submission.query.filter(
+                Submission.id.in_(submission_ids),
+            ).delete()
+
+            # Parse out github org and repo_name from url before deletion
+            github_org, repo_name = split_github_repo_url(repo.repo_url)
+
+            # Delete the repo
+            logger.info(f'Deleting assignment repo db record')
+            unindex_repo(repo.repo_url)
+            AssignmentRepo.query.filter(AssignmentRepo.id == repo.id).delete(synchronize_session=False)
 
         if commit:
             # Commit the deletes
@@ -264,46 +334,10 @@ def _create_assignment_repo_obj(
         if commit:
             db.session.commit()
 
-    return repo
-
-
-def create_assignment_group_repo(users: list[User], assignment: Assignment) -> tuple[list[AssignmentRepo], list[str]]:
-    """
-    This function takes a list of users and an assignment, and creates a single
-    assignment repo for the group. This will create an AssignmentRepo entry for
-    each student, but only one will be returned.
+    if commit:
+        index_repos([repo])
 
-    :param users:
-    :param assignment:
-    :return:
-    """
-
-    # Get a generated assignment repo name
-    new_repo_name = get_group_assignment_repo_name(users, assignment)
-    new_repo_url = get_group_assignment_repo_url(users, assignment)
-
-    # Create the assignment repo row in the db
-    repos: list[AssignmentRepo] = []
-    for user in users:
-        # Create repo db entry
-        repo = _create_assignment_repo_obj(user, assignment, new_repo_url, commit=False)
-
-        # Mark repo as shared
-        repo.shared = True
-
-        repos.append(repo)
-
-    db.session.commit()
-
-    # Create the assignment repo
-    repos, errors = create_assignment_github_repo(
-        repos,
-        assignment.github_template,
-        assignment.course.github_org,
-        new_repo_name,
-    )
-
-    return repos, errors
+    return repo
 
 
 def create_assignment_student_repo(user: User, assignment: Assignment) -> tuple[AssignmentRepo, list[str]]:
@@ -324,6 +358,279 @@ def create_assignment_student_repo(user: User, assignment: Assignment) -> tuple[
     return repos[0], errors
 
 
+def _provision_progress_key(assignment_id: str) -> str:
+    # repo name -> json {state, errors}
+    return f"anubis-repo-provision-{assignment_id}"
+
+
+# Provisioning progress is kept for a day
+_PROVISION_PROGRESS_TTL = 24 * 60 * 60
+
+
+def get_repo_provision_progress(assignment_id: str) -> dict[str, dict[str, Any]]:
+    """
+    Get the progress of the last repo provisioning for an assignment.
+    The state of each repo goes from pending, to creating, to configuring
+    then finally done or failed.
+
+    response = {
+      repo_name: {"state": "done", "errors": []},
+    }
+
+    :param assignment_id:
+    :return:
+    """
+    try:
+        progress = redis.hgetall(_provision_progress_key(assignment_id))
+    except RedisError as e:
+        logger.warning(f"Unable to get repo provision progress {e}")
+        return {}
+
+    return {repo_name.decode(): json.loads(value) for repo_name, value in progress.items()}
+
+
+def _set_repo_provision_progress(progress_key: str | None, progress: dict[str, dict[str, Any]]):
+    if progress_key is None or len(progress) == 0:
+        return
+
+    try:
+        with redis.pipeline() as pipe:
+            pipe.hset(progress_key, mapping={
+                repo_name: json.dumps(value)
+                for repo_name, value in progress.items()
+            })
+            pipe.expire(progress_key, _PROVISION_PROGRESS_TTL)
+            pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Unable to set repo provision progress {e}")
+
+
+def _github_backoff(attempt: int):
+    # Exponential backoff (with jitter) before retrying a github call
+    time.sleep(min(2 ** (attempt - 1), 16) + random.uniform(0, 0.5))
+
+
+def _github_call_with_backoff(call: Callable[..., dict | bytes | None], *args, attempts: int = 3) -> dict | None:
+    """
+    Make a github api call, backing off exponentially between attempts if
+    the request fails. Github will also say Not Found for a moment after
+    a repo is created from a template, so that is retried too.
+
+    :param call:
+    :param args:
+    :param attempts:
+    :return: the response, or None if every attempt failed
+    """
+    for i in range(attempts):
+        if i > 0:
+            _github_backoff(i)
+
+        data = call(*args)
+        if not isinstance(data, dict):
+            logger.error(f'github API request probably failed data = {data}')
+            continue
+
+        if data.get("message", None) == "Not Found":
+            logger.warning(f"{call.__name__} failed (Not Found). Trying again. {i}")
+            continue
+
+        return data
+
+    logger.warning(f"{call.__name__} failed after {attempts} tries")
+    return None
+
+
+def _create_repo_from_template_with_backoff(
+    github_org: str,
+    template: dict[str, str],
+    repo_name: str,
+    attempts: int = 3,
+) -> bool:
+    """
+    Create a repo from a template, backing off exponentially between
+    attempts. A failed attempt may still have created the repo on github
+    (say the response was lost), so before each retry the repo is checked
+    for. Creating it again would fail as the name is taken.
+
+    :param github_org:
+    :param template: {owner_id, repo_id}
+    :param repo_name:
+    :param attempts:
+    :return: True if the repo exists
+    """
+    for i in range(attempts):
+        if i > 0:
+            _github_backoff(i)
+            if github_repo_exists(github_org, repo_name):
+                return True
+
+        if create_repo_from_template(template["owner_id"], template["repo_id"], repo_name) is not None:
+            return True
+
+        logger.warning(f"create_repo_from_template failed. Trying again. {i}")
+
+    logger.warning(f"create_repo_from_template failed after {attempts} tries")
+    return False
+
+
+def _get_github_template(template_repo_path: str, github_org: str) -> tuple[dict[str, str] | None, str | None]:
+    """
+    We need to use some of github's internal ID values for creating a
+    repo from the template.
+
+    :param template_repo_path:
+    :param github_org:
+    :return: ({owner_id, repo_id}, None) or (None, error message)
+    """
+    data = get_github_template_ids(template_repo_path, github_org)
+
+    # If response from github is no good
+    if data is None:
+        logger.error('Could not get template id')
+        return None, ('There was an issue with connecting to github. '
+                      'Please try again later.')
+
+    # Check that some expected values are present in the json data response.
+    if data.get("repository", None) is None or "id" not in data["repository"]:
+        logger.warning('Could not find repo template id')
+        return None, ('This assignment is misconfiguration. Github says that the template repo we are suppose to '
+                      'create your repo from does not exist. Please let your TA know.')
+
+    return {"owner_id": data["organization"]["id"], "repo_id": data["repository"]["id"]}, None
+
+
+def _get_repo_collaborator(repo: AssignmentRepo) -> str:
+    # Get user github username
+    if is_debug():
+        return 'wabscale'
+    return repo.owner.github_username
+
+
+def _make_repo_provision_task(
+    repos: list[AssignmentRepo],
+    github_org: str,
+    repo_name: str,
+    template: dict[str, str] | None,
+    team_slug: str | None,
+    attempts: int = 3,
+    progress_key: str | None = None,
+) -> dict[str, Any]:
+    """
+    Pull everything needed to provision a repo on github out of its
+    AssignmentRepo rows, so that the github side can be done off of
+    the database session.
+
+    :param repos: AssignmentRepo rows for the repo (more than one if shared)
+    :param github_org:
+    :param repo_name:
+    :param template: template ids if the repo needs to be created
+    :param team_slug: ta team to add to the repo
+    :param attempts: attempts for each github call
+    :param progress_key:
+    :return:
+    """
+    collaborators = []
+    for repo in repos:
+        collaborator = _get_repo_collaborator(repo)
+        if not repo.collaborator_configured and collaborator not in collaborators:
+            collaborators.append(collaborator)
+
+    return {
+        "github_org":    github_org,
+        "repo_name":     repo_name,
+        "template":      template,
+        "collaborators": collaborators,
+        "team_slug":     team_slug if team_slug and not all(repo.ta_configured for repo in repos) else None,
+        "attempts":      attempts,
+        "progress_key":  progress_key,
+    }
+
+
+def _provision_github_repo(task: dict[str, Any]) -> dict[str, Any]:
+    """
+    Do the github side of setting up a repo. The repo is created from the
+    template, then the collaborators and ta team are added. This only makes
+    github api calls, so many repos can be provisioned at once with
+    github_batch.
+
+    :param task: from _make_repo_provision_task
+    :return: {repo_name, repo_created, collaborators, ta_configured, errors}
+    """
+    github_org, repo_name = task["github_org"], task["repo_name"]
+    result = {
+        "repo_name":     repo_name,
+        "repo_created":  task["template"] is None,
+        "collaborators": [],
+        "ta_configured": False,
+        "errors":        [],
+    }
+
+    def _progress(state: str):
+        _set_repo_provision_progress(task["progress_key"], {repo_name: {"state": state, "errors": result["errors"]}})
+
+    try:
+        # If repo has not been created yet
+        if not result["repo_created"]:
+            _progress("creating")
+
+            # Try to create the student's assignment repo from the template
+            # using the github graphql api.
+            if not _create_repo_from_template_with_backoff(
+                github_org, task["template"], repo_name, attempts=task["attempts"],
+            ):
+                logger.warning("Create repo failed")
+                result["errors"].append('We were not able to create your repo on github. Please try again.')
+                _progress("failed")
+                return result
+
+            result["repo_created"] = True
+
+        _progress("configuring")
+
+        for collaborator in task["collaborators"]:
+            # Use github REST api to add the student as a collaborator
+            # to the repo.
+            data = _github_call_with_backoff(add_collaborator, github_org, repo_name, collaborator,
+                                             attempts=task["attempts"])
+            if data is None:
+                result["errors"].append(
+                    'We were not able to add you as a collaborator to the repo we created at this time. '
+                    'We are going to try to add you again in a few minutes. '
+                    'You are free to start an IDE to work on your assignment while you wait.'
+                )
+            elif 'is not a user' in data.get("message", ''):
+                logger.warning(f"Github is saying that {collaborator} is not a user")
+                result["errors"].append(f"Github is saying that {collaborator} is not a user. "
+                                        f"Please link your github account on the profile page and try again.")
+            else:
+                result["collaborators"].append(collaborator)
+
+        if task["team_slug"] is not None:
+            # Use github REST api to add the ta team as a collaborator
+            # to the repo.
+            data = _github_call_with_backoff(add_team, github_org, repo_name, task["team_slug"],
+                                             attempts=task["attempts"])
+            result["ta_configured"] = data is not None
+
+    except Exception as e:
+        logger.warning(f"Failed to provision repo {github_org}/{repo_name} {e}")
+        logger.warning(traceback.format_exc())
+        result["errors"].append('There was an issue with connecting to github. Please try again later.')
+
+    _progress("failed" if len(result["errors"]) > 0 else "done")
+    return result
+
+
+def _apply_repo_provision_result(repos: list[AssignmentRepo], result: dict[str, Any]):
+    # Caller is responsible for committing
+    for repo in repos:
+        repo.repo_created = result["repo_created"]
+        if _get_repo_collaborator(repo) in result["collaborators"]:
+            repo.collaborator_configured = True
+        if result["ta_configured"]:
+            repo.ta_configured = True
+
+
 @create_repo_safety_net
 def create_assignment_github_repo(
     repos: list[AssignmentRepo],
@@ -334,7 +641,6 @@ def create_assignment_github_repo(
     """
     Creates an assignment repo and adds collaborators.
 
-    :param n:
     :param repos: AssignmentRepo object
     :param template_repo_path: "AnubisLMS/xv6"
     :param github_org: "os3224"
@@ -342,166 +648,163 @@ def create_assignment_github_repo(
     :return:
     """
 
-    errors = set()
-
-    repo_created = any(repo.repo_created for repo in repos)
-    data = None
-
-    try:
-        # If repo has not been created yet
-        if not repo_created:
+    template = None
 
-            # We need to use some of github's internal ID values
-            # for creating a repo from the template.
-            data = get_github_template_ids(template_repo_path, github_org)
+    # If repo has not been created yet
+    if not any(repo.repo_created for repo in repos):
+        template, error = _get_github_template(template_repo_path, github_org)
+        if template is None:
+            # set all repos to failed
+            for repo in repos:
+                repo.repo_created = False
+            db.session.commit()
 
-            # If response from github is no good
-            if data is None:
-                # set all repos to failed
-                for repo in repos:
-                    repo.repo_created = False
-                db.session.commit()
+            return repos, [error]
 
-                # Log error
-                logger.error('Could not get template id')
-                errors.add('There was an issue with connecting to github. '
-                           'Please try again later.')
+    task = _make_repo_provision_task(
+        repos, github_org, new_repo_name, template,
+        team_slug=repos[0].assignment.course.github_ta_team_slug,
+    )
+    result = _provision_github_repo(task)
 
-                return repos, list(errors)
+    # Save all the state changes together
+    _apply_repo_provision_result(repos, result)
+    db.session.commit()
 
-            # If the response was None, the api request failed. Also check that
-            # some expected values are present in the json data response.
-            if "repository" not in data or "id" not in data["repository"]:
-                # set all repos to failed
-                for repo in repos:
-                    repo.repo_created = False
-                db.session.commit()
+    return repos, result["errors"]
 
-                # Log error
-                logger.warning('Could not find repo template id')
-                errors.add('This assignment is misconfiguration. Github says that the template repo we are suppose to '
-                           'create your repo from does not exist. Please let your TA know.')
 
-                return repos, list(errors)
+def provision_assignment_group_repos(
+    assignment: Assignment,
+    groups: list[list[User]],
+) -> list[tuple[list[User], list[AssignmentRepo], list[str]]]:
+    """
+    Create and configure a shared repo for each group of students for an
+    assignment. The AssignmentRepo rows are created together, then the
+    repos are provisioned on github concurrently by GITHUB_PROVISION_WORKERS
+    threads. Each github call is retried GITHUB_PROVISION_ATTEMPTS times
+    with exponential backoff. The state of every repo is saved in one
+    commit once they are all done. Repos that still failed are retried
+    once more from the rpc queue.
 
-            # Get organization and template repo IDs
-            owner_id = data["organization"]["id"]
-            template_repo_id = data["repository"]["id"]
+    The progress of each repo can be followed with get_repo_provision_progress.
 
-            # Try to create the student's assignment repo from the template
-            # using the github graphql api.
-            data = create_repo_from_template(owner_id, template_repo_id, new_repo_name)
+    :param assignment:
+    :param groups:
+    :return: list of (group, repos, errors)
+    """
 
-            # If the response was None, the api request failed
-            if data is None:
-                logger.warning("Create repo failed")
-                errors.add('We were not able to create your repo on github. Please try again.')
-                return repos, list(errors)
+    github_org = assignment.course.github_org
+    team_slug = assignment.course.github_ta_team_slug
+    progress_key = _provision_progress_key(assignment.id)
+
+    # Get the existing repo rows for everyone at once
+    user_ids = [user.id for group in groups for user in group]
+    existing: dict[str, AssignmentRepo] = {
+        repo.owner_id: repo
+        for repo in AssignmentRepo.query.options(joinedload(AssignmentRepo.owner)).filter(
+            AssignmentRepo.assignment_id == assignment.id,
+            AssignmentRepo.owner_id.in_(user_ids),
+        ).all()
+    }
 
-            # Mark the repo as created
-            for repo in repos:
-                repo.repo_created = True
-            db.session.commit()
-    except Exception as e:
-        logger.warning(f"Failed to create repo {e}, continuing")
-        logger.warning(f'data = {str(data)}')
-        logger.warning(traceback.format_exc())
+    # Create or update the repo rows for each group
+    group_repos: list[tuple[list[User], str, list[AssignmentRepo]]] = []
+    for group in groups:
+        repo_name = get_group_assignment_repo_name(group, assignment)
+        repo_url = f"https://github.com/{github_org}/{repo_name}"
+
+        repos = []
+        for user in group:
+            repo = existing.get(user.id, None)
+            if repo is None:
+                repo = AssignmentRepo(
+                    assignment_id=assignment.id,
+                    owner=user,
+                    netid=user.netid,
+                    repo_url=repo_url,
+                )
+                db.session.add(repo)
+
+            repo.repo_url = repo_url
+
+            # Mark repo as shared
+            repo.shared = True
+
+            repos.append(repo)
+        group_repos.append((group, repo_name, repos))
+
+    # Flush so the new rows get their defaults
+    db.session.flush()
+
+    # The template ids are the same for every repo
+    template, template_error = None, None
+    if any(not any(repo.repo_created for repo in repos) for _, _, repos in group_repos):
+        template, template_error = _get_github_template(assignment.github_template, github_org)
+
+    attempts = get_config_int('GITHUB_PROVISION_ATTEMPTS', default=5)
+    tasks: list[dict[str, Any]] = []
+    results: dict[str, dict[str, Any]] = {}
+    for group, repo_name, repos in group_repos:
+        needs_create = not any(repo.repo_created for repo in repos)
+        if needs_create and template is None:
+            results[repo_name] = {
+                "repo_name":     repo_name,
+                "repo_created":  False,
+                "collaborators": [],
+                "ta_configured": False,
+                "errors":        [template_error],
+            }
+            continue
+
+        tasks.append(_make_repo_provision_task(
+            repos, github_org, repo_name,
+            template if needs_create else None,
+            team_slug, attempts, progress_key,
+        ))
 
-    try:
-        for repo in repos:
-
-            # If repo has not been configured
-            if not repo.collaborator_configured:
-
-                # Get user github username
-                collaborator = repo.owner.github_username
-                if is_debug():
-                    collaborator = 'wabscale'
-
-                for i in range(3):
-                    # Use github REST api to add the student as a collaborator
-                    # to the repo.
-                    data = add_collaborator(github_org, new_repo_name, collaborator)
-                    if not isinstance(data, dict):
-                        logger.error(f'github API request probably failed data = {data}')
-                        continue
-
-                    # Sometimes it takes a moment before we are able to add collaborators to
-                    # the repo. The message in the response will be Not Found in this situation.
-                    # We can have it try again to fix.
-                    if data.get("message", None) == "Not Found":
-                        logger.warning(f"Failed to add collaborator (Not Found). Trying again. {i}")
-                    elif f'is not a user' in data.get("message", ''):
-                        logger.warning(f"Github is saying that {collaborator} is not a user")
-                        errors.add(f"Github is saying that {collaborator} is not a user. "
-                                   f"Please link your github account on the profile page and try again.")
-                        break
-                    else:
-                        break
-                else:
-                    logger.warning("Failed to add collaborator after 3 tries")
-                    errors.add(f'We were not able to add you as a collaborator to the repo we created at this time. '
-                               f'We are going to try to add you again in a few minutes. '
-                               f'You are free to start an IDE to work on your assignment while you wait.')
-                    continue
-
-                # Mark the repo as collaborator configured
-                repo.collaborator_configured = True
-                db.session.commit()
-    except Exception as e:
-        logger.warning(f"Failed to configure collaborators {e}, continuing")
-        logger.warning(f'data = {str(data)}')
-        logger.warning(traceback.format_exc())
+    db.session.commit()
 
-    try:
-        for repo in repos:
-
-            # Get user github username
-            team_slug = repo.assignment.course.github_ta_team_slug
-
-            # If repo has not been configured
-            if not repo.ta_configured and team_slug is not None and team_slug != '':
-
-                for i in range(3):
-                    # Use github REST api to add the ta team as a collaborator
-                    # to the repo.
-                    data = add_team(github_org, new_repo_name, team_slug)
-                    if not isinstance(data, dict):
-                        logger.error(f'github API request probably failed data = {data}')
-                        continue
-
-                    # Sometimes it takes a moment before we are able to add collaborators to
-                    # the repo. The message in the response will be Not Found in this situation.
-                    # We can have it try again to fix.
-                    if data.get("message", None) == "Not Found":
-                        logger.warning(f"Failed to add ta team (Not Found). Trying again. {i}")
-                    else:
-                        break
-                else:
-                    logger.warning("Failed to add ta team after 3 tries")
-                    continue
-
-                # Mark the repo as collaborator configured
-                repo.ta_configured = True
-                db.session.commit()
-    except Exception as e:
-        logger.warning(f"Failed to configure ta team {e}, continuing")
-        logger.warning(f'data = {str(data)}')
-        logger.warning(traceback.format_exc())
+    # Start the progress over for this run
+    _set_repo_provision_progress(progress_key, {
+        repo_name: {"state": "pending" if repo_name not in results else "failed",
+                    "errors": results.get(repo_name, {}).get("errors", [])}
+        for _, repo_name, _ in group_repos
+    })
+
+    # Provision the repos on github concurrently
+    workers = get_config_int('GITHUB_PROVISION_WORKERS', default=4)
+    for result in github_batch(_provision_github_repo, tasks, workers=workers):
+        results[result["repo_name"]] = result
+
+    # Reload the repo rows in one query, then save all the state changes together
+    AssignmentRepo.query.options(joinedload(AssignmentRepo.owner)).filter(
+        AssignmentRepo.id.in_([repo.id for _, _, repos in group_repos for repo in repos]),
+    ).all()
+    for _, repo_name, repos in group_repos:
+        _apply_repo_provision_result(repos, results[repo_name])
+    db.session.commit()
 
-    return repos, list(errors)
+    # The first member of each group owns the pushes to the repo
+    index_repos([repo for _, _, repos in group_repos for repo in repos])
 
+    # Give the repos that failed another try from the queue, the
+    # same as the create_assignment_github_repo safety net does.
+    failed = [(repo_name, repos) for _, repo_name, repos in group_repos if len(results[repo_name]["errors"]) > 0]
+    if len(failed) > 0:
+        from anubis.rpc.enqueue import enqueue_create_assignment_github_repo
 
-def verify_collaborators_assignment_repo(assignment_repo: AssignmentRepo):
-    # Get github org and repo name from the url of the assignment
-    github_org, repo_name = split_github_repo_url(assignment_repo.repo_url)
+        logger.warning(f'Retrying {len(failed)} failed repos for {assignment.id}')
+        for repo_name, repos in failed:
+            enqueue_create_assignment_github_repo(repos, assignment.github_template, github_org, repo_name)
 
-    # Get repo owner's github username
-    github_username: str = assignment_repo.owner.github_username
+    return [
+        (group, repos, results[repo_name]["errors"])
+        for group, repo_name, repos in group_repos
+    ]
 
-    # Log the verify call
-    logger.info(f'verify_collaborators_assignment_repo( {github_org}/{repo_name} )')
 
+def _verify_collaborators(github_org: str, repo_name: str, github_username: str):
     try:
         # Get list of all collaborators for repo
         collaborators = list_collaborators(github_org, repo_name)
@@ -520,15 +823,83 @@ def verify_collaborators_assignment_repo(assignment_repo: AssignmentRepo):
                        f'{traceback.format_exc()}')
 
 
-def verify_collaborators_assignment(assignment: Assignment):
+def verify_collaborators_assignment_repo(assignment_repo: AssignmentRepo):
+    # Get github org and repo name from the url of the assignment
+    github_org, repo_name = split_github_repo_url(assignment_repo.repo_url)
+
+    # Get repo owner's github username
+    github_username: str = assignment_repo.owner.github_username
+
+    # Log the verify call
+    logger.info(f'verify_collaborators_assignment_repo( {github_org}/{repo_name} )')
+
+    _verify_collaborators(github_org, repo_name, github_username)
+
+
+def verify_collaborators_assignments(assignments: list[Assignment]):
+    """
+    Make sure the owner of every repo for the assignments is a collaborator
+    on it. The collaborators are listed in batched graphql queries, so only
+    the missing collaborators need their own api calls.
+
+    :param assignments:
+    :return:
+    """
+
     # Log verify call
-    logger.info(f'verify_collaborators_assignment( {assignment=} )')
+    logger.info(f'verify_collaborators_assignments( {assignments=} )')
+    if len(assignments) == 0:
+        return
 
-    # Get all repos for assignment
-    assignment_repos = AssignmentRepo.query.filter(
-        AssignmentRepo.assignment_id == assignment.id,
-    ).all()
+    # Get all repos for the assignments, along with their owner's github username
+    assignment_repos: list[tuple[str, str]] = (
+        db.session.query(AssignmentRepo.repo_url, User.github_username)
+        .join(User, User.id == AssignmentRepo.owner_id)
+        .filter(AssignmentRepo.assignment_id.in_([assignment.id for assignment in assignments]))
+        .all()
+    )
+
+    # (github_org, repo_name) -> expected github usernames. Shared
+    # repos have a row (and a collaborator) for each member.
+    expected: dict[tuple[str, str], set[str]] = {}
+    for repo_url, github_username in assignment_repos:
+        # Owners that have not set their github username can not be added
+        if github_username is None:
+            continue
+
+        org_repo = split_github_repo_url(repo_url)
+        if org_repo is None:
+            logger.warning(f'Unable to parse repo url {repo_url}')
+            continue
+        expected.setdefault(org_repo, set()).add(github_username)
+
+    collaborators = list_collaborators_batch(list(expected.keys()))
+
+    # Only the collaborators missing from their repo need to be added
+    missing: list[tuple[str, str, str]] = [
+        (github_org, repo_name, github_username)
+        for (github_org, repo_name), github_usernames in expected.items()
+        if (github_org, repo_name) in collaborators
+        for github_username in sorted(github_usernames)
+        if github_username not in collaborators[(github_org, repo_name)]
+    ]
+    logger.info(f'Adding {len(missing)} missing collaborators to {len(expected)} repos')
+
+    def _add_collaborator(repo: tuple[str, str, str]):
+        github_org, repo_name, github_username = repo
 
-    # Verify repo for each repo in assignment
-    for assignment_repo in assignment_repos:
-        verify_collaborators_assignment_repo(assignment_repo)
+        # Log the add
+        logger.info(f'Adding missing collaborator to {github_org}/{repo_name}')
+
+        try:
+            add_collaborator(github_org, repo_name, github_username)
+        except Exception as e:
+            logger.warning(f'verify_collaborators_assignments( {github_org}/{repo_name} )\n'
+                           f'Exception = {e}\n'
+                           f'{traceback.format_exc()}')
+
+    github_batch(_add_collaborator, missing)
+
+
+def verify_collaborators_assignment(assignment: Assignment):
+    verify_collaborators_assignments([assignment])
@@ -1,6 +1,6 @@
 from anubis.constants import REAPER_TXT
 from anubis.lms.assignments import get_recent_assignments
-from anubis.lms.autograde import bulk_autograde, reap_assignment_double_deliveries
+from anubis.lms.autograde import bulk_autograde, reap_assignment_double_deliveries, refresh_best_submissions
 from anubis.utils.data import with_context
 from anubis.utils.logging import logger
 from anubis.utils.visuals.assignments import get_assignment_sundial
@@ -18,6 +18,13 @@ def autograde_recalculate():
     logger.info('Recent assignments:')
     logger.info('\n'.join(' ' * 4 + assignment.name for assignment in recent_assignments))
 
+    for assignment in recent_assignments:
+        logger.info('Rebuilding best submissions on {:<20} :: {:<20}'.format(
+            assignment.name,
+            assignment.course.course_code,
+        ))
+        refresh_best_submissions(assignment.id)
+
     for assignment in recent_assignments:
         logger.info('Running bulk autograde on {:<20} :: {:<20}'.format(
             assignment.name,
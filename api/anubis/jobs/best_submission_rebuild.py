@@ -0,0 +1,47 @@
+import argparse
+
+from anubis.constants import REAPER_TXT
+from anubis.lms.autograde import refresh_best_submissions
+from anubis.models import Assignment
+from anubis.utils.data import with_context
+from anubis.utils.logging import logger
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser("Anubis Best Submission Rebuild")
+    parser.add_argument(
+        "assignment_ids",
+        nargs="*",
+        help="Assignment ids to rebuild. If none are given, every assignment is rebuilt.",
+    )
+    return parser.parse_args()
+
+
+@with_context
+def rebuild(assignment_ids: list[str]):
+    """
+    Backfill / rebuild the materialized best submission table
+    from the full submission history.
+
+    :param assignment_ids:
+    :return:
+    """
+
+    query = Assignment.query
+    if len(assignment_ids) > 0:
+        query = query.filter(Assignment.id.in_(assignment_ids))
+
+    for assignment in query.all():
+        logger.info('Rebuilding best submissions for {:<20} :: {:<20}'.format(
+            assignment.name,
+            assignment.course.course_code,
+        ))
+        best = refresh_best_submissions(assignment.id)
+        logger.info(f'Rebuilt {len(best)} best submissions')
+
+
+if __name__ == "__main__":
+    print(REAPER_TXT)
+
+    args = parse_args()
+    rebuild(args.assignment_ids)
@@ -13,6 +13,7 @@ from tabulate import tabulate
 from anubis.lms.courses import get_course_users
 from anubis.models import db, Course, User, TheiaSession, InCourse, EmailEvent
 from anubis.utils.data import with_context, human_readable_timedelta
+from anubis.utils.usage.activity import DAILY_ACTIVITY_DAYS
 from anubis.utils.visuals.usage import get_usage_plot_active
 
 
@@ -269,11 +270,15 @@ async def report_(ctx, platform="desktop", *args):
 
 @bot.command(name="active", aliases=("a",), help="Get current active plot.")
 async def active_(ctx, days=14, step=1, *_):
+    # Only the last DAILY_ACTIVITY_DAYS are rolled up
+    days = min(max(days, 1), DAILY_ACTIVITY_DAYS)
+    step = min(max(step, 1), days)
+
     now = datetime.now().replace(microsecond=0)
     await ctx.send(
         file=discord.File(
             generate_active_plot(days=days, step=step),
-            filename=f"anubis-active-14days-1step-{now.year}{now.month}{now.day}-{now.hour}{now.minute}{now.second}.png"
+            filename=f"anubis-active-{days}days-{step}step-{now.year}{now.month}{now.day}-{now.hour}{now.minute}{now.second}.png"
         )
     )
 
@@ -6,7 +6,7 @@ from anubis.lms.assignments import get_active_assignments
 from anubis.lms.courses import get_course_users
 from anubis.models import Assignment, Course, User
 from anubis.utils.data import with_context
-from anubis.utils.email.event import send_email_event
+from anubis.utils.email.event import send_email_events
 from anubis.utils.logging import logger
 
 now = datetime.now()
@@ -34,7 +34,6 @@ def _send_assignment_condition_email_notifications(
     for assignment in recent_assignments:
         logger.info(f'{assignment=}')
         course: Course = assignment.course
-        students: list[User] = get_course_users(course)
 
         logger.info(f'Inspecting assignment {reference_type=} {assignment.name=} {assignment.course.course_code=}')
 
@@ -49,34 +48,31 @@ def _send_assignment_condition_email_notifications(
         else:
             logger.info(f'Condition met, sending emails')
 
-        logger.info(f'students = {students}')
-        for student in students:
-            context = {
-                'user':       student,
+        students: list[User] = get_course_users(course)
+
+        # Skip students that have disabled notifications
+        match reference_type:
+            case 'assignment_release':
+                recipients = [student for student in students if student.release_email_enabled]
+            case 'assignment_deadline':
+                recipients = [student for student in students if student.deadline_email_enabled]
+            case _:
+                recipients = students
+
+        logger.info(f'Sending emails to {len(recipients)} of {len(students)} students based off preferences')
+
+        sent = send_email_events(
+            recipients,
+            assignment.id,
+            reference_type,
+            template_key,
+            {
                 'assignment': assignment,
                 'course':     course,
-            }
-
-            # Skip if student has disabled notifications
-            match reference_type:
-                case 'assignment_release':
-                    if not student.release_email_enabled:
-                        logger.debug(f'Skipping email for user based off preferences user_id={student.id}')
-                        continue
-                case 'assignment_deadline':
-                    if not student.deadline_email_enabled:
-                        logger.debug(f'Skipping email for user based off preferences user_id={student.id}')
-                        continue
-
-            logger.debug(f'Sending email for user based off preferences user_id={student.id}')
-
-            send_email_event(
-                student,
-                assignment.id,
-                reference_type,
-                template_key,
-                context,
-            )
+            },
+        )
+
+        logger.info(f'Sent {sent} emails {reference_type=} {assignment.name=}')
 
 
 @with_context
@@ -1,5 +1,5 @@
 from anubis.constants import REAPER_TXT
-from anubis.rpc.enqueue import reap_stale_theia_sessions
+from anubis.k8s.theia.reap import reap_stale_theia_sessions
 from anubis.utils.data import with_context
 
 
@@ -7,16 +7,28 @@ if 'SENTRY_DSN' in os.environ:
 from kubernetes import config
 
 from anubis.utils.data import with_context
-from anubis.k8s.pipeline.reap import reap_pipeline_jobs
+from anubis.k8s.pipeline.reap import PipelineJobReaper
+from anubis.k8s.pipeline.scheduler import admit_scheduled_pipelines
+from anubis.k8s.pipeline.tracker import PipelineJobTracker
 
 
 def main():
     config.load_incluster_config()
 
+    # Watch the pipeline jobs instead of listing them every poll
+    tracker = PipelineJobTracker()
+    tracker.start()
+    tracker.wait_for_sync()
+
+    reaper = PipelineJobReaper(tracker)
+
     while True:
-        with_context(reap_pipeline_jobs)()
+        with_context(reaper.reap)()
+
+        # Start jobs for scheduled submissions as slots free up
+        with_context(admit_scheduled_pipelines)(tracker)
         time.sleep(1)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -3,19 +3,21 @@ from datetime import datetime, timedelta
 
 from anubis.constants import REAPER_TXT
 from anubis.constants import SHELL_AUTOGRADE_SUBMISSION_STATE_MESSAGE
+from anubis.k8s.pipeline.scheduler import PRIORITY_BULK_REGRADE
 from anubis.lms.assignments import get_recent_assignments
 from anubis.lms.courses import get_active_courses
 from anubis.lms.repos import list_repos_with_latest_commit
 from anubis.lms.students import get_students
 from anubis.lms.submissions import fix_submissions_for_autograde_disabled_assignment
 from anubis.lms.submissions import init_submission
+from anubis.lms.webhook import delete_processed_push_events
 from anubis.models import (
     db,
     Submission,
     SubmissionBuild,
     Course,
 )
-from anubis.rpc.enqueue import enqueue_autograde_pipeline, enqueue_pipeline_reap_stale
+from anubis.rpc.enqueue import enqueue_autograde_pipeline, enqueue_process_push_events
 from anubis.utils.data import with_context
 from anubis.utils.logging import logger
 
@@ -67,7 +69,7 @@ def reap_recent_assignments():
         ).all():
             if submission.build is None:
                 init_submission(submission)
-                enqueue_autograde_pipeline(submission.id)
+                enqueue_autograde_pipeline(submission.id, priority=PRIORITY_BULK_REGRADE)
 
 
 def update_student_lists():
@@ -115,12 +117,13 @@ def reap_latest_assignment_commits():
 
 @with_context
 def reap():
-    # Enqueue a job to reap stale pipeline k8s resources
-    enqueue_pipeline_reap_stale()
-
     # Reap the stale submissions
     reap_stale_submissions()
 
+    # Pick up any push events that were left behind, and clean up old ones
+    enqueue_process_push_events()
+    delete_processed_push_events()
+
     # Reap broken submissions in recent assignments
     # reap_recent_assignments()
 
@@ -7,14 +7,28 @@ if 'SENTRY_DSN' in os.environ:
 from kubernetes import config
 
 from anubis.utils.data import with_context
-from anubis.k8s.theia.update import update_all_theia_sessions
+from anubis.k8s.theia.informer import TheiaPodInformer
+from anubis.k8s.theia.update import update_theia_sessions_from_informer
+
+# Seconds between full checks of all active sessions
+RESYNC_INTERVAL = 30
 
 
 def main():
     config.load_incluster_config()
 
+    # Watch the theia pods instead of reading each one every poll
+    informer = TheiaPodInformer()
+    informer.start()
+    informer.wait_for_sync()
+
+    last_resync = 0.0
     while True:
-        with_context(update_all_theia_sessions)()
+        resync = time.time() - last_resync > RESYNC_INTERVAL
+        if resync:
+            last_resync = time.time()
+
+        with_context(update_theia_sessions_from_informer)(informer, resync=resync)
         time.sleep(1)
 
 
@@ -2,9 +2,9 @@ from datetime import datetime, timedelta
 
 from anubis.models import Assignment, Course
 from anubis.utils.data import with_context
+from anubis.utils.usage.activity import DAILY_ACTIVITY_DAYS, update_daily_activity
 from anubis.utils.visuals.assignments import get_assignment_sundial
-from anubis.utils.visuals.usage import get_usage_plot, get_usage_plot_playgrounds, get_usage_plot_active
-from anubis.utils.visuals.users import get_platform_users_plot
+from anubis.utils.visuals.store import refresh_plots
 
 
 @with_context
@@ -14,10 +14,6 @@ def main():
         Course.display_visuals == True
     ).all()
 
-    # Generate usage plot for each course
-    for course in courses_with_visuals:
-        get_usage_plot(course.id)
-
     # Get recent assignments
     recent_assignments: list[Assignment] = Assignment.query.filter(
         Assignment.release_date > datetime.now(),
@@ -28,16 +24,18 @@ def main():
     for assignment in recent_assignments:
         get_assignment_sundial(assignment.id)
 
-    # Generate playgrounds usage plot
-    get_usage_plot_playgrounds()
+    # Roll up the days since the last run. The active
+    # and registered users plots are made from these.
+    update_daily_activity(days=DAILY_ACTIVITY_DAYS)
 
-    # Generate plot for active
+    # Render the plots whose data has changed since the last run
+    plots = [("usage", {"course_id": course.id}) for course in courses_with_visuals]
+    plots.append(("playgrounds", {}))
     for days, step in [(14, 1), (90, 7), (180, 1), (365, 30)]:
-        get_usage_plot_active(days=days, step=step)
-
-    # Generate plot for last year registered users
+        plots.append(("active", {"days": days, "step": step}))
     for days, step in [(365, 1), (365, 30)]:
-        get_platform_users_plot(days=days, step=step)
+        plots.append(("users", {"days": days, "step": step}))
+    refresh_plots(plots)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,164 @@
+import threading
+import time
+import traceback
+from typing import Any, Callable
+
+from kubernetes import client, watch
+
+from anubis.utils.logging import logger
+
+
+class K8sInformer(object):
+    """
+    Keep an in memory index of some kubernetes objects using a single
+    watch stream, instead of listing them from the api on every poll.
+
+    The objects are listed once, then the watch applies the changes. When
+    the watch falls too far behind (410 Gone), everything is listed again.
+
+    Subclasses give the list function for their objects, and how the
+    index is updated:
+
+    * _get_list_func -> function like CoreV1Api().list_namespaced_pod
+    * _replace(items) -> replace the index with a fresh list
+    * _apply(event_type, item) -> apply a single ADDED, MODIFIED or DELETED event
+
+    _replace and _apply are called with the lock held.
+    """
+
+    # Name of the watch thread, and of the objects in the logs
+    thread_name = "k8s-informer"
+    kind = "Object"
+
+    def __init__(
+        self,
+        namespace: str = "anubis",
+        label_selector: str | None = None,
+        watch_timeout: int = 300,
+    ):
+        self.namespace = namespace
+        self.label_selector = label_selector
+        self.watch_timeout = watch_timeout
+
+        self._lock = threading.Lock()
+        self._synced = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._resource_version: str | None = None
+
+    def start(self):
+        """
+        Start the watch in a background thread.
+
+        :return:
+        """
+        if self._thread is not None:
+            return
+
+        self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def wait_for_sync(self, timeout: float | None = None) -> bool:
+        """
+        Wait for the initial list of objects to be loaded.
+
+        :param timeout:
+        :return:
+        """
+        return self._synced.wait(timeout)
+
+    def _get_list_func(self) -> Callable[..., Any]:
+        raise NotImplementedError()
+
+    def _replace(self, items: list):
+        raise NotImplementedError()
+
+    def _apply(self, event_type: str, item: Any):
+        raise NotImplementedError()
+
+    def _changed(self):
+        # Called (without the lock) after the index changes
+        pass
+
+    def _list(self, list_func: Callable[..., Any]):
+        """
+        List all the objects, replacing the index. This is done when
+        the informer starts, and whenever the watch falls too far behind.
+
+        :param list_func:
+        :return:
+        """
+        item_list = list_func(
+            namespace=self.namespace,
+            label_selector=self.label_selector,
+        )
+
+        with self._lock:
+            self._replace(item_list.items)
+
+        self._resource_version = item_list.metadata.resource_version
+        self._changed()
+        self._synced.set()
+
+    def _watch(self, list_func: Callable[..., Any]):
+        """
+        Apply watch events to the index until the stream times out.
+
+        :param list_func:
+        :return:
+        """
+        w = watch.Watch()
+        for event in w.stream(
+            list_func,
+            namespace=self.namespace,
+            label_selector=self.label_selector,
+            resource_version=self._resource_version,
+            timeout_seconds=self.watch_timeout,
+        ):
+            if self._stopped.is_set():
+                w.stop()
+                return
+
+            event_type: str = event["type"]
+
+            # The api sends back an error event when the resource
+            # version we are watching from is too old.
+            if event_type == "ERROR":
+                raise client.exceptions.ApiException(status=event["raw_object"].get("code", 410))
+            if event_type == "BOOKMARK":
+                continue
+
+            item = event["object"]
+            self._resource_version = item.metadata.resource_version
+
+            with self._lock:
+                self._apply(event_type, item)
+
+            self._changed()
+
+    def _run(self):
+        list_func = self._get_list_func()
+
+        while not self._stopped.is_set():
+            try:
+                if self._resource_version is None:
+                    self._list(list_func)
+                self._watch(list_func)
+
+            except client.exceptions.ApiException as e:
+                # 410 Gone means our resource version has expired. A
+                # fresh list is needed before watching again.
+                if e.status == 410:
+                    logger.info(f"{self.kind} watch expired, relisting")
+                else:
+                    logger.error(f"{self.kind} watch failed {e}\n{traceback.format_exc()}")
+                    time.sleep(1)
+                self._resource_version = None
+
+            except Exception as e:
+                logger.error(f"{self.kind} watch failed {e}\n{traceback.format_exc()}")
+                self._resource_version = None
+                time.sleep(1)
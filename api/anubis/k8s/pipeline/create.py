@@ -3,22 +3,23 @@ import time
 
 from kubernetes import client, config
 
-from anubis.k8s.pipeline.get import get_active_pipeline_jobs
 from anubis.models import Submission, db
-from anubis.utils.config import get_config_int
 from anubis.utils.data import is_debug
 from anubis.utils.logging import logger
 
 
-def create_submission_pipeline(submission_id: str):
+def create_submission_pipeline(submission_id: str) -> client.V1Job | None:
     """
     This function should launch the appropriate testing container
     for the assignment, passing along the function arguments.
 
+    Admission (how many pipeline jobs can run at once) is handled by
+    the pipeline scheduler before this is called.
+
     :param submission_id: submission.id of to test
+    :return: the created job
     """
     from anubis.lms.submissions import init_submission
-    from anubis.rpc.enqueue import enqueue_autograde_pipeline
 
     # Log the creation event
     logger.info(
@@ -28,23 +29,9 @@ def create_submission_pipeline(submission_id: str):
         },
     )
 
-    # Calculate the maximum number of jobs allowed in the cluster
-    max_jobs = get_config_int("PIPELINE_MAX_JOBS", default=10)
-
     # Initialize kube client
     config.load_incluster_config()
 
-    # Cleanup finished jobs
-    active_jobs = len(get_active_pipeline_jobs())
-
-    if active_jobs > max_jobs:
-        logger.info(
-            "TOO many jobs - re-enqueue {}".format(submission_id),
-            extra={"submission_id": submission_id},
-        )
-        enqueue_autograde_pipeline(submission_id)
-        exit(0)
-
     # Get the database entry for the submission
     submission = Submission.query.filter(Submission.id == submission_id).first()
 
@@ -79,7 +66,7 @@ def create_submission_pipeline(submission_id: str):
 
     # Send to kube api
     batch_v1 = client.BatchV1Api()
-    batch_v1.create_namespaced_job(body=job, namespace="anubis")
+    return batch_v1.create_namespaced_job(body=job, namespace="anubis")
 
 
 def create_pipeline_job_obj(submission: Submission) -> client.V1Job:
@@ -1,5 +1,8 @@
 from kubernetes import client
 
+# Label selector for all submission pipeline jobs
+PIPELINE_JOB_LABEL_SELECTOR = "app.kubernetes.io/name=submission-pipeline,role=submission-pipeline-worker"
+
 
 def get_active_pipeline_jobs() -> list[client.V1Job]:
     batch_v1 = client.BatchV1Api()
@@ -7,6 +10,6 @@ def get_active_pipeline_jobs() -> list[client.V1Job]:
     # Get all pipeline jobs in the anubis namespace
     jobs = batch_v1.list_namespaced_job(
         namespace="anubis",
-        label_selector="app.kubernetes.io/name=submission-pipeline,role=submission-pipeline-worker",
+        label_selector=PIPELINE_JOB_LABEL_SELECTOR,
     )
     return jobs.items
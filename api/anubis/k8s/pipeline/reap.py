@@ -1,40 +1,42 @@
 import traceback
-from datetime import datetime, timedelta
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import timedelta
 
 import pottery
 import kubernetes
-from kubernetes import client, config
+from kubernetes import client
 
-from anubis.k8s.pipeline.get import get_active_pipeline_jobs
+from anubis.k8s.pipeline.tracker import PipelineJobTracker
 from anubis.models import Submission, db
 from anubis.utils.config import get_config_int
 from anubis.utils.logging import logger
 from anubis.utils.redis import create_redis_lock
 
 
-def reap_pipeline_job(job: client.V1Job, submission: Submission):
-    # Capture the pipeline log
-    submission.pipeline_log = _read_pipeline_job_log(job)
-    db.session.add(submission)
-    db.session.commit()
-
-    # Attempt to delete the k8s job
-    delete_pipeline_job(job)
-
+def delete_pipeline_job(job: client.V1Job) -> bool:
+    """
+    Delete a pipeline job (and its pods).
 
-def delete_pipeline_job(job: client.V1Job):
+    :param job:
+    :return: True if the job is gone
+    """
     batch_v1 = client.BatchV1Api()
 
     # Log that we are cleaning up the job
     logger.info("deleting namespaced job {}".format(job.metadata.name))
     try:
-        return batch_v1.delete_namespaced_job(
+        batch_v1.delete_namespaced_job(
             job.metadata.name,
             job.metadata.namespace,
             propagation_policy="Background",
         )
-    except kubernetes.client.exceptions.ApiException:
+    except kubernetes.client.exceptions.ApiException as e:
+        # Someone else already deleted it
+        if e.status == 404:
+            return True
         logger.error("failed to delete api job, continuing" + traceback.format_exc())
+        return False
+    return True
 
 
 def _read_pipeline_job_log(job: client.V1Job) -> str:
@@ -45,14 +47,17 @@ def _read_pipeline_job_log(job: client.V1Job) -> str:
         label_selector=f"job-name={job.metadata.name}"
     )
 
-    pod = None
-    for _pod in pods.items:
-        if _pod.status.phase == "Succeeded":
-            pod = _pod
-            break
-    else:
-        logger.error(f"could not find successful pod for job: {job.metadata.name}")
+    # Jobs that failed (or timed out) still have useful logs. Prefer the
+    # pod that succeeded, otherwise use the most recent failed attempt.
+    pods = sorted(
+        (_pod for _pod in pods.items if _pod.status.phase in ("Succeeded", "Failed")),
+        key=lambda _pod: (_pod.status.phase == "Succeeded", _pod.metadata.creation_timestamp),
+        reverse=True,
+    )
+    if len(pods) == 0:
+        logger.error(f"could not find finished pod for job: {job.metadata.name}")
         return ''
+    pod = pods[0]
 
     try:
         return v1.read_namespaced_pod_log(
@@ -65,69 +70,110 @@ def _read_pipeline_job_log(job: client.V1Job) -> str:
         return 'UNABLE TO GET PIPELINE LOG'
 
 
-def reap_pipeline_jobs():
+class PipelineJobReaper(object):
     """
-    Runs through all jobs in the namespace. If the job is finished, it will
-    send a request to the kube api to delete it. Number of active jobs is
-    returned.
-
-    :return: number of active jobs
+    Reap the finished and timed out jobs from a PipelineJobTracker. Reading
+    the pipeline logs is the slow part of reaping a job, so the logs are
+    captured concurrently in a bounded thread pool. The database updates
+    for all the captured logs are done together on the next reap call. Jobs
+    are only marked done on the tracker once they are actually deleted.
+
+    >>> reaper = PipelineJobReaper(tracker)
+    >>> while True:
+    >>>     with_context(reaper.reap)()
+    >>>     time.sleep(1)
     """
 
-    # Load the incluster kubernetes config
-    config.load_incluster_config()
+    def __init__(self, tracker: PipelineJobTracker, log_workers: int = 8):
+        self.tracker = tracker
+        self.executor = ThreadPoolExecutor(max_workers=log_workers, thread_name_prefix="pipeline-log")
 
-    # Get all pipeline jobs in the anubis namespace
-    jobs = get_active_pipeline_jobs()
+        # log capture future -> (job, submission_id, lock)
+        self._pending: dict[Future, tuple[client.V1Job, str, pottery.Redlock]] = {}
 
-    # Get the autograde pipeline timeout from config
-    autograde_pipeline_timeout_minutes = get_config_int("AUTOGRADE_PIPELINE_TIMEOUT_MINUTES", default=5)
+        # job delete future -> job
+        self._deleting: dict[Future, client.V1Job] = {}
 
-    # Iterate through all pipeline jobs
-    for job in jobs:
-        job: client.V1Job
+    def reap(self):
+        """
+        Start log captures for newly reapable jobs, save the logs and
+        delete the jobs whose captures have finished, then hand the
+        deleted jobs back to the tracker.
 
-        # If submission id not in labels just skip. Job ttl will delete itself.
-        if 'submission-id' not in job.metadata.labels:
-            logger.error(f'skipping job based off old label format: {job.metadata.name}')
-            continue
+        :return:
+        """
 
-        # Read submission id from labels
-        submission_id = job.metadata.labels['submission-id']
+        # Get the autograde pipeline timeout from config
+        autograde_pipeline_timeout_minutes = get_config_int("AUTOGRADE_PIPELINE_TIMEOUT_MINUTES", default=5)
 
-        try:
-            # Create a distributed lock for the submission job
-            lock = create_redis_lock(f'submission-job-{submission_id}')
-            if not lock.acquire(blocking=False):
+        for job in self.tracker.pop_reapable(timedelta(minutes=autograde_pipeline_timeout_minutes)):
+            # If submission id not in labels just skip. Job ttl will delete itself.
+            if 'submission-id' not in job.metadata.labels:
+                logger.error(f'skipping job based off old label format: {job.metadata.name}')
                 continue
 
-            # Log that we are inspecting the pipeline
-            logger.debug(f'inspecting pipeline: {job.metadata.name}')
+            # Read submission id from labels
+            submission_id = job.metadata.labels['submission-id']
 
-            # Get database record of the submission
-            submission: Submission = Submission.query.filter(
-                Submission.id == submission_id,
-            ).first()
-            if submission is None:
-                logger.error(f"submission from db not found {submission_id}")
+            # Create a distributed lock for the submission job. This is held
+            # until the log is saved, so it needs to outlive the log read.
+            lock = create_redis_lock(f'submission-job-{submission_id}', auto_release_time=60.0)
+            if not lock.acquire(blocking=False):
+                self.tracker.done(job, deleted=False)
                 continue
 
-            # Calculate job created time
-            job_created = job.metadata.creation_timestamp.replace(tzinfo=None)
-
-            # Delete the job if it is older than a few minutes
-            if datetime.utcnow() - job_created > timedelta(minutes=autograde_pipeline_timeout_minutes):
-
-                # Attempt to delete the k8s job
-                reap_pipeline_job(job, submission)
-
-            # If the job has finished, and was marked as successful, then
-            # we can clean it up
-            elif job.status.succeeded is not None and job.status.succeeded >= 1:
-
-                # Attempt to delete the k8s job
-                reap_pipeline_job(job, submission)
+            # Capture the pipeline log in the thread pool
+            logger.debug(f'reaping pipeline: {job.metadata.name}')
+            self._pending[self.executor.submit(_read_pipeline_job_log, job)] = (job, submission_id, lock)
+
+        self._save_captured_logs()
+        self._finish_deletes()
+
+    def _save_captured_logs(self):
+        done = [future for future in self._pending if future.done()]
+        if len(done) == 0:
+            return
+
+        # submission_id -> pipeline log
+        logs: dict[str, str] = {}
+        for future in done:
+            _, submission_id, _ = self._pending[future]
+            try:
+                logs[submission_id] = future.result()
+            except Exception:
+                logger.error("failed to get pod logs, continuing" + traceback.format_exc())
+                logs[submission_id] = 'UNABLE TO GET PIPELINE LOG'
+
+        # Save all the logs at once
+        submissions: list[Submission] = Submission.query.filter(
+            Submission.id.in_(list(logs.keys())),
+        ).all()
+        for submission in submissions:
+            submission.pipeline_log = logs[submission.id]
+        db.session.commit()
+
+        found_submission_ids = {submission.id for submission in submissions}
+        for future in done:
+            job, submission_id, lock = self._pending.pop(future)
+            if submission_id not in found_submission_ids:
+                logger.error(f"submission from db not found {submission_id}")
 
-            lock.release()
-        except pottery.exceptions.ReleaseUnlockedLock:
-            print(traceback.format_exc())
+            # Attempt to delete the k8s job
+            self._deleting[self.executor.submit(delete_pipeline_job, job)] = job
+
+            try:
+                lock.release()
+            except pottery.exceptions.ReleaseUnlockedLock:
+                print(traceback.format_exc())
+
+    def _finish_deletes(self):
+        for future in [future for future in self._deleting if future.done()]:
+            job = self._deleting.pop(future)
+            try:
+                deleted = future.result()
+            except Exception:
+                logger.error("failed to delete api job, continuing" + traceback.format_exc())
+                deleted = False
+
+            # Jobs that could not be deleted are handed out again
+            self.tracker.done(job, deleted=deleted)
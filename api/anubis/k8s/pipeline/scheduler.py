@@ -0,0 +1,245 @@
+import json
+import time
+import traceback
+from typing import TYPE_CHECKING, Any
+
+from anubis.models import Submission, db
+from anubis.utils.config import get_config_int
+from anubis.utils.logging import logger
+from anubis.utils.redis import redis
+
+if TYPE_CHECKING:
+    from anubis.k8s.pipeline.tracker import PipelineJobTracker
+
+# Pipeline priorities. Lower numbers are admitted first.
+PRIORITY_PUSH = 0
+PRIORITY_REGRADE = 1
+PRIORITY_BULK_REGRADE = 2
+
+PRIORITIES: dict[int, str] = {
+    PRIORITY_PUSH:         "push",
+    PRIORITY_REGRADE:      "regrade",
+    PRIORITY_BULK_REGRADE: "bulk-regrade",
+}
+
+# submission_id -> json {priority, owner_id, enqueued}
+_PENDING_KEY = "anubis-pipeline-sched-pending"
+
+# priority -> number of pending submissions
+_DEPTH_KEY = "anubis-pipeline-sched-depth"
+
+# Number of recent wait times kept for each priority
+_WAITS_KEPT = 100
+
+
+def _owners_key(priority: int) -> str:
+    # Sorted set of owners with pending submissions, scored
+    # by when they should next be served.
+    return f"anubis-pipeline-sched-owners-{priority}"
+
+
+def _owner_queue_prefix(priority: int) -> str:
+    # Each owner gets a FIFO list of their pending submissions
+    return f"anubis-pipeline-sched-owner-{priority}-"
+
+
+def _waits_key(priority: int) -> str:
+    return f"anubis-pipeline-sched-waits-{priority}"
+
+
+# Add submissions to the scheduler, skipping ones that are already
+# pending. Owners that are not waiting join the back of the line.
+#
+# KEYS = [pending, depth, owners]
+# ARGV = [owner queue prefix, priority, now, (submission_id, owner_id, payload)...]
+_schedule_script = redis.register_script("""
+local added = 0
+for i = 4, #ARGV, 3 do
+    local submission_id = ARGV[i]
+    local owner_id = ARGV[i + 1]
+    if redis.call('HSETNX', KEYS[1], submission_id, ARGV[i + 2]) == 1 then
+        redis.call('RPUSH', ARGV[1] .. owner_id, submission_id)
+        redis.call('ZADD', KEYS[3], 'NX', ARGV[3], owner_id)
+        added = added + 1
+    end
+end
+redis.call('HINCRBY', KEYS[2], ARGV[2], added)
+return added
+""")
+
+# Pop the next submission for the owner at the front of the line.
+# The owner then goes to the back of the line if they have more
+# pending, so that one owner can not starve everyone else.
+#
+# KEYS = [pending, depth, owners]
+# ARGV = [owner queue prefix, priority, now]
+_pop_script = redis.register_script("""
+while true do
+    local owner_id = redis.call('ZRANGE', KEYS[3], 0, 0)[1]
+    if not owner_id then
+        return nil
+    end
+    local queue = ARGV[1] .. owner_id
+    local submission_id = redis.call('LPOP', queue)
+    if redis.call('LLEN', queue) == 0 then
+        redis.call('ZREM', KEYS[3], owner_id)
+    else
+        redis.call('ZADD', KEYS[3], ARGV[3], owner_id)
+    end
+    if submission_id then
+        local payload = redis.call('HGET', KEYS[1], submission_id)
+        redis.call('HDEL', KEYS[1], submission_id)
+        redis.call('HINCRBY', KEYS[2], ARGV[2], -1)
+        return {submission_id, payload}
+    end
+end
+""")
+
+
+def schedule_submission_pipelines(submission_ids: list[str], priority: int = PRIORITY_PUSH) -> int:
+    """
+    Add submissions to the pipeline scheduler. The pipeline poller admits
+    them as pipeline job slots free up. Submissions that are already
+    waiting to be admitted are skipped.
+
+    :param submission_ids:
+    :param priority: PRIORITY_PUSH, PRIORITY_REGRADE or PRIORITY_BULK_REGRADE
+    :return: number of submissions added
+    """
+    if len(submission_ids) == 0:
+        return 0
+
+    # Look up the owners for fair-share in a single query
+    owners: dict[str, str] = dict(
+        db.session.query(Submission.id, Submission.owner_id)
+        .filter(Submission.id.in_(list(submission_ids)))
+        .all()
+    )
+
+    now = time.time()
+    args = [_owner_queue_prefix(priority), priority, now]
+    for submission_id in submission_ids:
+        if submission_id not in owners:
+            logger.error(f"Unable to schedule missing submission {submission_id}")
+            continue
+
+        owner_id = owners[submission_id] or ""
+        payload = json.dumps({"priority": priority, "owner_id": owner_id, "enqueued": now})
+        args.extend([submission_id, owner_id, payload])
+
+    return _schedule_script(keys=[_PENDING_KEY, _DEPTH_KEY, _owners_key(priority)], args=args)
+
+
+def pop_scheduled_submissions(count: int) -> list[tuple[str, int]]:
+    """
+    Pop up to count submissions to admit to the pipeline, highest
+    priority first, round-robin between owners within each priority.
+
+    :param count:
+    :return: list of (submission id, priority)
+    """
+    submission_ids = []
+    waits: dict[int, list[float]] = {}
+
+    for priority in PRIORITIES:
+        while len(submission_ids) < count:
+            now = time.time()
+            result = _pop_script(
+                keys=[_PENDING_KEY, _DEPTH_KEY, _owners_key(priority)],
+                args=[_owner_queue_prefix(priority), priority, now],
+            )
+            if result is None:
+                break
+
+            submission_id, payload = result
+            submission_ids.append((submission_id.decode(), priority))
+            if payload is not None:
+                waits.setdefault(priority, []).append(now - json.loads(payload)["enqueued"])
+
+    # Record the wait times
+    if len(waits) > 0:
+        with redis.pipeline(transaction=False) as pipe:
+            for priority, priority_waits in waits.items():
+                pipe.lpush(_waits_key(priority), *priority_waits)
+                pipe.ltrim(_waits_key(priority), 0, _WAITS_KEPT - 1)
+            pipe.execute()
+
+    return submission_ids
+
+
+def admit_scheduled_pipelines(tracker: "PipelineJobTracker") -> list[str]:
+    """
+    Create pipeline jobs for scheduled submissions, up to the number
+    of free pipeline job slots in the cluster. Submissions just wait
+    in the scheduler until there is room for them. Submissions whose
+    job could not be created are scheduled again with their priority.
+
+    :param tracker:
+    :return: list of admitted submission ids
+    """
+    # Only the pipeline poller creates jobs. Everything else that schedules
+    # pipelines can skip importing the kubernetes client.
+    from anubis.k8s.pipeline.create import create_submission_pipeline
+
+    # Calculate the maximum number of jobs allowed in the cluster
+    max_jobs = get_config_int("PIPELINE_MAX_JOBS", default=10)
+
+    free_slots = max_jobs - tracker.active_count
+    if free_slots <= 0:
+        return []
+
+    admitted = []
+
+    # priority -> submission ids that could not be admitted
+    failed: dict[int, list[str]] = {}
+
+    for submission_id, priority in pop_scheduled_submissions(free_slots):
+        try:
+            job = create_submission_pipeline(submission_id)
+        except Exception as e:
+            logger.error(f"Failed to create pipeline for {submission_id} {e}\n{traceback.format_exc()}")
+            db.session.rollback()
+            failed.setdefault(priority, []).append(submission_id)
+            continue
+
+        # Count the job against the free slots right away
+        if job is not None:
+            tracker.add(job)
+        admitted.append(submission_id)
+
+    # Put the failed submissions back, so they are tried
+    # again on the next poll instead of being dropped.
+    for priority, submission_ids in failed.items():
+        schedule_submission_pipelines(submission_ids, priority)
+
+    return admitted
+
+
+def get_pipeline_scheduler_stats() -> dict[str, Any]:
+    """
+    Get the queue depth and recent wait times (in seconds)
+    for each pipeline priority.
+
+    :return:
+    """
+    with redis.pipeline(transaction=False) as pipe:
+        pipe.hgetall(_DEPTH_KEY)
+        for priority in PRIORITIES:
+            pipe.zcard(_owners_key(priority))
+            pipe.lrange(_waits_key(priority), 0, -1)
+        results = pipe.execute()
+
+    depths = {int(priority): int(depth) for priority, depth in results[0].items()}
+
+    stats = {}
+    for index, (priority, name) in enumerate(PRIORITIES.items()):
+        owners = results[1 + index * 2]
+        waits = [float(wait) for wait in results[2 + index * 2]]
+        stats[name] = {
+            "depth":    depths.get(priority, 0),
+            "owners":   owners,
+            "avg_wait": round(sum(waits) / len(waits), 2) if len(waits) > 0 else None,
+            "max_wait": round(max(waits), 2) if len(waits) > 0 else None,
+        }
+
+    return stats
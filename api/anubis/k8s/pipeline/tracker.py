@@ -0,0 +1,142 @@
+from datetime import datetime, timedelta
+from typing import Any, Callable
+
+from kubernetes import client
+
+from anubis.k8s.informer import K8sInformer
+from anubis.k8s.pipeline.get import PIPELINE_JOB_LABEL_SELECTOR
+
+
+def is_pipeline_job_finished(job: client.V1Job) -> bool:
+    return (job.status.succeeded or 0) >= 1 or (job.status.failed or 0) > (job.spec.backoff_limit or 0)
+
+
+class PipelineJobTracker(K8sInformer):
+    """
+    Track the submission pipeline jobs in the cluster with a single
+    kubernetes watch stream on batch/v1 jobs, instead of listing all
+    the jobs on every poll.
+
+    The tracker keeps a live count of the unfinished jobs (which the
+    pipeline scheduler uses to admit new jobs), and a queue of the jobs
+    that need to be reaped.
+
+    >>> tracker = PipelineJobTracker()
+    >>> tracker.start()
+    >>> tracker.wait_for_sync()
+    >>> for job in tracker.pop_reapable(timedelta(minutes=5)):
+    >>>     ...
+    >>>     tracker.done(job)
+    """
+
+    thread_name = "pipeline-job-tracker"
+    kind = "Pipeline job"
+
+    def __init__(
+        self,
+        namespace: str = "anubis",
+        label_selector: str = PIPELINE_JOB_LABEL_SELECTOR,
+        watch_timeout: int = 300,
+    ):
+        super().__init__(namespace, label_selector, watch_timeout)
+
+        # job name -> job
+        self._jobs: dict[str, client.V1Job] = {}
+
+        # Names of jobs that finished, in the order that they finished
+        self._finished: dict[str, None] = {}
+
+        # Names of jobs that have been handed out by pop_reapable
+        self._reaping: set[str] = set()
+
+    @property
+    def active_count(self) -> int:
+        """
+        Number of pipeline jobs that have not finished yet.
+
+        :return:
+        """
+        with self._lock:
+            return len(self._jobs) - len(self._finished)
+
+    def add(self, job: client.V1Job):
+        """
+        Add a job that was just created. This way it counts against the
+        active jobs right away, instead of once the watch catches up.
+
+        :param job:
+        :return:
+        """
+        with self._lock:
+            self._set_job(job)
+
+    def pop_reapable(self, timeout: timedelta) -> list[client.V1Job]:
+        """
+        Get the jobs that have finished, or are older than timeout. Jobs
+        are only handed out once, until they are passed back to done.
+
+        :param timeout:
+        :return:
+        """
+        now = datetime.utcnow()
+        with self._lock:
+            names = [name for name in self._finished if name not in self._reaping]
+            names.extend(
+                name
+                for name, job in self._jobs.items()
+                if name not in self._finished
+                and name not in self._reaping
+                and now - job.metadata.creation_timestamp.replace(tzinfo=None) > timeout
+            )
+            self._reaping.update(names)
+            return [self._jobs[name] for name in names]
+
+    def done(self, job: client.V1Job, deleted: bool = True):
+        """
+        Mark a job from pop_reapable as handled. If the job was not
+        deleted, it can be handed out again.
+
+        :param job:
+        :param deleted:
+        :return:
+        """
+        name = job.metadata.name
+        with self._lock:
+            self._reaping.discard(name)
+            if deleted:
+                self._remove(name)
+
+    def _set_job(self, job: client.V1Job):
+        # Caller must hold the lock
+        name = job.metadata.name
+
+        # Jobs that are being deleted have already been reaped
+        if job.metadata.deletion_timestamp is not None:
+            self._remove(name)
+            return
+
+        self._jobs[name] = job
+        if is_pipeline_job_finished(job):
+            self._finished.setdefault(name, None)
+
+    def _remove(self, name: str):
+        # Caller must hold the lock
+        self._jobs.pop(name, None)
+        self._finished.pop(name, None)
+        self._reaping.discard(name)
+
+    def _get_list_func(self) -> Callable[..., Any]:
+        return client.BatchV1Api().list_namespaced_job
+
+    def _replace(self, items: list[client.V1Job]):
+        names = {job.metadata.name for job in items}
+        for name in set(self._jobs.keys()).difference(names):
+            self._remove(name)
+        for job in items:
+            self._set_job(job)
+
+    def _apply(self, event_type: str, job: client.V1Job):
+        if event_type == "DELETED":
+            self._remove(job.metadata.name)
+        else:
+            self._set_job(job)
@@ -3,6 +3,9 @@ from kubernetes import client as k8s
 from anubis.models import TheiaSession
 from anubis.env import env
 
+# Label selector for all theia session pods
+THEIA_POD_LABEL_SELECTOR = "app.kubernetes.io/name=anubis,role=theia-session"
+
 
 def list_theia_pods() -> k8s.V1PodList:
     """
@@ -17,7 +20,7 @@ def list_theia_pods() -> k8s.V1PodList:
     # list pods by label selector
     pods = v1.list_namespaced_pod(
         namespace="anubis",
-        label_selector="app.kubernetes.io/name=anubis,role=theia-session",
+        label_selector=THEIA_POD_LABEL_SELECTOR,
     )
 
     return pods
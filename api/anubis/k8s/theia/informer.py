@@ -0,0 +1,116 @@
+from typing import Any, Callable
+
+from kubernetes import client as k8s
+
+from anubis.k8s.informer import K8sInformer
+from anubis.k8s.theia.get import THEIA_POD_LABEL_SELECTOR
+
+
+def _get_pod_session_id(pod: k8s.V1Pod) -> str | None:
+    labels = pod.metadata.labels or {}
+    return labels.get("session", None)
+
+
+def _get_pod_state(pod: k8s.V1Pod) -> tuple:
+    """
+    The parts of a pod that the theia session records care about.
+    Watch events that do not change these are ignored.
+
+    :param pod:
+    :return:
+    """
+    return (
+        pod.status.phase,
+        pod.status.pod_ip,
+        pod.metadata.deletion_timestamp is not None,
+    )
+
+
+class TheiaPodInformer(K8sInformer):
+    """
+    Keep an in memory index of the theia pods in the cluster using a
+    single kubernetes watch stream, instead of reading each pod from the
+    api on every poll.
+
+    The index is keyed by the session label on the pods. When the phase or
+    ip of a pod changes (or it is deleted), its session id is marked as
+    dirty. The poller then only needs to update the sessions that have
+    changed.
+
+    >>> informer = TheiaPodInformer()
+    >>> informer.start()
+    >>> informer.wait_for_sync()
+    >>> for session_id in informer.pop_dirty():
+    >>>     pod = informer.get_pod(session_id)
+    """
+
+    thread_name = "theia-pod-informer"
+    kind = "Theia pod"
+
+    def __init__(
+        self,
+        namespace: str = "anubis",
+        label_selector: str = THEIA_POD_LABEL_SELECTOR,
+        watch_timeout: int = 300,
+    ):
+        super().__init__(namespace, label_selector, watch_timeout)
+
+        # session_id -> pod
+        self._pods: dict[str, k8s.V1Pod] = {}
+
+        # session ids that have changed since the last pop_dirty
+        self._dirty: set[str] = set()
+
+    def get_pod(self, session_id: str) -> k8s.V1Pod | None:
+        with self._lock:
+            return self._pods.get(session_id, None)
+
+    def pods(self) -> dict[str, k8s.V1Pod]:
+        with self._lock:
+            return dict(self._pods)
+
+    def pop_dirty(self) -> set[str]:
+        """
+        Get and clear the session ids whose pods have changed.
+
+        :return:
+        """
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        return dirty
+
+    def _set_pod(self, session_id: str, pod: k8s.V1Pod | None):
+        # Caller must hold the lock
+        previous = self._pods.get(session_id, None)
+
+        if pod is None:
+            if previous is not None:
+                del self._pods[session_id]
+                self._dirty.add(session_id)
+            return
+
+        self._pods[session_id] = pod
+        if previous is None or _get_pod_state(previous) != _get_pod_state(pod):
+            self._dirty.add(session_id)
+
+    def _get_list_func(self) -> Callable[..., Any]:
+        return k8s.CoreV1Api().list_namespaced_pod
+
+    def _replace(self, items: list[k8s.V1Pod]):
+        pods = {}
+        for pod in items:
+            session_id = _get_pod_session_id(pod)
+            if session_id is not None:
+                pods[session_id] = pod
+
+        for session_id in set(self._pods.keys()).difference(pods.keys()):
+            self._set_pod(session_id, None)
+        for session_id, pod in pods.items():
+            self._set_pod(session_id, pod)
+
+    def _apply(self, event_type: str, pod: k8s.V1Pod):
+        session_id = _get_pod_session_id(pod)
+        if session_id is None:
+            return
+
+        self._set_pod(session_id, None if event_type == "DELETED" else pod)
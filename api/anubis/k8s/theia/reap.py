@@ -1,6 +1,8 @@
 from datetime import timedelta, datetime
+from typing import Any
 
 from kubernetes import client as k8s, config as k8s_config
+from sqlalchemy import or_
 
 from anubis.ide.reap import mark_session_ended
 from anubis.k8s.theia.get import list_theia_pods
@@ -12,15 +14,18 @@ from anubis.utils.logging import logger
 from anubis.lms.reserve import get_active_reserved_sessions
 
 
-def reap_stale_theia_sessions(*_):
+def reap_stale_theia_sessions(*_) -> dict[str, Any]:
     """
     Reap any and all stale sessions either in the database or
     in kubernetes. This function should be run periodically in
     the reap job to ensure that the state in the database matches
     what is running in the cluster and vice versa.
 
+    The database work is a fixed number of set based queries,
+    no matter how many pods or sessions there are.
+
     :param _:
-    :return:
+    :return: reconcile report
     """
 
     # Load the incluster config
@@ -33,19 +38,30 @@ def reap_stale_theia_sessions(*_):
     theia_pods = list_theia_pods()
 
     # Update the records for pod ip addresses
-    update_theia_pod_cluster_addresses(theia_pods)
+    updated_address_ids = update_theia_pod_cluster_addresses(theia_pods)
 
     # Check that all theia sessions have not
     # reached the global timeout.
-    reap_old_theia_sessions(theia_pods)
+    aged_out_ids = reap_old_theia_sessions(theia_pods)
 
     # Make sure that database entries marked
     # as active have pods and pods have active
     # database entries.
-    reap_stale_theia_k8s_resources(theia_pods)
+    stale_report = reap_stale_theia_k8s_resources(theia_pods, skip_session_ids=set(aged_out_ids))
 
     db.session.commit()
 
+    report = {
+        "pods":              len(theia_pods.items),
+        "updated_addresses": updated_address_ids,
+        "aged_out":          aged_out_ids,
+        **stale_report,
+    }
+
+    logger.info(f"Theia reconcile report {report}")
+
+    return report
+
 
 def reap_theia_session_k8s_resources(theia_session_id: str):
     """
@@ -70,43 +86,38 @@ def reap_theia_session_k8s_resources(theia_session_id: str):
     )
 
 
-def reap_old_theia_sessions(theia_pods: k8s.V1PodList):
+def reap_old_theia_sessions(theia_pods: k8s.V1PodList) -> list[str]:
     """
     Check that all the active pods have not reached the
     maximum lifetime of a theia session.
 
     :param theia_pods:
-    :return:
+    :return: ids of the sessions that were reaped
     """
 
     # Get stale timeout hours
     theia_stale_timeout_hours = get_config_int("THEIA_STALE_TIMEOUT_HOURS", default=6)
     theia_stale_timeout = timedelta(hours=theia_stale_timeout_hours)
 
-    # Iterate through all active
-    for n, pod in enumerate(theia_pods.items):
-
-        # Get the theia session id from the pod labels
-        session_id = pod.metadata.labels["session"]
+    # Get the theia session ids from the pod labels
+    pod_session_ids = [pod.metadata.labels["session"] for pod in theia_pods.items]
+    if len(pod_session_ids) == 0:
+        return []
 
-        # Get the database entry for the theia session
-        theia_session: TheiaSession = TheiaSession.query.filter(TheiaSession.id == session_id).first()
-
-        # Make sure we have a session to work on
-        if theia_session is None:
-            continue
-
-        if datetime.now() <= theia_session.created + theia_stale_timeout:
-            logger.info(f"NOT reaping session {theia_session.id}: age ok")
-            continue
+    # Get all the sessions for the pods that are too old at once
+    old_theia_sessions: list[TheiaSession] = TheiaSession.query.filter(
+        TheiaSession.id.in_(pod_session_ids),
+        TheiaSession.created < datetime.now() - theia_stale_timeout,
+    ).all()
 
+    for theia_session in old_theia_sessions:
         # Reap the session
         logger.info(f"Reaping session {theia_session.id}: age bad")
         reap_theia_session(theia_session, commit=False)
 
-        # Batch commits in size of 5
-        if n % 5 == 0:
-            db.session.commit()
+    db.session.commit()
+
+    return [theia_session.id for theia_session in old_theia_sessions]
 
 
 def reap_theia_session(theia_session: TheiaSession, commit: bool = True):
@@ -247,7 +258,10 @@ def reap_theia_playgrounds_all():
     db.session.commit()
 
 
-def reap_stale_theia_k8s_resources(theia_pods: k8s.V1PodList):
+def reap_stale_theia_k8s_resources(
+    theia_pods: k8s.V1PodList,
+    skip_session_ids: set[str] | None = None,
+) -> dict[str, list[str]]:
     """
     Checks that all active Theia Sessions have active pods.
 
@@ -261,12 +275,16 @@ def reap_stale_theia_k8s_resources(theia_pods: k8s.V1PodList):
     figure that out and delete the "stale" pod.
 
     :param theia_pods:
-    :return:
+    :param skip_session_ids: sessions that have already been reaped
+    :return: stale pod and session ids
     """
 
     # Log the event
     logger.info("Checking active ActiveTheia sessions")
 
+    if skip_session_ids is None:
+        skip_session_ids = set()
+
     # Get the theia timeout config value
     standard_theia_timeout = get_config_int("THEIA_STALE_PROXY_MINUTES", default=10)
     admin_theia_timeout = get_config_int("THEIA_ADMIN_STALE_PROXY_MINUTES", default=60)
@@ -274,80 +292,53 @@ def reap_stale_theia_k8s_resources(theia_pods: k8s.V1PodList):
     # Get list of all courses
     courses: list[Course] = get_active_courses()
 
-    # List of sessions that are marked active in db
-    active_db_sessions: list[TheiaSession] = []
+    # Get (heavily cached) admin ids for each course. Admins
+    # are held to the longer admin timeout.
+    course_admin_ids: dict[str, set[str]] = {
+        course.id: set(get_course_admin_ids(course.id))
+        for course in courses
+    }
 
     # now
     now = datetime.now()
 
-    # Iterate over all courses
-    for course in courses:
-        print("filtering stale ides for course {} - {}".format(course.name, course.course_code))
-
-        # Get a list of (heavily cached) admin id strings
-        course_admin_ids = get_course_admin_ids(course.id)
-        print("course_admin_ids", course.name, course_admin_ids, sep=" :: ")
-
-        # Build query for theia active sessions within the course
-        query = TheiaSession.query.filter(
-            # Get sessions marked as active
-            TheiaSession.active == True,
-            # Only consider sessions that have had some
-            # time to have their k8s resources requested.
-            TheiaSession.k8s_requested == True,
-            # Only consider sessions that are a part of
-            # this course.
-            TheiaSession.course_id == course.id,
-        )
-
-        # Get a list of the standard (student) theia sessions that are active
-        standard_active_db_theia_sessions: list[TheiaSession] = query.filter(
-            # Filter out admin users (only students in the course)
-            ~TheiaSession.owner_id.in_(course_admin_ids),
-            # Filter for sessions that have had a proxy in the last 10 minutes
-            TheiaSession.last_proxy >= now - timedelta(minutes=standard_theia_timeout),
-        ).all()
-
-        # Get a list of the admin (professor/ta) theia sessions that are active
-        admin_active_db_theia_sessions: list[TheiaSession] = query.filter(
-            # Filter for admin users (only professors+tas)
-            TheiaSession.owner_id.in_(course_admin_ids),
-            # Filter for sessions that have had a proxy in the last 60 minutes
-            TheiaSession.last_proxy >= now - timedelta(minutes=admin_theia_timeout),
-        ).all()
-
-        # Build list of all the active theia ides (in the database)
-        # from the standard and admin sessions.
-        active_db_sessions.extend(standard_active_db_theia_sessions)
-        active_db_sessions.extend(admin_active_db_theia_sessions)
-
-    # Make sure to cover theia sessions that do not have a set
-    # course as well. Hold these course-less ides to the
-    # standard timeout.
-    no_course_db_active_sessions: list[TheiaSession] = TheiaSession.query.filter(
+    # Get all the sessions that could still be active in one query. Sessions
+    # in active courses and course-less sessions are considered.
+    candidate_db_sessions = db.session.query(
+        TheiaSession.id,
+        TheiaSession.owner_id,
+        TheiaSession.course_id,
+        TheiaSession.last_proxy,
+    ).filter(
         # Get sessions marked as active
         TheiaSession.active == True,
         # Only consider sessions that have had some
         # time to have their k8s resources requested.
         TheiaSession.k8s_requested == True,
-        # Course-less theia session
-        TheiaSession.course_id == None,
-        # Filter for sessions that have had a proxy in the last 10 minutes
-        TheiaSession.last_proxy >= now - timedelta(minutes=standard_theia_timeout),
+        # Only consider sessions that are a part of an
+        # active course, or do not have a course.
+        or_(
+            TheiaSession.course_id == None,
+            TheiaSession.course_id.in_(list(course_admin_ids.keys())),
+        ),
+        # Filter for sessions that have had a proxy within the longest timeout
+        TheiaSession.last_proxy >= now - timedelta(minutes=max(standard_theia_timeout, admin_theia_timeout)),
     ).all()
 
-    # Print the course-less ides to the screen
-    logger.info(f"no-course ides {no_course_db_active_sessions=}")
+    # Build set of active db session ids. Students, and course-less
+    # sessions must have had a proxy within the standard timeout.
+    active_db_ids = set()
+    for session_id, owner_id, course_id, last_proxy in candidate_db_sessions:
+        timeout = standard_theia_timeout
+        if course_id is not None and owner_id in course_admin_ids[course_id]:
+            timeout = admin_theia_timeout
 
-    # Add the no-course theia sessions to the active db sessions list
-    active_db_sessions.extend(no_course_db_active_sessions)
+        if last_proxy >= now - timedelta(minutes=timeout):
+            active_db_ids.add(session_id)
 
     # Build set of active pod session ids
     active_pod_ids = set(pod.metadata.labels["session"] for pod in theia_pods.items)
 
-    # Build set of active db session ids
-    active_db_ids = set(active_db_session.id for active_db_session in active_db_sessions)
-
     # Figure out reserved session IDs
     reserved_sessions = get_active_reserved_sessions()
     reserved_session_ids = set(reserved_session.id for reserved_session in reserved_sessions)
@@ -359,9 +350,9 @@ def reap_stale_theia_k8s_resources(theia_pods: k8s.V1PodList):
     logger.info(f'{len(active_pod_ids)} {active_pod_ids=}')
 
     # Figure out which ones don't match and need to be updated.
-    # (not including sessions reserved)
-    stale_pods_ids = active_pod_ids.difference(active_db_ids)
-    stale_db_ids = active_db_ids.difference(active_pod_ids)
+    # (not including sessions reserved, or already reaped)
+    stale_pods_ids = active_pod_ids.difference(active_db_ids).difference(skip_session_ids)
+    stale_db_ids = active_db_ids.difference(active_pod_ids).difference(reserved_session_ids)
 
     # Log which stale pods we need to clean up
     logger.info("Found stale theia pods to reap: {}".format(str(list(stale_pods_ids))))
@@ -369,16 +360,36 @@ def reap_stale_theia_k8s_resources(theia_pods: k8s.V1PodList):
     # Log the stale database entries we need to cleanup
     logger.info("Found stale theia database entries: {}".format(str(list(stale_db_ids))))
 
-    # Reap theia sessions
+    # Reap theia sessions for the stale pods. The sessions are
+    # loaded in one query.
+    stale_pod_sessions: dict[str, TheiaSession] = {
+        theia_session.id: theia_session
+        for theia_session in TheiaSession.query.filter(
+            TheiaSession.id.in_(list(stale_pods_ids)),
+        ).all()
+    } if len(stale_pods_ids) > 0 else {}
 
     for stale_pod_id in stale_pods_ids:
         logger.info(f'Reaping stale pod session-id: {stale_pod_id}')
-        reap_theia_session_by_id(stale_pod_id)
+        theia_session = stale_pod_sessions.get(stale_pod_id, None)
+
+        # Sessions that are still marked active in the database get the full
+        # reap. Otherwise, there is only the k8s resources left to delete.
+        if theia_session is not None and theia_session.active:
+            reap_theia_session(theia_session, commit=False)
+        else:
+            reap_theia_session_k8s_resources(stale_pod_id)
 
     # Update database entries
-    TheiaSession.query.filter(
-        TheiaSession.id.in_(list(stale_db_ids.difference(reserved_session_ids))),
-    ).update({TheiaSession.active: False}, False)
+    if len(stale_db_ids) > 0:
+        TheiaSession.query.filter(
+            TheiaSession.id.in_(list(stale_db_ids)),
+        ).update({TheiaSession.active: False}, False)
 
     # Commit any and all changes to the database
     db.session.commit()
+
+    return {
+        "stale_pods":     list(stale_pods_ids),
+        "stale_sessions": list(stale_db_ids),
+    }
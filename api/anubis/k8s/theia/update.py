@@ -7,6 +7,7 @@ from kubernetes import client as k8s
 
 from anubis.k8s.theia.create import create_k8s_resources_for_ide
 from anubis.k8s.theia.get import get_theia_pod_name
+from anubis.k8s.theia.informer import TheiaPodInformer
 from anubis.lms.theia import get_active_theia_sessions
 from anubis.lms.reserve import is_session_reserved
 from anubis.models import TheiaSession, db
@@ -14,34 +15,45 @@ from anubis.utils.logging import logger
 from anubis.utils.redis import create_redis_lock
 from anubis.utils.datetime import convert_to_local
 
-def update_theia_pod_cluster_addresses(theia_pods: k8s.V1PodList):
+def update_theia_pod_cluster_addresses(theia_pods: k8s.V1PodList) -> list[str]:
     """
-    Iterate through all theia pods, updating the pod cluster
-    addresses in the database as we go.
+    Update the cluster addresses in the database for all theia pods.
+    The current addresses are read in a single query, and only the
+    sessions whose address has changed are updated.
 
     :param theia_pods:
-    :return:
+    :return: ids of the sessions that were updated
     """
 
-    # Iterate through all active
-    for n, pod in enumerate(theia_pods.items):
-        # Get the session id from the pod labels
-        session_id = pod.metadata.labels["session"]
-
-        # Get the database entry for the theia session
-        theia_session: TheiaSession = TheiaSession.query.filter(TheiaSession.id == session_id).first()
-
-        # Make sure we have a session to work on
-        if theia_session is None:
-            continue
-
-        # Update the theia session record in the database with
-        # the pod cluster address.
-        theia_session.cluster_address = pod.status.pod_ip
+    # session id -> pod address
+    pod_addresses: dict[str, str | None] = {
+        pod.metadata.labels["session"]: pod.status.pod_ip
+        for pod in theia_pods.items
+    }
+
+    if len(pod_addresses) == 0:
+        return []
+
+    # Get the database addresses of all the sessions at once
+    db_addresses = db.session.query(TheiaSession.id, TheiaSession.cluster_address).filter(
+        TheiaSession.id.in_(list(pod_addresses.keys())),
+    ).all()
+
+    # Update the theia session records in the database
+    # whose pod cluster addresses have changed.
+    updates = [
+        {"id": session_id, "cluster_address": pod_addresses[session_id]}
+        for session_id, cluster_address in db_addresses
+        if cluster_address != pod_addresses[session_id]
+    ]
+    if len(updates) > 0:
+        db.session.bulk_update_mappings(TheiaSession, updates)
 
     # Commit any and all changes
     db.session.commit()
 
+    return [update["id"] for update in updates]
+
 
 def update_all_theia_sessions():
     """
@@ -72,6 +84,78 @@ def update_all_theia_sessions():
             pass
 
 
+def update_theia_sessions_from_informer(informer: TheiaPodInformer, resync: bool = False):
+    """
+    Update the theia sessions whose pods have changed since the last
+    call, using the pods from the informer index instead of reading each
+    pod from the kubernetes api.
+
+    Some updates depend on time instead of pod changes (like aging out
+    pods that never started). With resync, all active sessions are
+    checked against the index.
+
+    :param informer:
+    :param resync: check all active sessions
+    :return:
+    """
+
+    # Sessions whose pods have changed
+    session_ids = informer.pop_dirty()
+
+    # Pending pods make progress through events (scheduling, volume
+    # attaching) that do not change the pod, so they are always checked.
+    session_ids.update(
+        session_id
+        for session_id, pod in informer.pods().items()
+        if pod.status.phase == "Pending"
+    )
+
+    # Load all the sessions in one query
+    sessions: list[TheiaSession] = []
+    if len(session_ids) > 0:
+        sessions = TheiaSession.query.filter(
+            TheiaSession.id.in_(list(session_ids)),
+            TheiaSession.active == True,
+        ).all()
+
+    if resync:
+        loaded_ids = {session.id for session in sessions}
+        sessions.extend(session for session in get_active_theia_sessions() if session.id not in loaded_ids)
+
+    if len(sessions) == 0:
+        return
+
+    v1 = k8s.CoreV1Api()
+    for session in sessions:
+        lock = create_redis_lock(f'theia-session-{session.id}')
+        if not lock.acquire(blocking=False):
+            continue
+
+        try:
+            pod = informer.get_pod(session.id)
+            if pod is None:
+                set_theia_session_unscheduled(session)
+            else:
+                update_theia_session_from_pod(session, pod, v1)
+
+            # Commit while the lock is still held
+            db.session.commit()
+        except Exception as e:
+            logger.error(f'Failed to update theia session {session.id} {e}\n{traceback.format_exc()}')
+            db.session.rollback()
+        finally:
+            # Release lock
+            try:
+                lock.release()
+            except pottery.exceptions.ReleaseUnlockedLock:
+                print(traceback.format_exc())
+
+
+def set_theia_session_unscheduled(session: TheiaSession):
+    if session.state != "Waiting for IDE to be scheduled...":
+        session.state = "Waiting for IDE to be scheduled..."
+
+
 def update_theia_session(session: TheiaSession):
     # Load the kubernetes incluster config
     v1 = k8s.CoreV1Api()
@@ -92,9 +176,8 @@ def update_theia_session(session: TheiaSession):
 
         # If the status code is 404, then it has not been created yet
         if e.status == 404:
-            if session.state != "Waiting for IDE to be scheduled...":
-                session.state = "Waiting for IDE to be scheduled..."
-                db.session.commit()
+            set_theia_session_unscheduled(session)
+            db.session.commit()
             return
 
         # Error
@@ -102,6 +185,24 @@ def update_theia_session(session: TheiaSession):
         logger.error("continuing")
         return
 
+    update_theia_session_from_pod(session, pod, v1)
+    db.session.commit()
+
+
+def update_theia_session_from_pod(session: TheiaSession, pod: k8s.V1Pod, v1: k8s.CoreV1Api):
+    """
+    Update a theia session record from the state of its pod.
+
+    * Does not commit changes *
+
+    :param session:
+    :param pod:
+    :param v1:
+    :return:
+    """
+
+    # Get the name of the pod
+    pod_name = pod.metadata.name
 
     # Get age of session
     age: timedelta = datetime.now() - convert_to_local(pod.metadata.creation_timestamp)
@@ -130,8 +231,6 @@ def update_theia_session(session: TheiaSession):
             logger.error(f'Failed to re-create aged out session {e} {session}\n{traceback.format_exc()}')
             return
 
-        # Commit changes to session.k8s_requested
-        db.session.commit()
         return
 
     # Update the session state from the pod status
@@ -202,8 +301,6 @@ def update_theia_session(session: TheiaSession):
         else:
             session.state = "Waiting for IDE server to start..."
 
-        db.session.commit()
-
     # If the pod has failed. There are more than a few ways that
     # the pod could have failed. If we reach this, then we should
     # just mark the theia session as failed, then let the reaper
@@ -216,11 +313,12 @@ def update_theia_session(session: TheiaSession):
         # Log the failure
         logger.error("Theia session failed {}".format(pod_name))
 
-        db.session.commit()
-
     # If the pod is marked as running. The pod is marked as
-    # running when the main containers have started
-    if pod.status.phase == "Running":
+    # running when the main containers have started. Skip if
+    # the session has already been marked as running.
+    if pod.status.phase == "Running" and (
+        session.state != "Running" or session.cluster_address != pod.status.pod_ip
+    ):
         # set the cluster address and state
         session.cluster_address = pod.status.pod_ip
         session.state = "Running"
@@ -237,5 +335,3 @@ def update_theia_session(session: TheiaSession):
 
         # Log the success
         logger.info("Theia session started {}".format(pod_name))
-
-        db.session.commit()
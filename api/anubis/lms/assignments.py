@@ -5,8 +5,8 @@ from typing import Any
 from sqlalchemy import or_, and_
 from flask_sqlalchemy import get_debug_queries
 
-from anubis.github.repos import create_assignment_group_repo, delete_assignment_repo
-from anubis.github.repos import verify_collaborators_assignment
+from anubis.github.repos import delete_assignment_repo, provision_assignment_group_repos
+from anubis.github.repos import verify_collaborators_assignments
 from anubis.lms.autograde import autograde
 from anubis.lms.courses import (
     assert_course_admin,
@@ -16,6 +16,7 @@ from anubis.lms.courses import (
     is_course_archived,
 )
 from anubis.lms.questions import ingest_questions
+from anubis.lms.repo_index import index_assignments, unindex_assignment
 from anubis.models import (
     TheiaSession,
     AssignmentQuestion,
@@ -24,6 +25,7 @@ from anubis.models import (
     Assignment,
     AssignmentRepo,
     AssignmentTest,
+    BestSubmission,
     Course,
     LateException,
     Submission,
@@ -32,27 +34,29 @@ from anubis.models import (
     User,
     db,
 )
-from anubis.utils.auth.user import verify_users
-from anubis.utils.cache import cache
+from anubis.utils.auth.user import get_user_id, verify_users
+from anubis.utils.cache import cache_tag, tagged_memoize
 from anubis.utils.config import get_config_int
 from anubis.utils.data import is_debug
 from anubis.utils.data import req_assert
 from anubis.utils.logging import logger
 
 
-@cache.memoize(timeout=30, unless=is_debug)
+@tagged_memoize(lambda assignment_id: [cache_tag("assignment", assignment_id)], unless=is_debug)
 def get_assignment_grace(assignment_id: str) -> datetime:
     assignment: Assignment = Assignment.query.filter(Assignment.id == assignment_id).first()
     return assignment.grace_date
 
 
-@cache.memoize(timeout=30, unless=is_debug)
+@tagged_memoize(lambda assignment_id: [cache_tag("assignment", assignment_id)], unless=is_debug)
 def get_assignment_due(assignment_id: str) -> datetime:
     assignment: Assignment = Assignment.query.filter(Assignment.id == assignment_id).first()
     return assignment.due_date
 
 
-@cache.memoize(timeout=30)
+@tagged_memoize(
+    lambda user_id, assignment_id, grace: [cache_tag("user", user_id), cache_tag("assignment", assignment_id)],
+)
 def get_assignment_due_date(user_id: str, assignment_id: str, grace: bool = False) -> datetime:
     """
     Get the due date for an assignment for a specific user. We check to
@@ -93,7 +97,11 @@ def get_assignment_due_date(user_id: str, assignment_id: str, grace: bool = Fals
     return due_date
 
 
-@cache.memoize(timeout=30, unless=is_debug)
+@tagged_memoize(
+    lambda user_id, assignment_id: [cache_tag("user", user_id), cache_tag("assignment", assignment_id)],
+    timeout=30,
+    unless=is_debug,
+)
 def get_assignment_data(user_id: str, assignment_id: str) -> dict[str, Any] | None:
     assignment: Assignment = Assignment.query.filter(Assignment.id == assignment_id).first()
 
@@ -138,7 +146,12 @@ def get_all_assignments(course_ids: set[str], admin_course_ids: set[str]) -> lis
     return assignments
 
 
-@cache.memoize(timeout=60, unless=is_debug, source_check=True)
+@tagged_memoize(
+    lambda netid, course_id: [cache_tag("user", get_user_id(netid))],
+    timeout=60,
+    unless=is_debug,
+    source_check=True,
+)
 def get_assignments(netid: str, course_id=None) -> list[dict[str, Any]] | None:
     """
     Get all the current assignments for a netid. Optionally specify a course_id
@@ -295,6 +308,9 @@ def assignment_sync(assignment_data: dict) -> tuple[dict | str, bool]:
     # Commit changes
     db.session.commit()
 
+    # Pushes to the assignment's repos are matched from the index
+    index_assignments([assignment])
+
     return {"assignment": assignment.full_data, "questions": question_message}, True
 
 
@@ -387,6 +403,11 @@ def delete_assignment_submissions(assignment: Assignment):
     :param assignment:
     :return:
     """
+    # The materialized best submissions point at the submissions
+    BestSubmission.query.filter(
+        BestSubmission.assignment_id == assignment.id,
+    ).delete(synchronize_session=False)
+
     submission_ids = db.session.query(Submission.id).filter(Submission.assignment_id == assignment.id)
     SubmissionTestResult.query.filter(SubmissionTestResult.submission_id.in_(submission_ids.subquery())).delete(
         synchronize_session=False
@@ -438,6 +459,9 @@ def delete_assignment(assignment: Assignment) -> None:
     :return:
     """
 
+    # The row is gone once this commits
+    unique_code = assignment.unique_code
+
     # Delete theia sessions
     TheiaSession.query.filter(TheiaSession.assignment_id == assignment.id).delete(synchronize_session=False)
 
@@ -453,6 +477,9 @@ def delete_assignment(assignment: Assignment) -> None:
 
     db.session.commit()
 
+    # Stop matching pushes to the deleted assignment
+    unindex_assignment(unique_code)
+
 
 def convert_group_netids_to_group_users(group_netids: list[list[str]]) -> tuple[list[User], list[list[User]]]:
     """
@@ -513,14 +540,9 @@ def make_shared_assignment(assignment_id: str, group_netids: list[list[str]]) ->
     failed_to_create = []
     failed_to_configure = []
 
+    # Create the repos for all the groups
     all_repos = []
-    for group in groups:
-        if len(group) == 0:
-            continue
-
-        # Create the repo for the group
-        repos = create_assignment_group_repo(group, assignment)
-
+    for group, repos, _ in provision_assignment_group_repos(assignment, [group for group in groups if len(group) > 0]):
         # Track group
         all_repos.extend(repos)
 
@@ -566,8 +588,8 @@ def verify_active_assignment_github_repo_collaborators():
     """
     active_assignments = get_active_assignments()
 
-    for assignment in active_assignments:
-        verify_collaborators_assignment(assignment)
+    # Verify all the repos together so the collaborator lookups can be batched
+    verify_collaborators_assignments(active_assignments)
 
 
 def get_assignment_tests(assignment: Assignment, visible_only: bool = True):
@@ -2,12 +2,24 @@ import logging
 from datetime import datetime
 
 from parse import parse
-from sqlalchemy.sql import func, select
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.orm import joinedload, selectinload, undefer
+from sqlalchemy.sql import case, delete, distinct, func, select, update
 
 from anubis.env import env
-from anubis.lms.students import get_students_in_class
-from anubis.models import db, Assignment, AssignmentTest, Submission, SubmissionTestResult
-from anubis.utils.cache import cache
+from anubis.models import (
+    db,
+    Assignment,
+    AssignmentTest,
+    BestSubmission,
+    InCourse,
+    LateException,
+    Submission,
+    SubmissionBuild,
+    SubmissionTestResult,
+    User,
+)
+from anubis.utils.cache import cache, cache_tag, tagged_memoize
 from anubis.utils.data import is_debug, is_job
 from anubis.utils.http import error_response
 from anubis.utils.logging import logger
@@ -20,22 +32,35 @@ def _get_assignment_test_count(assignment_id) -> int:
     ).count()
 
 
-@cache.memoize(timeout=5, unless=is_debug, source_check=True, forced_update=is_job)
-def autograde(student_id, assignment_id, max_time: datetime = None):
+def _rank_best_submissions(
+    assignment_id: str,
+    student_ids: list[str] | None = None,
+    max_time: datetime | None = None,
+) -> list[tuple[str, str, int]]:
     """
-    Get the stats for a specific student on a specific assignment.
+    Find the best submission for every student on an assignment using
+    set based queries instead of walking each submission history in python.
 
-    Pulls all submissions, then finds the most recent one that
-    has the most tests that passed.
+    The number of passed tests is aggregated per submission, then the
+    submissions are window ranked per owner. The ranking mirrors what the
+    original per student scan did:
 
-    * This function is heavily cached as it is IO intensive on the DB *
+    * The submission with the most passed tests wins
+    * If a submission passes every test, the most recent one wins
+    * Otherwise, the oldest of the tied submissions wins
+
+    * The cost of this function does not scale with students x submissions,
+    it is a fixed number of queries for the entire assignment *
 
-    :param student_id:
     :param assignment_id:
-    :param max_time:
-    :return:
+    :param student_ids: optionally limit to these students
+    :param max_time: optionally ignore submissions created after this time
+    :return: list of (owner_id, submission_id, tests_passed)
     """
 
+    # Get the max number of assignment tests that can be passed
+    max_correct = _get_assignment_test_count(assignment_id)
+
     # list of filters for submission query
     submission_filters = []
 
@@ -43,54 +68,394 @@ def autograde(student_id, assignment_id, max_time: datetime = None):
     if max_time is not None:
         submission_filters.append(Submission.created <= max_time)
 
-    # best is the best submission seen so far
-    best = None
+    # Only look at the specified students
+    if student_ids is not None:
+        submission_filters.append(Submission.owner_id.in_(student_ids))
+
+    # Count distinct passed tests per submission. Duplicate deliveries
+    # of the same test result are only counted once. The submission filters
+    # are applied here too so only the needed submissions are aggregated.
+    pass_counts = (
+        select(
+            SubmissionTestResult.submission_id.label("submission_id"),
+            func.count(distinct(SubmissionTestResult.assignment_test_id)).label("tests_passed"),
+        )
+        .join(Submission, Submission.id == SubmissionTestResult.submission_id)
+        .where(
+            Submission.assignment_id == assignment_id,
+            SubmissionTestResult.passed == True,
+            *submission_filters,
+        )
+        .group_by(SubmissionTestResult.submission_id)
+        .subquery()
+    )
+    tests_passed = func.coalesce(pass_counts.c.tests_passed, 0)
+
+    # Rank the submissions for each student
+    ranked = (
+        select(
+            Submission.id.label("submission_id"),
+            Submission.owner_id.label("owner_id"),
+            tests_passed.label("tests_passed"),
+            func.row_number().over(
+                partition_by=Submission.owner_id,
+                order_by=(
+                    tests_passed.desc(),
+                    case((tests_passed >= max_correct, Submission.created)).desc(),
+                    Submission.created.asc(),
+                    Submission.id.asc(),
+                ),
+            ).label("rank"),
+        )
+        .select_from(Submission)
+        .outerjoin(pass_counts, pass_counts.c.submission_id == Submission.id)
+        .where(
+            Submission.assignment_id == assignment_id,
+            Submission.owner_id != None,
+            Submission.accepted == True,
+            *submission_filters,
+        )
+        .subquery()
+    )
 
-    # best_count is the most tests that have
-    # passed for this student so far
-    best_count = -1
+    # Pull only the top ranked submission for each student
+    rows = db.session.execute(
+        select(ranked.c.owner_id, ranked.c.submission_id, ranked.c.tests_passed).where(ranked.c.rank == 1)
+    ).all()
 
-    # Get the max number of assignment tests that can be passed
-    # so we can stop early if we find a submission that has all
-    # tests passing
-    max_correct = _get_assignment_test_count(assignment_id)
+    return [(owner_id, submission_id, tests_passed) for owner_id, submission_id, tests_passed in rows]
 
-    # Iterate over all submissions for this student, tracking
-    # the best submission so far (based on number of tests passed).
-    # We start from the oldest submission and move to the newest.
-    for submission in (
-        Submission.query.filter(
-            Submission.assignment_id == assignment_id,
-            Submission.owner_id == student_id,
-            # Submission.processed == True,
-            Submission.accepted == True,
-            *submission_filters
+
+def get_best_submission_ids(
+    assignment_id: str,
+    student_ids: list[str] | None = None,
+    max_time: datetime | None = None,
+) -> dict[str, str]:
+    """
+    Get the best submission id for students on an assignment, calculated
+    from the full submission history. See _rank_best_submissions.
+
+    :param assignment_id:
+    :param student_ids: optionally limit to these students
+    :param max_time: optionally ignore submissions created after this time
+    :return: dictionary of owner_id -> best submission_id
+    """
+    return {
+        owner_id: submission_id
+        for owner_id, submission_id, _ in _rank_best_submissions(assignment_id, student_ids, max_time)
+    }
+
+
+def _upsert_best_submissions(rows: list[dict], cache_tags: list[str]):
+    # Another worker may have refreshed the same students since the rows
+    # were read, so existing rows are overwritten instead of conflicting
+    # on the primary key.
+    if db.session.get_bind().dialect.name == "mysql":
+        stmt = mysql.insert(BestSubmission)
+        stmt = stmt.on_duplicate_key_update(
+            submission_id=stmt.inserted.submission_id,
+            tests_passed=stmt.inserted.tests_passed,
+            last_updated=stmt.inserted.last_updated,
         )
-            .order_by(Submission.created.desc())
-            .all()
+    else:
+        stmt = sqlite.insert(BestSubmission)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[BestSubmission.owner_id, BestSubmission.assignment_id],
+            set_={
+                "submission_id": stmt.excluded.submission_id,
+                "tests_passed":  stmt.excluded.tests_passed,
+                "last_updated":  stmt.excluded.last_updated,
+            },
+        )
+    db.session.execute(stmt, rows, execution_options={"cache_tags": cache_tags})
+
+
+def refresh_best_submissions(assignment_id: str, student_ids: list[str] | None = None) -> dict[str, str]:
+    """
+    Recalculate the materialized BestSubmission rows for an assignment from
+    the full submission history. If student_ids is not specified, then
+    every student on the assignment is rebuilt.
+
+    Students without any accepted submissions will not have a row.
+
+    :param assignment_id:
+    :param student_ids: optionally limit to these students
+    :return: dictionary of owner_id -> best submission_id
+    """
+
+    # Rank the full history before touching the table
+    ranked = _rank_best_submissions(assignment_id, student_ids)
+
+    # Read the rows that are currently materialized
+    existing_query = db.session.query(
+        BestSubmission.owner_id, BestSubmission.submission_id, BestSubmission.tests_passed,
+    ).filter(BestSubmission.assignment_id == assignment_id)
+    if student_ids is not None:
+        existing_query = existing_query.filter(BestSubmission.owner_id.in_(student_ids))
+    existing = {owner_id: (submission_id, tests_passed) for owner_id, submission_id, tests_passed in existing_query}
+
+    # Only rewrite the rows that actually changed. Rebuilding a whole
+    # assignment then only invalidates the cache for the students whose
+    # best submission moved.
+    ranked_owner_ids = {owner_id for owner_id, _, _ in ranked}
+    changed = [row for row in ranked if existing.get(row[0], None) != (row[1], row[2])]
+    stale_owner_ids = {owner_id for owner_id, _, _ in changed}
+    stale_owner_ids.update(owner_id for owner_id in existing if owner_id not in ranked_owner_ids)
+
+    if len(stale_owner_ids) > 0:
+        cache_tags = [
+            cache_tag("assignment", assignment_id),
+            *(cache_tag("user", owner_id) for owner_id in stale_owner_ids),
+        ]
+
+        # Drop the rows for students that no longer have a best submission
+        removed_owner_ids = stale_owner_ids.difference(ranked_owner_ids)
+        if len(removed_owner_ids) > 0:
+            db.session.execute(
+                delete(BestSubmission).where(
+                    BestSubmission.assignment_id == assignment_id,
+                    BestSubmission.owner_id.in_(removed_owner_ids),
+                ),
+                execution_options={"synchronize_session": False, "cache_tags": cache_tags},
+            )
+
+        # Bulk upsert the changed rows
+        if len(changed) > 0:
+            now = datetime.now()
+            _upsert_best_submissions(
+                [
+                    {
+                        "owner_id": owner_id,
+                        "assignment_id": assignment_id,
+                        "submission_id": submission_id,
+                        "tests_passed": tests_passed,
+                        "created": now,
+                        "last_updated": now,
+                    }
+                    for owner_id, submission_id, tests_passed in changed
+                ],
+                cache_tags,
+            )
+
+    db.session.commit()
+
+    return {owner_id: submission_id for owner_id, submission_id, _ in ranked}
+
+
+def get_submission_tests_passed(submission_id: str) -> int:
+    """
+    Count the distinct tests that have passed for a submission.
+
+    :param submission_id:
+    :return:
+    """
+    return (
+        db.session.query(func.count(distinct(SubmissionTestResult.assignment_test_id)))
+        .filter(
+            SubmissionTestResult.submission_id == submission_id,
+            SubmissionTestResult.passed == True,
+        )
+        .scalar()
+    )
+
+
+def _is_better_submission(
+    tests_passed: int,
+    created: datetime,
+    best_tests_passed: int,
+    best_created: datetime,
+    max_correct: int,
+) -> bool:
+    """
+    Compare a submission against the current best using the same ordering
+    as _rank_best_submissions.
+
+    :return: True if the submission should replace the current best
+    """
+    if tests_passed != best_tests_passed:
+        return tests_passed > best_tests_passed
+
+    # If everything passes, the most recent wins. Otherwise, the oldest.
+    if tests_passed >= max_correct:
+        return created > best_created
+    return created < best_created
+
+
+def _swap_best_submission(
+    submission: Submission,
+    expected_submission_id: str,
+    expected_tests_passed: int,
+    tests_passed: int,
+) -> bool:
+    """
+    Point the materialized best row for the owner of a submission at the
+    submission, but only if the row still holds what was read. Another
+    worker may have updated the row in the meantime.
+
+    :return: True if the row was updated
+    """
+    result = db.session.execute(
+        update(BestSubmission)
+        .where(
+            BestSubmission.owner_id == submission.owner_id,
+            BestSubmission.assignment_id == submission.assignment_id,
+            BestSubmission.submission_id == expected_submission_id,
+            BestSubmission.tests_passed == expected_tests_passed,
+        )
+        .values(submission_id=submission.id, tests_passed=tests_passed, last_updated=datetime.now()),
+        execution_options={
+            "synchronize_session": False,
+            "cache_tags": [
+                cache_tag("user", submission.owner_id),
+                cache_tag("assignment", submission.assignment_id),
+                cache_tag("submission", expected_submission_id),
+                cache_tag("submission", submission.id),
+            ],
+        },
+    )
+    db.session.commit()
+    return result.rowcount > 0
+
+
+def update_best_submission(submission: Submission):
+    """
+    Incrementally update the materialized best submission for the owner of
+    a submission. This should be called after the test results of a
+    submission have been committed (test reported, reset, rejected).
+
+    In the common case this only costs a count of the submission's passed
+    tests and a primary key read. The full history is only rescanned when
+    the current best submission gets worse, or when the row was changed by
+    someone else between the read and the update.
+
+    :param submission:
+    :return:
+    """
+
+    # Dangling submissions have no one to grade
+    if submission.owner_id is None:
+        return
+
+    # Get the current materialized best
+    best: BestSubmission | None = BestSubmission.query.filter(
+        BestSubmission.owner_id == submission.owner_id,
+        BestSubmission.assignment_id == submission.assignment_id,
+    ).first()
+
+    # Count the tests that pass on the updated submission
+    tests_passed = get_submission_tests_passed(submission.id)
+
+    # If this submission is already the best, then it can only stay the
+    # best if it did not get worse.
+    if best is not None and best.submission_id == submission.id:
+        if submission.accepted and tests_passed >= best.tests_passed:
+            if tests_passed == best.tests_passed or _swap_best_submission(
+                submission, best.submission_id, best.tests_passed, tests_passed,
+            ):
+                return
+
+        # The best got worse (or was changed by someone else), so
+        # another submission may be better now
+        refresh_best_submissions(submission.assignment_id, [submission.owner_id])
+        return
+
+    # Rejected submissions are not considered
+    if not submission.accepted:
+        return
+
+    # No materialized row yet, so calculate it from the history
+    if best is None:
+        refresh_best_submissions(submission.assignment_id, [submission.owner_id])
+        return
+
+    # Compare the updated submission against the current best
+    max_correct = _get_assignment_test_count(submission.assignment_id)
+    if _is_better_submission(
+        tests_passed,
+        submission.created,
+        best.tests_passed,
+        best.submission.created,
+        max_correct,
     ):
+        if not _swap_best_submission(submission, best.submission_id, best.tests_passed, tests_passed):
+            refresh_best_submissions(submission.assignment_id, [submission.owner_id])
 
-        # Make a map to weed out duplicates
-        results = dict()
-        for result in submission.test_results:
-            results[result.assignment_test_id] = results.get(result.assignment_test_id, result.passed)
 
-        # Calculate the number of tests that passed in this submission
-        correct_count = sum(map(lambda passed: 1 if passed else 0, results.values()))
+def delete_best_submissions(submission_ids: list[str]):
+    """
+    Drop the materialized best submission rows that point to submissions
+    that are about to be deleted. The rows will be recalculated the next
+    time they are needed.
+
+    * Does not commit changes *
+
+    :param submission_ids:
+    :return:
+    """
+    BestSubmission.query.filter(
+        BestSubmission.submission_id.in_(submission_ids),
+    ).delete(synchronize_session=False)
+
+
+@tagged_memoize(
+    lambda student_id, assignment_id, max_time: [cache_tag("user", student_id)],
+    unless=is_debug,
+    source_check=True,
+    forced_update=is_job,
+)
+def autograde(student_id, assignment_id, max_time: datetime = None):
+    """
+    Get the stats for a specific student on a specific assignment.
+
+    Finds the submission that has the most tests that passed. See
+    _rank_best_submissions for how ties are broken.
 
-        # If the number of passed tests in this assignment is as good
-        # or better as the best seen so far, update the running best.
-        if correct_count >= best_count:
-            best_count = correct_count
-            best = submission
+    * Without a max_time, this is a primary key read on the materialized
+    BestSubmission table. *
+
+    :param student_id:
+    :param assignment_id:
+    :param max_time:
+    :return:
+    """
+
+    # The materialized best submission only covers the full history
+    if max_time is not None:
+        best = get_best_submission_ids(assignment_id, student_ids=[student_id], max_time=max_time)
+        return best.get(student_id, None)
 
-        # If the number of passed tests is equal to the number
-        # of tests then we can stop and use this assignment.
-        if best_count == max_correct:
-            break
+    # Read the materialized best, calculating it if it is missing
+    best = get_best_submissions(assignment_id, [student_id])
 
     # return the submission id of the best if there is one, otherwise None
-    return best.id if best is not None else None
+    return best.get(student_id, None)
+
+
+def get_best_submissions(assignment_id: str, student_ids: list[str]) -> dict[str, str]:
+    """
+    Read the materialized best submissions for students. Any students that
+    do not yet have a BestSubmission row are calculated and stored.
+
+    :param assignment_id:
+    :param student_ids:
+    :return: dictionary of owner_id -> best submission_id
+    """
+
+    # Read whatever has been materialized
+    best: dict[str, str] = {
+        owner_id: submission_id
+        for owner_id, submission_id in db.session.query(BestSubmission.owner_id, BestSubmission.submission_id).filter(
+            BestSubmission.assignment_id == assignment_id,
+            BestSubmission.owner_id.in_(student_ids),
+        )
+    }
+
+    # Calculate the rest from the submission history
+    missing = [student_id for student_id in student_ids if student_id not in best]
+    if len(missing) > 0:
+        best.update(refresh_best_submissions(assignment_id, missing))
+
+    return best
 
 
 def autograde_submission_result_wrapper(
@@ -112,6 +477,33 @@ def autograde_submission_result_wrapper(
     :return:
     """
     if submission_id is None:
+        return _autograde_result(assignment, user_id, netid, name, None, None)
+
+    submission = Submission.query.filter(Submission.id == submission_id).first()
+    return _autograde_result(assignment, user_id, netid, name, submission, submission.admin_data)
+
+
+def _autograde_result(
+    assignment: Assignment,
+    user_id: str,
+    netid: str,
+    name: str,
+    submission: Submission | None,
+    submission_data: dict | None,
+) -> dict:
+    """
+    Build the autograde result dictionary from an already loaded
+    submission (and its admin data).
+
+    :param assignment:
+    :param user_id:
+    :param netid:
+    :param name:
+    :param submission:
+    :param submission_data:
+    :return:
+    """
+    if submission is None:
         # no submission
         return {
             "id": netid,
@@ -130,31 +522,136 @@ def autograde_submission_result_wrapper(
             "late": False,
         }
 
-    else:
-        submission = Submission.query.filter(Submission.id == submission_id).first()
-        repo_path = parse("https://github.com/{}", submission.repo.repo_url)[0] if submission.repo else None
-        best_count = sum(map(lambda x: 1 if x.passed else 0, submission.test_results))
-        late = "past due" if assignment.due_date < submission.created else "on time"
-        late = "past grace" if assignment.grace_date < submission.created else late
-        return {
-            "id": netid,
-            "user_id": user_id,
-            "netid": netid,
-            "name": name,
-            "submission": submission.admin_data,
-            "build_passed": submission.build.passed if submission.build is not None else False,
-            "tests_passed": best_count,
-            "total_tests": len(submission.test_results),
-            "tests_passed_names": [test.assignment_test.name for test in submission.test_results if test.passed],
-            "full_stats": "https://{}/api/private/submission/{}".format(env.DOMAIN, submission.id),
-            "main": "https://github.com/{}".format(repo_path),
-            "commits": "https://github.com/{}/commits/main".format(repo_path),
-            "commit_tree": "https://github.com/{}/tree/{}".format(repo_path, submission.commit),
-            "late": late,
-        }
+    repo_path = parse("https://github.com/{}", submission.repo.repo_url)[0] if submission.repo else None
+    best_count = sum(map(lambda x: 1 if x.passed else 0, submission.test_results))
+    late = "past due" if assignment.due_date < submission.created else "on time"
+    late = "past grace" if assignment.grace_date < submission.created else late
+    return {
+        "id": netid,
+        "user_id": user_id,
+        "netid": netid,
+        "name": name,
+        "submission": submission_data,
+        "build_passed": submission.build.passed if submission.build is not None else False,
+        "tests_passed": best_count,
+        "total_tests": len(submission.test_results),
+        "tests_passed_names": [test.assignment_test.name for test in submission.test_results if test.passed],
+        "full_stats": "https://{}/api/private/submission/{}".format(env.DOMAIN, submission.id),
+        "main": "https://github.com/{}".format(repo_path),
+        "commits": "https://github.com/{}/commits/main".format(repo_path),
+        "commit_tree": "https://github.com/{}/tree/{}".format(repo_path, submission.commit),
+        "late": late,
+    }
+
+
+def _preloaded_submission_admin_data(submission: Submission, due_date: datetime) -> dict:
+    """
+    Build the same dictionary as Submission.admin_data, but only from
+    relationships that have already been eagerly loaded. This avoids
+    the handful of per submission queries that admin_data would make.
+
+    :param submission:
+    :param due_date: due date for the owner (with late exception applied)
+    :return:
+    """
+    assignment = submission.assignment
+    test_results = sorted(submission.test_results, key=lambda result: result.assignment_test.order)
+    return {
+        "id": submission.id,
+        "assignment_name": assignment.name,
+        "assignment_due": str(due_date),
+        "course_code": assignment.course.course_code,
+        "accepted": submission.accepted,
+        "commit": submission.commit,
+        "processed": submission.processed,
+        "state": submission.state,
+        "created": str(submission.created),
+        "last_updated": str(submission.last_updated),
+        "error": submission.errors is not None,
+        "repo": submission.repo.repo_url if submission.repo is not None else None,
+        "tests": [{"test": result.assignment_test.data, "result": result.data} for result in test_results],
+        "build": submission.build.data if submission.build is not None else None,
+        "pipeline_log": submission.pipeline_log,
+    }
+
+
+def bulk_autograde_submission_result_wrapper(
+    assignment: Assignment,
+    students: list[tuple[str, str, str]],
+    best_submission_ids: dict[str, str],
+) -> list[dict]:
+    """
+    Set based version of autograde_submission_result_wrapper. All of the
+    best submissions (with their builds, repos and test results) and the
+    late exceptions for the assignment are loaded in a fixed number of
+    queries, then the result dictionaries are built in memory.
+
+    :param assignment:
+    :param students: list of (user_id, netid, name)
+    :param best_submission_ids: dictionary of user_id -> submission_id
+    :return:
+    """
+
+    # Eagerly load everything the result dictionaries need
+    submissions: dict[str, Submission] = {
+        submission.id: submission
+        for submission in Submission.query.filter(
+            Submission.id.in_(list(best_submission_ids.values())),
+        )
+        .options(
+            undefer(Submission.pipeline_log),
+            selectinload(Submission.repo),
+            selectinload(Submission.build).undefer(SubmissionBuild.stdout),
+            selectinload(Submission.test_results).options(
+                undefer(SubmissionTestResult.output),
+                undefer(SubmissionTestResult.message),
+                joinedload(SubmissionTestResult.assignment_test),
+            ),
+        )
+        .all()
+    } if len(best_submission_ids) > 0 else {}
+
+    # Late exceptions for the entire assignment in one query
+    late_exceptions: dict[str, datetime] = {
+        owner_id: due_date
+        for owner_id, due_date in db.session.query(LateException.owner_id, LateException.due_date).filter(
+            LateException.assignment_id == assignment.id,
+        )
+    }
 
+    bests = []
+    for user_id, netid, name in students:
+        submission = submissions.get(best_submission_ids.get(user_id, None), None)
+        submission_data = None
+        if submission is not None:
+            due_date = late_exceptions.get(submission.owner_id, assignment.due_date)
+            submission_data = _preloaded_submission_admin_data(submission, due_date)
+        bests.append(_autograde_result(assignment, user_id, netid, name, submission, submission_data))
+
+    return bests
+
+
+def _get_bulk_autograde_assignment(assignment_id: str) -> Assignment | None:
+    # bulk_autograde can be called with either the name or id of the assignment
+    return (
+        Assignment.query.filter_by(name=assignment_id).first() or Assignment.query.filter_by(id=assignment_id).first()
+    )
+
+
+def _bulk_autograde_tags(assignment_id, netids=None, offset=0, limit=20) -> list[str]:
+    assignment = _get_bulk_autograde_assignment(assignment_id)
+    if assignment is None:
+        return [cache_tag("assignment", assignment_id)]
+
+    # The student list comes from the course
+    return [cache_tag("assignment", assignment.id), cache_tag("course", assignment.course_id)]
 
-@cache.memoize(timeout=60 * 60, unless=is_debug, forced_update=is_job)
+
+@tagged_memoize(
+    _bulk_autograde_tags,
+    unless=is_debug,
+    forced_update=is_job,
+)
 def bulk_autograde(assignment_id, netids=None, offset=0, limit=20):
     """
     Bulk autograde an assignment. Optionally specify a subset of netids.
@@ -162,8 +659,8 @@ def bulk_autograde(assignment_id, netids=None, offset=0, limit=20):
     The offset and limit are used here to have the results of this function
     move as a window of the results.
 
-    * Calculating the autograde results is very IO intensive on the db. For this,
-    these results are heavily cached. *
+    * The best submissions for all the students are calculated with a fixed
+    number of aggregated queries. The results are still heavily cached. *
 
     :param assignment_id:
     :param netids:
@@ -172,38 +669,33 @@ def bulk_autograde(assignment_id, netids=None, offset=0, limit=20):
     :return:
     """
 
-    # Running list of the best submissions for each student
-    bests = []
-
     # Find the assignment object
-    assignment = (
-        Assignment.query.filter_by(name=assignment_id).first() or Assignment.query.filter_by(id=assignment_id).first()
-    )
+    assignment = _get_bulk_autograde_assignment(assignment_id)
     if assignment is None:
         return error_response("assignment does not exist")
 
-    # Get the list of students to get autograde results for
-    students = get_students_in_class(assignment.course_id, offset=offset, limit=limit)
+    # Get the list of students to get autograde results for. Only
+    # the columns that are needed are pulled.
+    student_query = (
+        db.session.query(User.id, User.netid, User.name)
+        .join(InCourse, InCourse.owner_id == User.id)
+        .filter(InCourse.course_id == assignment.course_id)
+        .order_by(User.name.desc())
+    )
     if netids is not None:
-        students = filter(lambda x: x["netid"] in netids, students)
-
-    # Run through each of the students, getting the autograde results for each
-    for student in students:
-        # Get the best submission for this student from this assignment
-        submission_id = autograde(student["id"], assignment.id)
-        bests.append(
-            # Use the stats_wrapper function to add all the necessary
-            # metadata for the submission.
-            autograde_submission_result_wrapper(
-                assignment,
-                student["id"],
-                student["netid"],
-                student["name"],
-                submission_id,
-            )
-        )
+        student_query = student_query.filter(User.netid.in_(netids))
+    if offset is not None and limit is not None:
+        student_query = student_query.limit(limit).offset(offset)
+    students = [tuple(student) for student in student_query.all()]
+
+    # Get the best submission for every student in one pass
+    best_submission_ids = get_best_submissions(
+        assignment.id,
+        [user_id for user_id, _, _ in students],
+    )
 
-    return bests
+    # Add all the necessary metadata for the submissions
+    return bulk_autograde_submission_result_wrapper(assignment, students, best_submission_ids)
 
 
 def reap_assignment_double_deliveries(assignment: Assignment):
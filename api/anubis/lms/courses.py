@@ -9,8 +9,6 @@ from typing import Any
 from flask import g, request
 from werkzeug.local import LocalProxy
 
-from anubis.k8s.pvc.create import create_user_pvc
-from anubis.k8s.pvc.get import get_user_pvc
 from anubis.models import (
     AssignedStudentQuestion,
     Assignment,
@@ -30,8 +28,9 @@ from anubis.models import (
     db,
 )
 from anubis.models.id import default_id_factory
-from anubis.utils.auth.user import current_user
-from anubis.utils.cache import cache
+from anubis.utils.auth.permissions import get_permissions, get_user_roles
+from anubis.utils.auth.user import current_user, get_user_id
+from anubis.utils.cache import cache, cache_tag, tagged_memoize
 from anubis.utils.data import is_debug
 from anubis.utils.exceptions import AuthenticationError, LackCourseContext
 from anubis.utils.logging import logger
@@ -132,24 +131,15 @@ def is_course_superuser(course_id: str, user_id: str = None) -> bool:
     :return:
     """
 
-    # Get the current user
-    if user_id is None:
-        user = current_user
-    else:
-        user = User.query.filter(User.id == user_id).first()
+    # Get the roles of the user, loaded once per request
+    permissions = get_permissions(user_id)
 
     # If they are a superuser, then we can just return True
-    if user.is_superuser:
+    if permissions["is_superuser"]:
         return True
 
-    # Check to see if they are a professor for the current course
-    prof = ProfessorForCourse.query.filter(
-        ProfessorForCourse.owner_id == user.id,
-        ProfessorForCourse.course_id == course_id,
-    ).first()
-
     # Return True if they are a professor for the course
-    return prof is not None
+    return course_id in permissions["professor_for"]
 
 
 def is_course_admin(course_id: str, user_id: str = None) -> bool:
@@ -163,35 +153,15 @@ def is_course_admin(course_id: str, user_id: str = None) -> bool:
     :return:
     """
 
-    # Get the current user
-    if user_id is None:
-        user = current_user
-    else:
-        user = User.query.filter(User.id == user_id).first()
+    # Get the roles of the user, loaded once per request
+    permissions = get_permissions(user_id)
 
     # If they are a superuser, then just return True
-    if user.is_superuser:
-        return True
-
-    # Check to see if they are a TA for the course
-    ta = TAForCourse.query.filter(
-        TAForCourse.owner_id == user.id,
-        TAForCourse.course_id == course_id,
-    ).first()
-
-    if ta is not None:
-        return True
-
-    # Check to see if they are a professor for the course
-    prof = ProfessorForCourse.query.filter(
-        ProfessorForCourse.owner_id == user.id,
-        ProfessorForCourse.course_id == course_id,
-    ).first()
-
-    if prof is not None:
+    if permissions["is_superuser"]:
         return True
 
-    return False
+    # Check to see if they are a TA or professor for the course
+    return course_id in permissions["ta_for"] or course_id in permissions["professor_for"]
 
 
 def assert_course_admin(course_id: str = None):
@@ -334,7 +304,7 @@ def valid_join_code(join_code: str) -> bool:
     return all(c in valid_chars for c in join_code)
 
 
-@cache.memoize(timeout=5, unless=is_debug)
+@tagged_memoize(lambda netid: [cache_tag("user", get_user_id(netid))], timeout=5, unless=is_debug)
 def get_courses(netid: str) -> list[dict[str, Any]]:
     """
     Get all classes a given netid is in
@@ -511,27 +481,10 @@ def get_courses_with_visuals() -> list[dict[str, Any]]:
     return [course.data for course in courses]
 
 
-@cache.memoize(timeout=60, unless=is_debug, source_check=True)
 def get_user_admin_course_ids(user_id: str) -> set[str]:
-    admin_course_ids: set[str] = set()
-
-    # Check to see if they are a TA for the course
-    ta: list[TAForCourse] = TAForCourse.query.filter(
-        TAForCourse.owner_id == user_id,
-    ).all()
-
-    # Check to see if they are a professor for the course
-    prof: list[ProfessorForCourse] = ProfessorForCourse.query.filter(
-        ProfessorForCourse.owner_id == user_id,
-    ).all()
-
-    for in_course in ta:
-        admin_course_ids.add(in_course.course_id)
-
-    for in_course in prof:
-        admin_course_ids.add(in_course.course_id)
-
-    return admin_course_ids
+    # The courses they are a TA or professor for
+    roles = get_user_roles(user_id)
+    return set(roles["ta_for"]).union(roles["professor_for"])
 
 
 def get_user_course_ids(user: User) -> tuple[set[str], set[str]]:
@@ -777,6 +730,10 @@ def bulk_create_students(course_id: Course, students: list[dict[str, str]], crea
 
     # Create pvc
     if create_pvc:
+        # Kubernetes is slow to import, and only needed here
+        from anubis.k8s.pvc.create import create_user_pvc
+        from anubis.k8s.pvc.get import get_user_pvc
+
         for user in students_in_course:
             logger.info(f'Create PVC {user.netid}')
             _, pvc = get_user_pvc(
@@ -1,9 +1,13 @@
-import io
+import hashlib
 import json
 import random
+import tempfile
 import zipfile
+from datetime import datetime
+from typing import IO
 
 import yaml
+from sqlalchemy import and_, func, insert
 
 from anubis.lms.students import get_students, get_students_in_class
 from anubis.models import (
@@ -12,10 +16,11 @@ from anubis.models import (
     Assignment,
     AssignmentQuestion,
     InCourse,
-    Course,
+    LateException,
     User,
     db,
 )
+from anubis.models.id import default_id_factory
 from anubis.utils.cache import cache
 from anubis.utils.data import verify_data_shape, is_debug
 from anubis.utils.logging import logger
@@ -109,6 +114,102 @@ def hard_reset_questions(assignment: Assignment, commit: bool = True):
         db.session.commit()
 
 
+def get_assigned_question_choice(
+    assignment_id: str,
+    student_id: str,
+    pool: int,
+    pool_questions: list[AssignmentQuestion],
+) -> AssignmentQuestion:
+    """
+    Pick the question from a pool to assign to a student. The choice is
+    seeded by the assignment, student and pool, so the same student will
+    always get the same question from the same pool. This makes question
+    assignments reproducible, no matter if they were done in bulk or
+    filled in later by fix_missing_question_assignments.
+
+    :param assignment_id:
+    :param student_id:
+    :param pool:
+    :param pool_questions: questions in the pool
+    :return:
+    """
+
+    # Sort the pool so that the choice does not depend on query order
+    pool_questions = sorted(pool_questions, key=lambda q: q.id)
+
+    rng = random.Random(f"{assignment_id}:{student_id}:{pool}")
+    return rng.choice(pool_questions)
+
+
+def bulk_assign_questions(
+    assignment: Assignment,
+    student_ids: list[str],
+    question_mapping: dict[int, list[AssignmentQuestion]],
+    assigned_pools: set[tuple[str, int]] | None = None,
+) -> list[dict]:
+    """
+    Assign a question from each pool to each of the students. The question
+    assignments are computed in memory, and written with a single bulk insert.
+    Students that already have a question from a pool (in assigned_pools)
+    are skipped for that pool.
+
+    * Does not commit changes *
+
+    The returned list is in the same shape as AssignedStudentQuestion.data
+    for a question that has not been responded to. This is built from the
+    questions that are passed in, so no relationships are loaded.
+
+    :param assignment:
+    :param student_ids:
+    :param question_mapping: pool -> [assignment question]
+    :param assigned_pools: set of (student_id, pool) that are already assigned
+    :return:
+    """
+
+    if assigned_pools is None:
+        assigned_pools = set()
+
+    now = datetime.now()
+    rows = []
+    assigned_questions = []
+    for student_id in student_ids:
+        for pool, pool_questions in question_mapping.items():
+            if (student_id, pool) in assigned_pools:
+                continue
+
+            # Get a (seeded) random question from the pool at this sequence
+            selected_question = get_assigned_question_choice(assignment.id, student_id, pool, pool_questions)
+
+            assigned_question_id = default_id_factory()
+            rows.append(
+                {
+                    "id":            assigned_question_id,
+                    "owner_id":      student_id,
+                    "assignment_id": assignment.id,
+                    "question_id":   selected_question.id,
+                    "created":       now,
+                    "last_updated":  now,
+                }
+            )
+            assigned_questions.append(
+                {
+                    "id":       assigned_question_id,
+                    "response": {
+                        "submitted": None,
+                        "late":      True,
+                        "text":      selected_question.placeholder,
+                    },
+                    "question": selected_question.data,
+                }
+            )
+
+    # Assign them the questions
+    if len(rows) > 0:
+        db.session.execute(insert(AssignedStudentQuestion), rows)
+
+    return assigned_questions
+
+
 def assign_questions(assignment: Assignment):
     """
     Assign existing questions to students for a given assignment.
@@ -129,22 +230,16 @@ def assign_questions(assignment: Assignment):
 
     questions = get_question_pool_mapping(raw_questions)
 
-    # Go through students in the class and assign them questions
-    assigned_questions = []
-    students = User.query.join(InCourse).filter(InCourse.course_id == assignment.course_id).all()
-    for student in students:
-        for sequence, qs in questions.items():
-            # Get a random question from the pool at this sequence
-            selected_question = random.choice(qs)
-
-            # Assign them the question
-            assigned_question = AssignedStudentQuestion(
-                owner=student,
-                assignment=assignment,
-                question=selected_question,
-            )
-            assigned_questions.append(assigned_question.data)
-            db.session.add(assigned_question)
+    # Get the ids of the students in the class
+    student_ids = [
+        student_id
+        for student_id, in db.session.query(InCourse.owner_id).filter(
+            InCourse.course_id == assignment.course_id,
+        ).all()
+    ]
+
+    # Assign the students questions
+    assigned_questions = bulk_assign_questions(assignment, student_ids, questions)
 
     # Mark the assignment as questions assigned
     assignment.questions_assigned = True
@@ -321,80 +416,234 @@ def get_question_assignments(assignment: Assignment):
     return assignments
 
 
+# Exports smaller than this are kept in memory, larger
+# ones are spooled to a temp file while they are written.
+QUESTION_EXPORT_SPOOL_SIZE = 16 * 1024 * 1024
+
+# Number of question rows to load at a time during exports
+QUESTION_EXPORT_BATCH_SIZE = 500
+
+
 @cache.memoize(timeout=120, unless=is_debug)
-def export_assignment_questions(assignment_id: str) -> bytes | None:
+def get_assignment_questions_export_etag(assignment_id: str) -> str:
     """
-    Export an assignment questions to a zip file.
+    Get an ETag for the question export of an assignment. This is a hash
+    of the counts and last update times of everything in the export, so
+    it can be checked without building the export.
+
+    * The ETag is cached for up to 120 seconds *
 
     :param assignment_id:
     :return:
     """
 
-    # Get the assignment
     assignment = Assignment.query.filter(Assignment.id == assignment_id).first()
 
-    # If the assignment does not exist, then return None
-    if assignment is None:
-        return None
+    questions_version = (
+        db.session.query(func.count(AssignmentQuestion.id), func.max(AssignmentQuestion.last_updated))
+        .filter(AssignmentQuestion.assignment_id == assignment_id)
+        .first()
+    )
+    assigned_version = (
+        db.session.query(func.count(AssignedStudentQuestion.id), func.max(AssignedStudentQuestion.last_updated))
+        .filter(AssignedStudentQuestion.assignment_id == assignment_id)
+        .first()
+    )
+    responses_version = (
+        db.session.query(func.count(AssignedQuestionResponse.id), func.max(AssignedQuestionResponse.last_updated))
+        .join(AssignedStudentQuestion, AssignedStudentQuestion.id == AssignedQuestionResponse.assigned_question_id)
+        .filter(AssignedStudentQuestion.assignment_id == assignment_id)
+        .first()
+    )
+    students_version = (
+        db.session.query(func.count(InCourse.owner_id))
+        .filter(InCourse.course_id == (assignment.course_id if assignment is not None else None))
+        .scalar()
+    )
 
-    # Get the question assignments. This data includes all the
-    # question strs, solution strs, and student responses for
-    # an assignment.
-    question_assignments = get_question_assignments(assignment)
+    version = [
+        assignment.data if assignment is not None else None,
+        list(questions_version),
+        list(assigned_version),
+        list(responses_version),
+        students_version,
+    ]
+    return hashlib.sha256(json.dumps(version, default=str).encode()).hexdigest()
 
-    # Create an in-memory zip file buffer
-    zip_buffer = io.BytesIO()
 
-    # Create a zip file using the in-memory buffer
-    with zipfile.ZipFile(zip_buffer, "a", zipfile.ZIP_DEFLATED, False) as zip_file:
+def _iter_question_export_rows(assignment: Assignment):
+    """
+    Iterate over the students in the course of an assignment, along with
+    their assigned questions and latest responses (ordered by netid, then
+    pool). Rows are loaded in batches with a server side cursor, so the
+    whole course is never in memory at once.
 
-        # list of student meta data
-        student_metas = []
+    Students with no assigned questions have a single row with the
+    question fields set to None.
 
-        # Iterate through all the student question assignments
-        for netid, data in question_assignments.items():
+    :param assignment:
+    :return:
+    """
 
-            # Get the name of the student
-            name = data["name"]
+    # Time of the latest response to each question of the assignment
+    latest_response = (
+        db.session.query(
+            AssignedQuestionResponse.assigned_question_id,
+            func.max(AssignedQuestionResponse.created).label("created"),
+        )
+        .join(AssignedStudentQuestion, AssignedStudentQuestion.id == AssignedQuestionResponse.assigned_question_id)
+        .filter(AssignedStudentQuestion.assignment_id == assignment.id)
+        .group_by(AssignedQuestionResponse.assigned_question_id)
+        .subquery()
+    )
 
-            # list of responses for this student
-            responses = []
+    query = (
+        db.session.query(
+            User.id,
+            User.netid,
+            User.name,
+            AssignedStudentQuestion.id,
+            AssignmentQuestion.pool,
+            AssignmentQuestion.question,
+            AssignmentQuestion.solution,
+            AssignmentQuestion.placeholder,
+            AssignedQuestionResponse.response,
+            AssignedQuestionResponse.created,
+        )
+        .join(InCourse, InCourse.owner_id == User.id)
+        .outerjoin(
+            AssignedStudentQuestion,
+            and_(
+                AssignedStudentQuestion.owner_id == User.id,
+                AssignedStudentQuestion.assignment_id == assignment.id,
+            ),
+        )
+        .outerjoin(AssignmentQuestion, AssignmentQuestion.id == AssignedStudentQuestion.question_id)
+        .outerjoin(latest_response, latest_response.c.assigned_question_id == AssignedStudentQuestion.id)
+        .outerjoin(
+            AssignedQuestionResponse,
+            and_(
+                AssignedQuestionResponse.assigned_question_id == AssignedStudentQuestion.id,
+                AssignedQuestionResponse.created == latest_response.c.created,
+            ),
+        )
+        .filter(InCourse.course_id == assignment.course_id)
+        .order_by(User.netid, AssignmentQuestion.pool, AssignedStudentQuestion.id)
+        .execution_options(stream_results=True)
+        .yield_per(QUESTION_EXPORT_BATCH_SIZE)
+    )
 
-            # Iterate through each question assigned to the student
-            for student_question_data in data["questions"]:
-                # Pull fields from the question_data
-                response_text = student_question_data["response"]["text"]
-                response_late = student_question_data["response"]["late"]
-                response_time = student_question_data["response"]["submitted"]
-                pool = student_question_data["question"]["pool"]
-                question = student_question_data["question"]["question"]
-                solution = student_question_data["question"]["solution"]
+    yield from query
 
-                # Write files to zip archive
-                zip_file.writestr(f"{netid}/q{pool}/question.md", question)
-                zip_file.writestr(f"{netid}/q{pool}/solution.md", solution)
-                zip_file.writestr(f"{netid}/q{pool}/response.txt", response_text)
 
-                # Append the responses
-                responses.append({"pool": pool, "late": response_late, "time": response_time})
+def export_assignment_questions(assignment_id: str) -> IO[bytes] | None:
+    """
+    Export an assignment questions to a zip file. The zip is written as
+    the students are read from the database, into a spooled temp file.
+    The file is positioned at the start, ready to be sent.
 
-            # Create the student meta data
-            student_data = {"netid": netid, "name": name, "responses": responses}
+    :param assignment_id:
+    :return:
+    """
+    # Get the assignment
+    assignment = Assignment.query.filter(Assignment.id == assignment_id).first()
 
+    # If the assignment does not exist, then return None
+    if assignment is None:
+        return None
+
+    # Load the late exceptions up front. Nothing else can be queried
+    # while the export rows are streaming, as that would end the stream.
+    late_exceptions: dict[str, datetime] = dict(
+        db.session.query(LateException.owner_id, LateException.due_date)
+        .filter(LateException.assignment_id == assignment.id)
+        .all()
+    )
+
+    # Create a spooled temp file for the zip
+    zip_buffer = tempfile.SpooledTemporaryFile(max_size=QUESTION_EXPORT_SPOOL_SIZE)
+
+    # Create a zip file using the spooled file
+    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED, False) as zip_file:
+
+        # list of student meta data
+        student_metas = []
+
+        def write_student_meta(student_data: dict):
             # Append the student meta data to the global value
             student_metas.append(student_data)
 
             # Write this students meta data to their directory
-            zip_file.writestr(f"{netid}/meta.yaml", yaml.safe_dump(student_data))
+            zip_file.writestr(f"{student_data['netid']}/meta.yaml", yaml.safe_dump(student_data))
+
+        # The student that is currently being written
+        student_data = None
+        last_assigned_question_id = None
 
-            # Write a global assignment and student meta data file
+        # Iterate through all the student question assignments
+        for (
+            user_id,
+            netid,
+            name,
+            assigned_question_id,
+            pool,
+            question,
+            solution,
+            placeholder,
+            response_text,
+            response_time,
+        ) in _iter_question_export_rows(assignment):
+
+            # When we get to the next student, finish the last one
+            if student_data is None or student_data["netid"] != netid:
+                if student_data is not None:
+                    write_student_meta(student_data)
+
+                # Create the student meta data
+                student_data = {"netid": netid, "name": name, "responses": []}
+
+            # Students with no assigned questions only have meta data. Responses
+            # submitted at the same time may show up twice, only take the first.
+            if assigned_question_id is None or assigned_question_id == last_assigned_question_id:
+                continue
+            last_assigned_question_id = assigned_question_id
+
+            # Figure out if the response was late
+            response_late = True
+            if response_time is not None:
+                due_date = late_exceptions.get(user_id, assignment.due_date)
+                response_late = due_date < response_time
+
+            # Write files to zip archive
+            zip_file.writestr(f"{netid}/q{pool}/question.md", question)
+            zip_file.writestr(f"{netid}/q{pool}/solution.md", solution)
+            zip_file.writestr(
+                f"{netid}/q{pool}/response.txt",
+                response_text if response_time is not None else placeholder,
+            )
+
+            # Append the responses
+            student_data["responses"].append(
+                {
+                    "pool": pool,
+                    "late": response_late,
+                    "time": str(response_time) if response_time is not None else None,
+                }
+            )
+
+        # Finish the last student
+        if student_data is not None:
+            write_student_meta(student_data)
+
+        # Write a global assignment and student meta data file
         zip_file.writestr(
             "assignment.yaml",
             yaml.safe_dump({"assignment": assignment.data, "students": student_metas}),
         )
 
-    # Pass back the buffer in bytes
-    return zip_buffer.getvalue()
+    # Pass back the file, ready to be read
+    zip_buffer.seek(0)
+    return zip_buffer
 
 
 @cache.memoize(timeout=120, unless=is_debug)
@@ -448,22 +697,20 @@ def export_assignment_question_history(assignment_id: str, user_id: str) -> str
     return json.dumps(history, indent=2)
 
 
-def fix_missing_question_assignments(assignment: Assignment):
+def fix_missing_question_assignments(assignment: Assignment, student_ids: list[str] | None = None):
     """
     Calculate and assign questions that are not assigned
     to students for a given assignment. Should be run in
     the daily cleanup.
 
     :param assignment:
+    :param student_ids: optionally only fix these students
     :return:
     """
 
     if not assignment.questions_assigned:
         logger.info("fix_missing_question_assignments skipping, questions not assigned yet")
-
-    # Get set of student ids
-    students = get_students_in_class(assignment.course_id)
-    student_ids = set(map(lambda u: u["id"], students))
+        return
 
     # Get all assignment questions for this assignment
     assignment_questions: list[AssignmentQuestion] = AssignmentQuestion.query.filter(
@@ -477,43 +724,27 @@ def fix_missing_question_assignments(assignment: Assignment):
     # Get map of pool -> [assignment question]
     question_mapping = get_question_pool_mapping(assignment_questions)
 
-    # Get the set of question pools
-    question_pools = set(question_mapping.keys())
-
-    # Iterate over each student in the course
-    for student_id in student_ids:
-
-        # Get the question assignments for this student on this assignment
-        student_questions: list[AssignedStudentQuestion] = AssignedStudentQuestion.query.filter(
+    # Get the ids of the students in the class
+    if student_ids is None:
+        students = get_students_in_class(assignment.course_id)
+        student_ids = list(map(lambda u: u["id"], students))
+
+    # Get the set of (student, pool) that already have questions
+    # assigned, for all the students at once
+    assigned_pools = set(
+        db.session.query(AssignedStudentQuestion.owner_id, AssignmentQuestion.pool)
+        .join(AssignmentQuestion, AssignmentQuestion.id == AssignedStudentQuestion.question_id)
+        .filter(
             AssignedStudentQuestion.assignment_id == assignment.id,
-            AssignedStudentQuestion.owner_id == student_id,
-        ).all()
-
-        # Calculate set of which pools this student has questions assigned for
-        student_question_pools = set(map(lambda q: q.question.pool, student_questions))
-
-        # Calculate which question pools have no questions assigned for this student
-        missing_student_question_pools = question_pools.difference(student_question_pools)
-
-        # Iterate over missing question pools
-        for pool in missing_student_question_pools:
-            logger.info(
-                f"FIXING missing question " f"pool={pool} " f"student={student_id} " f"assignment={assignment.id}"
-            )
-
-            # Get list of questions for this pool
-            qs = question_mapping[pool]
-
-            # Get a random question from the pool at this sequence
-            selected_question = random.choice(qs)
+            AssignedStudentQuestion.owner_id.in_(student_ids),
+        )
+        .all()
+    )
 
-            # Assign them the question
-            assigned_question = AssignedStudentQuestion(
-                owner_id=student_id,
-                assignment=assignment,
-                question=selected_question,
-            )
-            db.session.add(assigned_question)
+    # Assign all the missing questions at once
+    assigned_questions = bulk_assign_questions(assignment, student_ids, question_mapping, assigned_pools)
+    if len(assigned_questions) > 0:
+        logger.info(f"FIXING missing questions count={len(assigned_questions)} assignment={assignment.id}")
 
     db.session.commit()
 
@@ -530,28 +761,20 @@ def assign_missing_questions(user_id: str):
         logger.error(f"RPC::assign_missing_questions user does not exist user_id={user_id}")
         return
 
-    # Get all the courses that the user belongs to
-    courses: list[Course] = (
-        Course.query.join(InCourse)
-            .join(User)
-            .filter(
-            User.id == user.id,
+    # Get all assignments (that have been released and that
+    # have not) in the courses the student is in. Skip
+    # assignments that have not had their questions
+    # assigned yet.
+    assignments: list[Assignment] = (
+        Assignment.query.join(InCourse, InCourse.course_id == Assignment.course_id)
+        .filter(
+            InCourse.owner_id == user.id,
+            Assignment.questions_assigned == True,
         )
-            .all()
+        .all()
     )
 
-    # Iterate over each course the student is in
-    for course in courses:
-
-        # Get all assignments (that have been released and that
-        # have not). Skip assignments that have not had their
-        # questions assigned yet.
-        assignments: list[Assignment] = Assignment.query.filter(
-            Assignment.course_id == course.id,
-            Assignment.questions_assigned == True,
-        ).all()
-
-        # Iterate over assignments
-        for assignment in assignments:
-            # Run missing question fix for each assignment
-            fix_missing_question_assignments(assignment)
+    # Iterate over assignments
+    for assignment in assignments:
+        # Run missing question fix for just this student
+        fix_missing_question_assignments(assignment, student_ids=[user.id])
@@ -12,10 +12,9 @@ def chunk_and_enqueue_regrade(submissions: list[Submission]):
     submission_ids = [s.id for s in submissions]
     submission_chunks = split_chunks(submission_ids, 100)
 
-    from anubis.rpc.enqueue import enqueue_bulk_regrade_submissions
-    # Enqueue each chunk as a job for the rpc workers
-    for chunk in submission_chunks:
-        enqueue_bulk_regrade_submissions(chunk)
+    from anubis.rpc.enqueue import enqueue_bulk_regrade_submission_chunks
+    # Enqueue all the chunks as jobs for the rpc workers
+    enqueue_bulk_regrade_submission_chunks(submission_chunks)
 
 
 def regrade_filters(
@@ -0,0 +1,277 @@
+import json
+import threading
+import time
+from typing import Any
+
+from redis.exceptions import RedisError
+
+from anubis.models import Assignment, AssignmentRepo, Course
+from anubis.utils.logging import logger
+from anubis.utils.redis import redis
+
+# unique_code -> json {id, unique_code, name, github_org, accept_late, autograde_enabled}
+_ASSIGNMENT_INDEX_KEY = "anubis-repo-index-assignments"
+
+# repo_url -> json {assignment_id, repo_id, owner_id}
+_REPO_INDEX_KEY = "anubis-repo-index-repos"
+
+# The redis index is rebuilt lazily from misses if it expires
+_INDEX_TTL = 60 * 60
+
+# Bumped whenever an entry changes or is removed, so that every
+# process drops what it has looked up.
+_GENERATION_KEY = "anubis-repo-index-generation"
+
+# Each process keeps what it has looked up for up to a minute, and
+# checks for changes from other processes every few seconds.
+_LOCAL_TTL = 60
+_LOCAL_CHECK_INTERVAL = 5
+
+_local_lock = threading.Lock()
+_local_assignments: dict[str, dict[str, Any]] = {}
+_local_repos: dict[str, dict[str, Any]] = {}
+_local_expires = 0.0
+_local_checked = 0.0
+_local_generation: bytes | None = None
+
+
+def _get_generation() -> bytes | None:
+    try:
+        return redis.get(_GENERATION_KEY)
+    except RedisError as e:
+        logger.warning(f"Unable to read repo index {e}")
+        return None
+
+
+def _bump_generation():
+    try:
+        redis.incr(_GENERATION_KEY)
+    except RedisError as e:
+        logger.warning(f"Unable to update repo index {e}")
+
+
+def _check_local():
+    # Caller must hold the lock
+    global _local_expires, _local_checked, _local_generation
+    now = time.time()
+    if now > _local_checked:
+        generation = _get_generation()
+        if generation != _local_generation:
+            _local_generation = generation
+            _local_expires = 0.0
+        _local_checked = now + _LOCAL_CHECK_INTERVAL
+    if now > _local_expires:
+        _local_assignments.clear()
+        _local_repos.clear()
+        _local_expires = now + _LOCAL_TTL
+
+
+def _redis_hmget(key: str, fields: list[str]) -> list[bytes | None]:
+    try:
+        return redis.hmget(key, fields)
+    except RedisError as e:
+        logger.warning(f"Unable to read repo index {e}")
+        return [None] * len(fields)
+
+
+def _redis_hset(key: str, mapping: dict[str, str]):
+    if len(mapping) == 0:
+        return
+    try:
+        with redis.pipeline() as pipe:
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, _INDEX_TTL)
+            pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Unable to update repo index {e}")
+
+
+def _get_assignment_entry(assignment: Assignment) -> dict[str, Any]:
+    return {
+        "id":                assignment.id,
+        "unique_code":       assignment.unique_code,
+        "name":              assignment.name,
+        "github_org":        assignment.course.github_org,
+        "accept_late":       assignment.accept_late,
+        "autograde_enabled": assignment.autograde_enabled,
+    }
+
+
+def _index_assignments(assignments: list[Assignment]):
+    entries = {
+        assignment.unique_code: _get_assignment_entry(assignment)
+        for assignment in assignments
+        if assignment.unique_code
+    }
+
+    with _local_lock:
+        _check_local()
+        _local_assignments.update(entries)
+    _redis_hset(_ASSIGNMENT_INDEX_KEY, {code: json.dumps(entry) for code, entry in entries.items()})
+
+
+def index_assignments(assignments: list[Assignment]):
+    """
+    Add (or refresh) assignments in the index. This should be called
+    whenever an assignment is created or its settings change. Other
+    processes drop their copies of the index within a few seconds.
+
+    :param assignments:
+    :return:
+    """
+    _index_assignments(assignments)
+    _bump_generation()
+
+
+def index_course(course: Course):
+    """
+    Refresh the assignments for a course in the index. This should be
+    called whenever the course changes (like its github org).
+
+    :param course:
+    :return:
+    """
+    index_assignments(Assignment.query.filter(Assignment.course_id == course.id).all())
+
+
+def unindex_assignment(unique_code: str):
+    with _local_lock:
+        _local_assignments.pop(unique_code, None)
+    try:
+        redis.hdel(_ASSIGNMENT_INDEX_KEY, unique_code)
+    except RedisError as e:
+        logger.warning(f"Unable to update repo index {e}")
+    _bump_generation()
+
+
+def index_repos(repos: list[AssignmentRepo]):
+    """
+    Add (or refresh) repos in the index. This should be called whenever
+    a repo is created or its owner changes. Shared repos have a row for
+    each member, in which case the first row given for the url is kept.
+
+    If an existing entry changed, other processes drop their copies of
+    the index within a few seconds.
+
+    :param repos:
+    :return:
+    """
+    entries = {}
+    for repo in repos:
+        entries.setdefault(repo.repo_url, {
+            "assignment_id": repo.assignment_id,
+            "repo_id":       repo.id,
+            "owner_id":      repo.owner_id,
+        })
+    if len(entries) == 0:
+        return
+
+    with _local_lock:
+        _check_local()
+        changed = any(
+            repo_url in _local_repos and _local_repos[repo_url] != entry
+            for repo_url, entry in entries.items()
+        )
+        _local_repos.update(entries)
+
+    repo_urls = list(entries.keys())
+    changed = changed or any(
+        existing is not None and json.loads(existing) != entries[repo_url]
+        for repo_url, existing in zip(repo_urls, _redis_hmget(_REPO_INDEX_KEY, repo_urls))
+    )
+
+    _redis_hset(_REPO_INDEX_KEY, {repo_url: json.dumps(entry) for repo_url, entry in entries.items()})
+    if changed:
+        _bump_generation()
+
+
+def unindex_repo(repo_url: str):
+    with _local_lock:
+        _local_repos.pop(repo_url, None)
+    try:
+        redis.hdel(_REPO_INDEX_KEY, repo_url)
+    except RedisError as e:
+        logger.warning(f"Unable to update repo index {e}")
+    _bump_generation()
+
+
+def get_indexed_assignment(repo_name: str) -> dict[str, Any] | None:
+    """
+    Find the assignment for a repo from the unique code in its name. The
+    process index is checked first, then redis, then the database.
+
+    response = {
+      "id": assignment_id,
+      "unique_code": "abc123",
+      "name": "...",
+      "github_org": "os3224",
+      "accept_late": True,
+      "autograde_enabled": True,
+    }
+
+    :param repo_name:
+    :return:
+    """
+    codes = [code for code in repo_name.split("-") if code != ""]
+    if len(codes) == 0:
+        return None
+
+    with _local_lock:
+        _check_local()
+        for code in codes:
+            if code in _local_assignments:
+                return _local_assignments[code]
+
+    for code, entry in zip(codes, _redis_hmget(_ASSIGNMENT_INDEX_KEY, codes)):
+        if entry is not None:
+            entry = json.loads(entry)
+            with _local_lock:
+                _local_assignments[code] = entry
+            return entry
+
+    assignment: Assignment | None = Assignment.query.filter(Assignment.unique_code.in_(codes)).first()
+    if assignment is None:
+        return None
+
+    _index_assignments([assignment])
+    return _get_assignment_entry(assignment)
+
+
+def get_indexed_repo(repo_url: str) -> dict[str, Any] | None:
+    """
+    Find a known repo by url. The process index is checked first, then
+    redis, then the database.
+
+    response = {
+      "assignment_id": assignment_id,
+      "repo_id": repo_id,
+      "owner_id": owner_id or None,
+    }
+
+    :param repo_url:
+    :return:
+    """
+    with _local_lock:
+        _check_local()
+        if repo_url in _local_repos:
+            return _local_repos[repo_url]
+
+    entry, = _redis_hmget(_REPO_INDEX_KEY, [repo_url])
+    if entry is not None:
+        entry = json.loads(entry)
+        with _local_lock:
+            _local_repos[repo_url] = entry
+        return entry
+
+    repo: AssignmentRepo | None = AssignmentRepo.query.filter(
+        AssignmentRepo.repo_url == repo_url,
+    ).order_by(AssignmentRepo.created).first()
+    if repo is None:
+        return None
+
+    index_repos([repo])
+    return {
+        "assignment_id": repo.assignment_id,
+        "repo_id":       repo.id,
+        "owner_id":      repo.owner_id,
+    }
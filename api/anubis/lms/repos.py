@@ -1,12 +1,13 @@
 from sqlalchemy.sql import func, select, and_
 
+from anubis.lms.repo_index import index_repos
 from anubis.models import db, Assignment, AssignmentRepo, Submission, User
-from anubis.utils.cache import cache
+from anubis.utils.cache import cache, cache_tag, tagged_memoize
 from anubis.utils.data import is_debug, is_job, with_context
 from anubis.utils.logging import logger, verbose_call
 
 
-@cache.memoize(timeout=10, source_check=True, unless=is_debug)
+@tagged_memoize(lambda user_id: [cache_tag("user", user_id)], source_check=True, unless=is_debug)
 def get_repos(user_id: str):
     repos: list[AssignmentRepo] = (
         AssignmentRepo.query.join(Assignment)
@@ -61,6 +62,9 @@ def reap_duplicate_repos():
         # Commit update and delete
         db.session.commit()
 
+        # Pushes to the repo now go to the one that was kept
+        index_repos([newest_repo])
+
 
 @cache.memoize(timeout=-1, unless=is_debug, forced_update=is_job)
 def list_repos_with_latest_commit(assignment_id: int) -> list[AssignmentRepo]:
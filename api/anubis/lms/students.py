@@ -1,9 +1,14 @@
 from anubis.models import Course, InCourse, User
-from anubis.utils.cache import cache
+from anubis.utils.cache import cache, cache_tag, tagged_memoize
 from anubis.utils.data import is_debug, is_job
 
 
-@cache.memoize(timeout=-1, forced_update=is_job, unless=is_debug, source_check=True)
+@tagged_memoize(
+    lambda course_id: [cache_tag("course", course_id)] if course_id is not None else ["user:*"],
+    forced_update=is_job,
+    unless=is_debug,
+    source_check=True,
+)
 def get_students(course_id: str = None) -> list[dict[str, dict]]:
     """
     Get students by course code. If no course code is specified,
@@ -3,7 +3,9 @@ from datetime import datetime
 from sqlalchemy.orm import undefer
 
 from anubis.constants import AUTOGRADE_DISABLED_MESSAGE
+from anubis.k8s.pipeline.scheduler import PRIORITY_BULK_REGRADE, PRIORITY_REGRADE
 from anubis.lms.assignments import get_assignment_due_date
+from anubis.lms.autograde import refresh_best_submissions, update_best_submission
 from anubis.models import (
     Assignment,
     AssignmentTest,
@@ -15,7 +17,7 @@ from anubis.models import (
     User,
     db,
 )
-from anubis.utils.cache import cache
+from anubis.utils.cache import cache_tag, tagged_memoize
 from anubis.utils.data import is_debug, split_chunks, with_context
 from anubis.utils.http import error_response, success_response
 from anubis.utils.logging import logger
@@ -25,27 +27,41 @@ from anubis.utils.logging import logger
 def bulk_regrade_submissions(submissions: list[Submission]) -> list[dict]:
     """
     Regrade a batch of submissions
+
+    * The pipeline jobs for the whole batch are enqueued together *
+
     :param submissions:
     :return:
     """
+    from anubis.rpc.enqueue import enqueue_autograde_pipelines
 
     # Running list of regrade dictionaries
     response = []
 
-    # enqueue regrade jobs for each submissions
+    # Submissions that were reset, and need to be enqueued
+    submission_ids = []
+
+    # reset each of the submissions for regrading
     for submission in submissions:
-        response.append(regrade_submission(submission, queue="regrade"))
+        result = regrade_submission(submission, enqueue=False)
+        if result["success"]:
+            submission_ids.append(getattr(submission, "id", submission))
+        response.append(result)
+
+    # enqueue regrade jobs for all the submissions
+    enqueue_autograde_pipelines(submission_ids, priority=PRIORITY_BULK_REGRADE)
 
     # Pass back a list of all the regrade return dictionaries
     return response
 
 
-def regrade_submission(submission: Submission | str, queue: str = "default") -> dict:
+def regrade_submission(submission: Submission | str, priority: int = PRIORITY_REGRADE, enqueue: bool = True) -> dict:
     """
     Regrade a submission
 
     :param submission: Union[Submissions, str]
-    :param queue:
+    :param priority: pipeline scheduler priority
+    :param enqueue: enqueue the pipeline job for the submission
     :return: dict response
     """
     from anubis.rpc.enqueue import enqueue_autograde_pipeline
@@ -76,12 +92,17 @@ def regrade_submission(submission: Submission | str, queue: str = "default") ->
     init_submission(submission)
 
     # Enqueue the submission job
-    enqueue_autograde_pipeline(submission.id, queue=queue)
+    if enqueue:
+        enqueue_autograde_pipeline(submission.id, priority=priority)
 
     return success_response({"message": "regrade started"})
 
 
-@cache.memoize(timeout=60, unless=is_debug, source_check=True)
+@tagged_memoize(
+    lambda user_id, course_id, assignment_id, limit, offset: [cache_tag("user", user_id)],
+    unless=is_debug,
+    source_check=True,
+)
 def get_submissions(
     user_id=None,
     course_id=None,
@@ -210,7 +231,7 @@ def recalculate_late_submissions(student: User, assignment: Assignment):
     :param assignment:
     :return:
     """
-    from anubis.rpc.enqueue import rpc_enqueue
+    from anubis.rpc.enqueue import enqueue_bulk_regrade_submission_chunks
 
     # Get the due date for this student
     due_date = get_assignment_due_date(student.id, assignment.id, grace=True)
@@ -244,8 +265,7 @@ def recalculate_late_submissions(student: User, assignment: Assignment):
 
         # Go through, and reset and enqueue regrade
         s_accept_ids = list(map(lambda x: x.id, s_accept))
-        for chunk in split_chunks(s_accept_ids, 32):
-            rpc_enqueue(bulk_regrade_submissions, "regrade", args=[chunk])
+        enqueue_bulk_regrade_submission_chunks(split_chunks(s_accept_ids, 32))
 
         # Reject the submissions that need to be updated
         for submission in s_reject:
@@ -254,6 +274,9 @@ def recalculate_late_submissions(student: User, assignment: Assignment):
     # Commit the changes
     db.session.commit()
 
+    # Accepted submissions changed, so recalculate the best submission
+    refresh_best_submissions(assignment.id, [student.id])
+
 
 def reject_late_submission(submission: Submission):
     """
@@ -331,6 +354,9 @@ def init_submission(submission: Submission, db_commit: bool = True, state: str =
         # Commit new models
         db.session.commit()
 
+        # The test results were reset, so update the best submission
+        update_best_submission(submission)
+
 
 def get_latest_user_submissions(assignment: Assignment = None, user: User = None, limit: int = 3,
                                 filter: list = None) -> list[Submission]:
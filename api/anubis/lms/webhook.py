@@ -1,6 +1,23 @@
-from anubis.lms.repos import get_repos
-from anubis.models import Assignment, AssignmentRepo, User, db
-from anubis.utils.cache import cache
+import time
+import traceback
+from datetime import datetime, timedelta
+from typing import Any
+
+import pottery
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql import and_, or_
+
+from anubis.constants import AUTOGRADE_DISABLED_MESSAGE
+from anubis.lms.assignments import get_assignment_due_date
+from anubis.lms.autograde import update_best_submission
+from anubis.lms.repo_index import get_indexed_assignment, get_indexed_repo, index_repos, unindex_assignment
+from anubis.lms.submissions import init_submission, reject_late_submission
+from anubis.models import Assignment, AssignmentRepo, Submission, User, WebhookEvent, db
+from anubis.utils.config import get_config_int
+from anubis.utils.data import is_debug, req_assert
+from anubis.utils.exceptions import AssertError
+from anubis.utils.logging import logger
+from anubis.utils.redis import create_redis_lock
 
 
 def parse_webhook(webhook):
@@ -93,8 +110,311 @@ def check_repo(assignment: Assignment, repo_url: str, user=None, netid=None) ->
         db.session.add(repo)
         db.session.commit()
 
-        if user is not None:
-            cache.delete_memoized(get_repos, user.id)
+    index_repos([repo])
 
     # Return the repo object
     return repo
+
+
+def _get_indexed_assignment_row(assignment_info: dict[str, Any]) -> Assignment:
+    assignment = Assignment.query.filter(Assignment.id == assignment_info["id"]).first()
+
+    # The index may still have an assignment that was just deleted
+    if assignment is None:
+        unindex_assignment(assignment_info["unique_code"])
+    req_assert(assignment is not None, message="assignment not found", status_code=406)
+
+    return assignment
+
+
+def process_push_event(
+    webhook: dict[str, Any],
+    received: datetime | None = None,
+) -> tuple[str | dict, str | None]:
+    """
+    Process a github push event. This will find the assignment and repo that
+    was pushed to, then create and initialize a submission for the commit.
+
+    Pushes that can not be matched to anything raise an AssertError (through
+    req_assert) with the reason.
+
+    Recorded push events may be processed well after github delivered them,
+    so the late check and the submission created time use when the push was
+    received (now if not specified).
+
+    :param webhook: json push event from github
+    :param received: when the push was received from github
+    :return: (response data, id of submission to autograde or None)
+    """
+
+    if received is None:
+        received = datetime.now()
+
+    # Load the basics from the webhook
+    repo_url, repo_name, pusher_username, commit, before, ref, default_branch = parse_webhook(webhook)
+
+    # Attempt to find the assignment from the index
+    assignment_info = get_indexed_assignment(repo_name)
+
+    # Verify that we can match this push to an assignment
+    req_assert(assignment_info is not None, message="assignment not found", status_code=406)
+
+    # The before Hash will be all 0s on for the first hash.
+    # We will want to ignore both this first push (the initialization of the repo)
+    # and all branches that are not master.
+    if before == "0000000000000000000000000000000000000000":
+        # Record that a new repo was created (and therefore, someone just
+        # started their assignment)
+        logger.debug(
+            "new student repo ",
+            extra={
+                "repo_url": repo_url,
+                "pusher": pusher_username,
+                "commit": commit,
+            },
+        )
+
+        assignment = _get_indexed_assignment_row(assignment_info)
+
+        # Get github username from the repository name
+        user, netid = guess_github_repo_owner(assignment, repo_name)
+        repo = check_repo(assignment, repo_url, user, netid)
+
+        if repo.owner_id == None:
+            return "initial dangling", None
+
+        return "initial commit", None
+
+    logger.debug(
+        "webhook data",
+        extra={
+            "assignment": assignment_info["name"],
+            "repo_url": repo_url,
+            "commit": commit,
+            "unique_code": assignment_info["unique_code"],
+        },
+    )
+
+    org_name = assignment_info["github_org"]
+    if not is_debug() and org_name is not None and org_name != "":
+        # Make sure that the repo we're about to process actually belongs to
+        # a github organization that matches the course.
+        if not repo_url.startswith(f"https://github.com/{org_name}"):
+            logger.error(
+                "Invalid github organization in webhook.",
+                extra={
+                    "repo_url": repo_url,
+                    "pusher_username": pusher_username,
+                    "commit": commit,
+                },
+            )
+            req_assert(False, message="invalid repo", status_code=406)
+
+    # Known repos with an owner can be resolved from the index. Anything
+    # else needs the owner guessed from the repo name.
+    repo_info = get_indexed_repo(repo_url)
+    if repo_info is not None and repo_info["assignment_id"] == assignment_info["id"] and repo_info["owner_id"] is not None:
+        repo_id, owner_id = repo_info["repo_id"], repo_info["owner_id"]
+    else:
+        assignment = _get_indexed_assignment_row(assignment_info)
+
+        # Get github username from the repository name
+        user, netid = guess_github_repo_owner(assignment, repo_name)
+
+        # if we dont have a record of the repo, then add it
+        repo = check_repo(assignment, repo_url, user, netid)
+        repo_id, owner_id = repo.id, user.id if user is not None else None
+
+    req_assert(
+        ref == f"refs/heads/{default_branch}",
+        message="not a push to default branch",
+    )
+
+    # Try to find a submission matching the commit
+    submission = Submission.query.filter_by(commit=commit).first()
+
+    # If the submission does not exist, then create one
+    if submission is None:
+        # Create a shiny new submission
+        submission = Submission(
+            assignment_id=assignment_info["id"],
+            assignment_repo_id=repo_id,
+            owner_id=owner_id,
+            commit=commit,
+            state="Waiting for resources...",
+            created=received,
+        )
+        db.session.add(submission)
+        db.session.commit()
+
+    # If the submission did already exist, then we can just pass
+    # back that status
+    elif submission.created < datetime.now() - timedelta(minutes=3):
+        return {"status": "already created"}, None
+
+    # Create the related submission models
+    init_submission(submission)
+
+    # If a user has not given us their github username
+    # the submission will stay in a "dangling" state
+    req_assert(owner_id is not None, message="dangling submission")
+
+    # Check that the current assignment is still accepting submissions
+    if not assignment_info["accept_late"] and received > get_assignment_due_date(owner_id, assignment_info["id"], grace=True):
+        reject_late_submission(submission)
+
+    # If the github username is not found, create a dangling submission
+    if not assignment_info["autograde_enabled"]:
+        submission.processed = True
+        submission.state = AUTOGRADE_DISABLED_MESSAGE
+
+    db.session.commit()
+
+    # Rejected submissions may no longer be the best submission
+    if not submission.accepted:
+        update_best_submission(submission)
+
+    # If the submission was accepted, then it should be autograded
+    if assignment_info["autograde_enabled"] and submission.accepted:
+        return "submission accepted", submission.id
+
+    return "submission accepted", None
+
+
+def record_push_event(webhook: dict[str, Any], delivery_id: str | None = None) -> WebhookEvent | None:
+    """
+    Save a push event to be processed later by process_push_events. Github
+    retries deliveries it thinks have failed, and the same commit can be
+    pushed more than once, so events are deduplicated by both delivery id
+    and commit. The same commit pushed to another branch is not a
+    duplicate, as only pushes to the default branch are graded.
+
+    :param webhook: json push event from github
+    :param delivery_id: X-GitHub-Delivery header
+    :return: the recorded event, or None if it was a duplicate
+    """
+
+    # Make sure the event has what we need to process it
+    try:
+        repo_url, _, _, commit, _, ref, _ = parse_webhook(webhook)
+    except (KeyError, TypeError):
+        req_assert(False, message="Unable to parse webhook")
+
+    if delivery_id is None:
+        delivery_id = f"{repo_url} {ref} {commit}"
+
+    duplicate = db.session.query(WebhookEvent.id).filter(or_(
+        WebhookEvent.delivery_id == delivery_id,
+        and_(WebhookEvent.repo_url == repo_url, WebhookEvent.ref == ref, WebhookEvent.commit == commit),
+    )).first()
+    if duplicate is not None:
+        return None
+
+    event = WebhookEvent(
+        delivery_id=delivery_id,
+        repo_url=repo_url,
+        ref=ref,
+        commit=commit,
+        payload=webhook,
+    )
+    db.session.add(event)
+
+    # The same delivery may be racing us from another api pod
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return None
+
+    return event
+
+
+def process_push_events(max_seconds: float = 240.0) -> int:
+    """
+    Process the recorded push events, oldest first, in batches of
+    WEBHOOK_PROCESS_BATCH_SIZE. The autograde pipelines for each batch
+    are enqueued together. Only one process works through the events at
+    a time.
+
+    This keeps going until there are no events left, or max_seconds have
+    passed. If there are still events left at that point, another call
+    is enqueued.
+
+    :param max_seconds:
+    :return: number of events processed
+    """
+    from anubis.rpc.enqueue import enqueue_autograde_pipelines, enqueue_process_push_events
+    from anubis.k8s.pipeline.scheduler import PRIORITY_PUSH
+
+    batch_size = get_config_int("WEBHOOK_PROCESS_BATCH_SIZE", default=50)
+
+    lock = create_redis_lock("webhook-push-events", auto_release_time=max_seconds + 60.0)
+    if not lock.acquire(timeout=max_seconds):
+        logger.warning("Unable to get webhook push events lock")
+        return 0
+
+    processed = 0
+    start = time.time()
+    try:
+        while time.time() - start < max_seconds:
+            event_ids: list[str] = [
+                event_id
+                for event_id, in db.session.query(WebhookEvent.id)
+                .filter(WebhookEvent.processed == False)
+                .order_by(WebhookEvent.created)
+                .limit(batch_size)
+                .all()
+            ]
+            if len(event_ids) == 0:
+                break
+
+            submission_ids = []
+            for event_id in event_ids:
+                event: WebhookEvent = WebhookEvent.query.filter(WebhookEvent.id == event_id).first()
+                try:
+                    data, submission_id = process_push_event(event.payload, received=event.created)
+                    result = str(data)
+                    if submission_id is not None:
+                        submission_ids.append(submission_id)
+                except AssertError as e:
+                    db.session.rollback()
+                    result, _ = e.response()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Failed to process push event {event_id} {e}\n{traceback.format_exc()}")
+                    result = f"error: {e}"
+
+                WebhookEvent.query.filter(WebhookEvent.id == event_id).update({
+                    "processed": True,
+                    "result":    result[:1024],
+                }, synchronize_session=False)
+                db.session.commit()
+                processed += 1
+
+            enqueue_autograde_pipelines(submission_ids, priority=PRIORITY_PUSH)
+
+        else:
+            # Out of time, let another call pick up the rest
+            enqueue_process_push_events()
+    finally:
+        try:
+            lock.release()
+        except pottery.exceptions.ReleaseUnlockedLock:
+            logger.warning("Webhook push events lock expired while processing")
+
+    return processed
+
+
+def delete_processed_push_events(older_than: timedelta = timedelta(days=7)):
+    """
+    Delete push events that were processed a while ago. They are
+    only kept around for deduplication and debugging.
+
+    :param older_than:
+    :return:
+    """
+    WebhookEvent.query.filter(
+        WebhookEvent.processed == True,
+        WebhookEvent.created < datetime.now() - older_than,
+    ).delete(synchronize_session=False)
+    db.session.commit()
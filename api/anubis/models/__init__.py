@@ -650,6 +650,39 @@ class SubmissionTestResult(db.Model):
         return f"<SubmissionTestResult {name=} {passed=}>"
 
 
+class BestSubmission(db.Model):
+    __tablename__ = "best_submission"
+    __allow_unmapped__ = True
+    __table_args__ = {"mysql_charset": DB_CHARSET, "mysql_collate": DB_COLLATION}
+
+    # Foreign Keys
+    owner_id: str = Column(String(length=default_id_length), ForeignKey(User.id), primary_key=True)
+    assignment_id: str = Column(String(length=default_id_length), ForeignKey(Assignment.id), primary_key=True)
+    submission_id: str = Column(String(length=default_id_length), ForeignKey(Submission.id), index=True,
+                                nullable=False)
+
+    # Fields
+    tests_passed: int = Column(Integer, nullable=False, default=0)
+
+    # Timestamps
+    created: datetime = Column(DateTime, default=datetime.now)
+    last_updated: datetime = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    # Relationships
+    submission = relationship(Submission)
+
+    @property
+    def data(self):
+        return {
+            "owner_id":      self.owner_id,
+            "assignment_id": self.assignment_id,
+            "submission_id": self.submission_id,
+            "tests_passed":  self.tests_passed,
+            "created":       str(self.created),
+            "last_updated":  str(self.last_updated),
+        }
+
+
 class SubmissionBuild(db.Model):
     __tablename__ = "submission_build"
     __allow_unmapped__ = True
@@ -1024,6 +1057,97 @@ class EmailEvent(db.Model):
         }
 
 
+class WebhookEvent(db.Model):
+    __tablename__ = "webhook_event"
+    __allow_unmapped__ = True
+    __table_args__ = {"mysql_charset": DB_CHARSET, "mysql_collate": DB_COLLATION}
+
+    id: str = default_id()
+
+    # Github delivery id for the event. Github sends the same
+    # delivery id when it retries a delivery.
+    delivery_id: str = Column(String(length=128), unique=True, nullable=False)
+
+    # Repo, branch and commit that were pushed
+    repo_url: str = Column(String(length=512), nullable=False)
+    ref: str = Column(String(length=256), nullable=False)
+    commit: str = Column(String(length=128), index=True, nullable=False)
+
+    # The raw push event from github
+    payload = deferred(Column(JSON, nullable=False))
+
+    # Processing state
+    processed: bool = Column(Boolean, default=False, index=True)
+    result: str = Column(String(length=1024), nullable=True)
+
+    # Timestamps
+    created: datetime = Column(DateTime, default=datetime.now)
+    last_updated: datetime = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    @property
+    def data(self):
+        return {
+            "id":           self.id,
+            "delivery_id":  self.delivery_id,
+            "repo_url":     self.repo_url,
+            "ref":          self.ref,
+            "commit":       self.commit,
+            "processed":    self.processed,
+            "result":       self.result,
+            "created":      str(self.created),
+            "last_updated": str(self.last_updated),
+        }
+
+
+class DailyActivity(db.Model):
+    __tablename__ = "daily_activity"
+    __allow_unmapped__ = True
+    __table_args__ = {"mysql_charset": DB_CHARSET, "mysql_collate": DB_COLLATION}
+
+    id: str = default_id()
+
+    # Day (at midnight) that the row covers
+    day: datetime = Column(DateTime, nullable=False, index=True)
+
+    # Course that the row covers. Platform wide rows have no course.
+    course_id: str = Column(String(length=default_id_length), ForeignKey(Course.id), nullable=True, index=True)
+
+    # Distinct users active that day
+    submission_users: int = Column(Integer, default=0)
+    theia_users: int = Column(Integer, default=0)
+    active_users: int = Column(Integer, default=0)
+
+    # Activity counts for the day
+    submissions: int = Column(Integer, default=0)
+    theia_sessions: int = Column(Integer, default=0)
+
+    # Registrations (only on platform wide rows)
+    new_users: int = Column(Integer, default=0)
+    total_users: int = Column(Integer, default=0)
+
+    # Ids of the users active that day. These are only needed to count
+    # distinct users over more than one day.
+    submission_user_ids = deferred(Column(JSON, nullable=True))
+    theia_user_ids = deferred(Column(JSON, nullable=True))
+
+    # Timestamps
+    created: datetime = Column(DateTime, default=datetime.now)
+
+    @property
+    def data(self):
+        return {
+            "day":              str(self.day.date()),
+            "course_id":        self.course_id,
+            "submission_users": self.submission_users,
+            "theia_users":      self.theia_users,
+            "active_users":     self.active_users,
+            "submissions":      self.submissions,
+            "theia_sessions":   self.theia_sessions,
+            "new_users":        self.new_users,
+            "total_users":      self.total_users,
+        }
+
+
 class ReservedIDETime(db.Model):
     __tablename__ = "reserved_ide_time"
     __allow_unmapped__ = True
@@ -5,27 +5,34 @@ so these functions must reside in a separate file.
 """
 
 import traceback
+from typing import Any, Callable, Iterable
 
-from redis import Redis
 from rq import Queue
+from rq.job import Job
 
 from anubis.env import env
 from anubis.github.repos import create_assignment_github_repo
-from anubis.ide.initialize import initialize_theia_session
-from anubis.k8s.pipeline.create import create_submission_pipeline
-from anubis.k8s.pipeline.reap import reap_pipeline_jobs
-from anubis.k8s.pvc.create import create_user_pvc
-from anubis.k8s.pvc.reap import reap_user_pvc
-from anubis.k8s.theia.reap import reap_stale_theia_sessions
-from anubis.k8s.theia.reap import reap_theia_session_by_id
+from anubis.k8s.pipeline.scheduler import PRIORITY_BULK_REGRADE, PRIORITY_PUSH, schedule_submission_pipelines
 from anubis.lms.assignments import make_shared_assignment
 from anubis.lms.autograde import bulk_autograde
 from anubis.lms.questions import assign_missing_questions
 from anubis.lms.regrade import bulk_regrade_assignment, bulk_regrade_assignment_of_student
 from anubis.lms.submissions import bulk_regrade_submissions, recalculate_late
+from anubis.lms.webhook import process_push_events
 from anubis.lms.courses import bulk_create_students
 from anubis.utils.data import with_context
-from anubis.utils.testing.seed import seed
+from anubis.utils.redis import redis
+
+# Dedup keys expire on their own in case a job is lost before it runs
+RPC_DEDUP_TTL = 60 * 60
+
+# Functions that run against the cluster are imported when they are
+# enqueued. This keeps the kubernetes client out of the api and any
+# job that only enqueues other work. The rq worker preloads them.
+
+# Queue objects are cheap, but there is no reason to make
+# a new one for every job. They all share the pooled connection.
+_queues: dict[str, Queue] = {}
 
 
 @with_context
@@ -33,6 +40,33 @@ def _run_rpc_function(func, *args):
     return func(*args)
 
 
+@with_context
+def _run_dedup_rpc_function(dedup_key: str, func, *args):
+    # Release the dedup key before running so that the
+    # same job can be queued again while this one runs.
+    redis.delete(dedup_key)
+    return func(*args)
+
+
+def _get_queue(name: str) -> Queue:
+    if name not in _queues:
+        _queues[name] = Queue(name=name, connection=redis)
+    return _queues[name]
+
+
+def _get_dedup_key(queue: str, key: str) -> str:
+    return f"anubis-rpc-dedup-{queue}-{key}"
+
+
+def _run_locally(func, args):
+    try:
+        return func(*args)
+    except Exception as e:
+        print(e)
+        print(traceback.format_exc())
+        return
+
+
 def rpc_enqueue(func, queue=None, args=None):
     """
     Enqueues a job on the redis cache
@@ -50,46 +84,132 @@ def rpc_enqueue(func, queue=None, args=None):
     # If we are running in mindebug, there is
     # no rq cluster to send things off to.
     if env.MINDEBUG:
-        try:
-            return func(*args)
-        except Exception as e:
-            print(e)
-            print(traceback.format_exc())
-            return
+        return _run_locally(func, args)
+
+    _get_queue(queue).enqueue(_run_rpc_function, func, *args)
 
-    with Redis(host=env.CACHE_REDIS_HOST, password=env.CACHE_REDIS_PASSWORD) as conn:
-        q = Queue(name=queue, connection=conn)
-        q.enqueue(_run_rpc_function, func, *args)
-        conn.close()
 
+def rpc_enqueue_many(
+    func: Callable,
+    queue: str = None,
+    args_list: Iterable[Iterable[Any]] = None,
+    dedup_keys: list[str] | None = None,
+) -> list[Job]:
+    """
+    Enqueue many jobs for the same function in a single redis pipeline.
+
+    If dedup_keys are specified, there should be one key for each set
+    of args. Any job whose key is already queued is skipped, so the
+    same thing (say a submission id) is never in the queue twice.
+
+    >>> rpc_enqueue_many(bulk_regrade_assignment, 'regrade',
+    >>>                  args_list=[[aid] for aid in assignment_ids],
+    >>>                  dedup_keys=assignment_ids)
+
+    :param func: any callable object
+    :param queue: name of the rq queue
+    :param args_list: list of ordered arguments for each job
+    :param dedup_keys: optional list of dedup keys for each job
+    :return: list of jobs that were enqueued
+    """
+
+    # set defaults
+    if queue is None:
+        queue = "default"
+    args_list = [tuple(args) for args in (args_list or [])]
+    if dedup_keys is not None:
+        assert len(dedup_keys) == len(args_list), "dedup_keys must be the same length as args_list"
+
+    if len(args_list) == 0:
+        return []
+
+    # If we are running in mindebug, there is
+    # no rq cluster to send things off to.
+    if env.MINDEBUG:
+        for args in args_list:
+            _run_locally(func, args)
+        return []
 
-def enqueue_autograde_pipeline(*args, queue: str = "regrade"):
-    """Enqueues a test job"""
-    rpc_enqueue(create_submission_pipeline, queue=queue, args=args)
+    q = _get_queue(queue)
+
+    # Build the jobs
+    if dedup_keys is None:
+        job_datas = [
+            Queue.prepare_data(_run_rpc_function, args=(func, *args))
+            for args in args_list
+        ]
+
+    else:
+        # Claim all the dedup keys in one round trip. Only the
+        # jobs that got their key are enqueued.
+        keys = [_get_dedup_key(queue, key) for key in dedup_keys]
+        with redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.set(key, 1, nx=True, ex=RPC_DEDUP_TTL)
+            claimed = pipe.execute()
+
+        job_datas = [
+            Queue.prepare_data(_run_dedup_rpc_function, args=(key, func, *args))
+            for key, args, is_claimed in zip(keys, args_list, claimed)
+            if is_claimed
+        ]
+
+    if len(job_datas) == 0:
+        return []
+
+    # Push all the jobs in a single pipeline
+    with redis.pipeline() as pipe:
+        jobs = q.enqueue_many(job_datas, pipeline=pipe)
+        pipe.execute()
+
+    return jobs
+
+
+def enqueue_autograde_pipeline(submission_id: str, priority: int = PRIORITY_PUSH):
+    """Schedules a test job"""
+    enqueue_autograde_pipelines([submission_id], priority=priority)
+
+
+def enqueue_autograde_pipelines(submission_ids: list[str], priority: int = PRIORITY_BULK_REGRADE):
+    """Schedules test jobs for many submissions, skipping any already scheduled"""
+
+    # If we are running in mindebug, there is
+    # no pipeline poller to admit the jobs.
+    if env.MINDEBUG:
+        from anubis.k8s.pipeline.create import create_submission_pipeline
+
+        for submission_id in submission_ids:
+            _run_locally(create_submission_pipeline, (submission_id,))
+        return
+
+    schedule_submission_pipelines(submission_ids, priority=priority)
 
 
 def enqueue_ide_initialize(*args):
     """Enqueue an ide initialization job"""
+    from anubis.ide.initialize import initialize_theia_session
+
     rpc_enqueue(initialize_theia_session, queue="theia", args=args)
 
 
 def enqueue_ide_stop(*args):
     """Reap theia session kube resources"""
+    from anubis.k8s.theia.reap import reap_theia_session_by_id
+
     rpc_enqueue(reap_theia_session_by_id, queue="theia", args=args)
 
 
 def enqueue_ide_reap_stale(*args):
     """Reap stale ide resources"""
-    rpc_enqueue(reap_stale_theia_sessions, queue="theia", args=args)
+    from anubis.k8s.theia.reap import reap_stale_theia_sessions
 
-
-def enqueue_pipeline_reap_stale(*args):
-    """Reap stale pipeline job resources"""
-    rpc_enqueue(reap_pipeline_jobs, queue="theia", args=args)
+    rpc_enqueue(reap_stale_theia_sessions, queue="theia", args=args)
 
 
 def enqueue_seed():
     """Enqueue debug seed data"""
+    from anubis.utils.testing.seed import seed
+
     rpc_enqueue(seed, queue="default")
 
 
@@ -98,6 +218,11 @@ def enqueue_assign_missing_questions(*args):
     rpc_enqueue(assign_missing_questions, queue="default", args=args)
 
 
+def enqueue_process_push_events():
+    """Process recorded webhook push events. Only one of these is queued at a time."""
+    rpc_enqueue_many(process_push_events, queue="default", args_list=[[]], dedup_keys=["process-push-events"])
+
+
 def enqueue_make_shared_assignment(*args):
     """Enqueue make shared assignment"""
     rpc_enqueue(make_shared_assignment, queue="default", args=args)
@@ -110,11 +235,15 @@ def enqueue_create_assignment_github_repo(*args):
 
 def enqueue_reap_pvc_user(*args):
     """Enqueue reap pvc for user"""
+    from anubis.k8s.pvc.reap import reap_user_pvc
+
     rpc_enqueue(reap_user_pvc, queue='default', args=args)
 
 
 def enqueue_create_pvc_user(*args):
     """Enqueue create pvc for user"""
+    from anubis.k8s.pvc.create import create_user_pvc
+
     rpc_enqueue(create_user_pvc, queue='default', args=args)
 
 
@@ -132,6 +261,11 @@ def enqueue_bulk_regrade_submissions(*args):
     """Enqueue bulk autograde of assignment"""
     rpc_enqueue(bulk_regrade_submissions, queue="regrade", args=args)
 
+
+def enqueue_bulk_regrade_submission_chunks(chunks: list[list[str]]):
+    """Enqueue bulk autograde of many chunks of submissions"""
+    rpc_enqueue_many(bulk_regrade_submissions, queue="regrade", args_list=[[chunk] for chunk in chunks])
+
 def enqueue_bulk_regrade_submissions_of_student(*args):
     """Enqueue bulk autograde submissions of a student"""
     rpc_enqueue(bulk_regrade_assignment_of_student, queue="regrade", args=args)
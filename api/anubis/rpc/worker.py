@@ -0,0 +1,156 @@
+"""
+Custom rq workers for running Anubis jobs. Start them with:
+
+    rq worker -w anubis.rpc.worker.AnubisWorker default
+"""
+
+import importlib
+import time
+from typing import Any
+
+from flask import Flask
+from redis.exceptions import RedisError
+from rq import Queue, SimpleWorker, Worker
+from rq.job import Job
+
+from anubis.utils.logging import logger
+from anubis.utils.redis import redis
+
+# Job functions (and their heavy dependencies like kubernetes and
+# pandas) to import once in the worker, instead of in every job.
+_PRELOAD_MODULES = [
+    "anubis.rpc.enqueue",
+    "anubis.ide.initialize",
+    "anubis.k8s.pipeline.create",
+    "anubis.k8s.pipeline.reap",
+    "anubis.k8s.pvc.create",
+    "anubis.k8s.pvc.reap",
+    "anubis.k8s.theia.reap",
+]
+
+# func name -> count / setup / execution totals
+_JOB_STATS_KEY = "anubis-rpc-job-stats"
+
+
+def _record_job_stats(func_name: str, setup: float, execution: float):
+    logger.info(f"rpc job {func_name} setup={setup:.3f}s execution={execution:.3f}s")
+    try:
+        with redis.pipeline(transaction=False) as pipe:
+            pipe.hincrby(_JOB_STATS_KEY, f"{func_name}:count", 1)
+            pipe.hincrbyfloat(_JOB_STATS_KEY, f"{func_name}:setup", setup)
+            pipe.hincrbyfloat(_JOB_STATS_KEY, f"{func_name}:execution", execution)
+            pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Unable to record rpc job stats {e}")
+
+
+def get_rpc_job_stats() -> dict[str, dict[str, Any]]:
+    """
+    Get the average setup and execution time (in seconds) of the jobs
+    run by each rpc function. Setup is the time from when a worker
+    picked up the job to when the job function was called.
+
+    response = {
+      "anubis.k8s.theia.reap.reap_theia_session_by_id": {
+        "count": 10,
+        "avg_setup": 0.012,
+        "avg_execution": 1.2,
+      }
+    }
+
+    :return:
+    """
+    totals: dict[str, dict[str, float]] = {}
+    for field, value in redis.hgetall(_JOB_STATS_KEY).items():
+        func_name, stat = field.decode().rsplit(":", 1)
+        totals.setdefault(func_name, {})[stat] = float(value)
+
+    return {
+        func_name: {
+            "count":         int(stats.get("count", 0)),
+            "avg_setup":     round(stats.get("setup", 0.0) / stats["count"], 3) if stats.get("count") else None,
+            "avg_execution": round(stats.get("execution", 0.0) / stats["count"], 3) if stats.get("count") else None,
+        }
+        for func_name, stats in totals.items()
+    }
+
+
+def _get_rpc_func_name(job: Job) -> str:
+    # Jobs are enqueued through a wrapper that takes the
+    # real function as its first argument.
+    if len(job.args) > 0 and callable(job.args[0]):
+        func = job.args[0]
+        return f"{func.__module__}.{func.__qualname__}"
+    return job.func_name
+
+
+class AnubisWorker(Worker):
+    """
+    Worker that builds the job app, and imports everything the jobs need
+    once, before any work horses are forked. Each work horse then inherits
+    the app instead of creating a new one (through with_context) for every
+    job.
+
+    The setup (fork and context) and execution time of each job are
+    logged, and totalled per function in redis.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.app: Flask | None = None
+        self._job_received: float = 0.0
+
+    def work(self, *args, **kwargs):
+        self.preload()
+        return super().work(*args, **kwargs)
+
+    def preload(self):
+        """
+        Build the job app and import the job functions (and with them
+        the heavy dependencies like kubernetes and pandas).
+
+        :return:
+        """
+        if self.app is not None:
+            return
+
+        from anubis.app import create_job_app
+
+        self.app = create_job_app()
+        for module in _PRELOAD_MODULES:
+            importlib.import_module(module)
+
+    def execute_job(self, job: Job, queue: Queue):
+        self._job_received = time.monotonic()
+        return super().execute_job(job, queue)
+
+    def main_work_horse(self, job: Job, queue: Queue):
+        from anubis.models import db
+
+        # Connections can not be shared with the parent process. Drop
+        # the inherited pool (without closing the parent's connections).
+        with self.app.app_context():
+            db.engine.dispose(close=False)
+
+        return super().main_work_horse(job, queue)
+
+    def perform_job(self, job: Job, queue: Queue) -> bool:
+        # with_context will use these instead of creating an app
+        with self.app.app_context(), self.app.test_request_context():
+            started = time.monotonic()
+            try:
+                return super().perform_job(job, queue)
+            finally:
+                _record_job_stats(
+                    _get_rpc_func_name(job),
+                    setup=started - self._job_received,
+                    execution=time.monotonic() - started,
+                )
+
+
+class AnubisSimpleWorker(AnubisWorker, SimpleWorker):
+    """
+    AnubisWorker that runs jobs in the worker process instead of forking.
+    The app and its database connection pool are reused across jobs. This
+    suits queues of many short jobs (like the theia queue).
+    """
@@ -1,6 +1,6 @@
 from functools import wraps
 
-from anubis.models import ProfessorForCourse, TAForCourse
+from anubis.utils.auth.permissions import get_permissions
 from anubis.utils.auth.user import get_current_user
 from anubis.utils.data import is_debug
 from anubis.utils.exceptions import AssertError, AuthenticationError
@@ -74,10 +74,11 @@ def require_admin(unless_debug=False):
             if user.is_superuser:
                 return func(*args, **kwargs)
 
-            ta = TAForCourse.query.filter(TAForCourse.owner_id == user.id).first()
-            prof = ProfessorForCourse.query.filter(ProfessorForCourse.owner_id == user.id).first()
+            # Get the roles of the user. These are kept for the rest
+            # of the request for any course permission checks.
+            permissions = get_permissions(user.id)
 
-            if ta is None and prof is None:
+            if len(permissions["ta_for"]) == 0 and len(permissions["professor_for"]) == 0:
                 raise AuthenticationError("User is not ta or professor")
 
             # Pass the parameters to the
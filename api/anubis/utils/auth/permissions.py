@@ -0,0 +1,85 @@
+from typing import Any
+
+from flask import g
+from sqlalchemy import literal, null, select, union_all
+
+from anubis.models import InCourse, ProfessorForCourse, TAForCourse, User, db
+from anubis.utils.auth.user import current_user
+from anubis.utils.cache import cache_tag, tagged_memoize
+from anubis.utils.data import is_debug
+
+
+@tagged_memoize(lambda user_id: [cache_tag("user", user_id)], timeout=60, unless=is_debug)
+def get_user_roles(user_id: str) -> dict[str, Any]:
+    """
+    Load every role that a user has in a single query. Changes to the
+    user, or the courses they are a student, ta or professor for will
+    invalidate the cached roles.
+
+    * This response is cached for up to 60 seconds *
+
+    response = {
+      "is_superuser": False,
+      "professor_for": [course_id, ...],
+      "ta_for": [course_id, ...],
+      "student_for": [course_id, ...],
+    }
+
+    :param user_id:
+    :return:
+    """
+
+    query = union_all(
+        select(literal("superuser").label("role"), null().label("course_id")).where(
+            User.id == user_id,
+            User.is_superuser == True,
+        ),
+        select(literal("professor"), ProfessorForCourse.course_id).where(ProfessorForCourse.owner_id == user_id),
+        select(literal("ta"), TAForCourse.course_id).where(TAForCourse.owner_id == user_id),
+        select(literal("student"), InCourse.course_id).where(InCourse.owner_id == user_id),
+    )
+
+    roles = {
+        "is_superuser":  False,
+        "professor_for": [],
+        "ta_for":        [],
+        "student_for":   [],
+    }
+    for role, course_id in db.session.execute(query):
+        if role == "superuser":
+            roles["is_superuser"] = True
+        else:
+            roles[f"{role}_for"].append(course_id)
+
+    return roles
+
+
+def get_permissions(user_id: str = None) -> dict[str, Any]:
+    """
+    Get the roles for a user (the current user by default) as sets of
+    course ids. The roles are only loaded once per request, then kept on
+    flask.g so that any number of permission checks can be answered
+    without going back to the database.
+
+    :param user_id:
+    :return:
+    """
+
+    if user_id is None:
+        user_id = current_user.id
+
+    # Permissions loaded so far in this request
+    if "permissions" not in g:
+        g.permissions = {}
+
+    if user_id not in g.permissions:
+        roles = get_user_roles(user_id)
+        g.permissions[user_id] = {
+            "is_superuser":  roles["is_superuser"],
+            "professor_for": frozenset(roles["professor_for"]),
+            "ta_for":        frozenset(roles["ta_for"]),
+            "student_for":   frozenset(roles["student_for"]),
+        }
+
+    return g.permissions[user_id]
+
@@ -5,7 +5,6 @@ import jwt
 from flask import has_request_context, request
 
 from anubis.env import env
-from anubis.models import User
 from anubis.utils.config import get_config_int
 
 
@@ -38,8 +37,10 @@ def create_token(netid: str, exp_kwargs=None, **extras) -> Union[str, None]:
     :return: token string or None (if user not found)
     """
 
-    # Get user
-    user: User = User.query.filter_by(netid=netid).first()
+    from anubis.utils.auth.user import get_user_principal
+
+    # Get user (from the principal cache)
+    user = get_user_principal(netid)
 
     # Get setting for number of hours that tokens should last.
     token_exp_hours = get_config_int("AUTH_TOKEN_EXP_HOURS", default=6)
@@ -55,7 +56,7 @@ def create_token(netid: str, exp_kwargs=None, **extras) -> Union[str, None]:
     # Create new token
     return jwt.encode(
         {
-            "netid": user.netid,
+            "netid": user["netid"],
             "exp": datetime.utcnow() + timedelta(**exp_kwargs),
             **extras,
         },
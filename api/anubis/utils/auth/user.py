@@ -1,16 +1,135 @@
+import threading
 import traceback
 from datetime import datetime
 from typing import Any, Callable
 
 import jwt
 from flask import g
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
 from werkzeug.local import LocalProxy
 
 from anubis.env import env
-from anubis.models import User, Course
+from anubis.models import User, Course, db
 from anubis.utils.auth.token import get_token
-from anubis.utils.data import req_assert, human_readable_timedelta
+from anubis.utils.cache import cache, cache_tag, tagged_memoize
+from anubis.utils.data import is_debug, req_assert, human_readable_timedelta
 from anubis.utils.logging import logger
+from anubis.utils.redis import redis
+
+
+# Seconds that a user principal is cached. Writes to the user row
+# (like disabling the account) invalidate the principal right away.
+PRINCIPAL_CACHE_TIMEOUT = 30
+
+# Principal cache lookups are counted in memory, and added
+# to the shared counts in redis every so many lookups.
+PRINCIPAL_STATS_KEY = "anubis-auth-principal-stats"
+PRINCIPAL_STATS_FLUSH_EVERY = 100
+
+_principal_stats = {"lookups": 0, "misses": 0}
+_principal_stats_lock = threading.Lock()
+
+
+def _record_principal_lookup():
+    """
+    Count a principal cache lookup, flushing the counts to redis
+    every PRINCIPAL_STATS_FLUSH_EVERY lookups.
+
+    :return:
+    """
+
+    # There is no shared cache in debug
+    if is_debug():
+        return
+
+    with _principal_stats_lock:
+        _principal_stats["lookups"] += 1
+        if _principal_stats["lookups"] < PRINCIPAL_STATS_FLUSH_EVERY:
+            return
+        lookups, misses = _principal_stats["lookups"], _principal_stats["misses"]
+        _principal_stats["lookups"] = _principal_stats["misses"] = 0
+
+    try:
+        with redis.pipeline(transaction=False) as pipe:
+            pipe.hincrby(PRINCIPAL_STATS_KEY, "lookups", lookups)
+            pipe.hincrby(PRINCIPAL_STATS_KEY, "misses", misses)
+            pipe.execute()
+    except Exception:
+        logger.exception("Failed to record principal cache stats")
+
+
+def get_principal_cache_stats() -> dict[str, Any]:
+    """
+    Get the hit rate of the user principal cache across all api workers.
+
+    :return:
+    """
+    stats = redis.hgetall(PRINCIPAL_STATS_KEY)
+    lookups = int(stats.get(b"lookups", 0))
+    misses = int(stats.get(b"misses", 0))
+
+    return {
+        "lookups":  lookups,
+        "hits":     lookups - misses,
+        "misses":   misses,
+        "hit_rate": round((lookups - misses) / lookups, 4) if lookups > 0 else None,
+    }
+
+
+@tagged_memoize(
+    lambda netid: [cache_tag("user", get_user_id(netid))],
+    timeout=PRINCIPAL_CACHE_TIMEOUT,
+    unless=is_debug,
+)
+def _get_cached_user_principal(netid: str) -> dict[str, Any] | None:
+    # This only runs when the principal was not in the cache
+    with _principal_stats_lock:
+        _principal_stats["misses"] += 1
+
+    user = User.query.filter_by(netid=netid).first()
+    if user is None:
+        return None
+
+    return {column.key: getattr(user, column.key) for column in inspect(User).column_attrs}
+
+
+def get_user_principal(netid: str) -> dict[str, Any] | None:
+    """
+    Get the column values of the user row for a netid. This is what
+    authenticated requests need to rebuild the current user without
+    fetching the user row.
+
+    Every call is counted as a lookup, so the misses counted by the
+    cached function give the hit rate in get_principal_cache_stats.
+
+    * This response is cached for up to 30 seconds *
+
+    :param netid:
+    :return:
+    """
+    principal = _get_cached_user_principal(netid)
+    _record_principal_lookup()
+    return principal
+
+
+def load_user_principal(netid: str) -> User | None:
+    """
+    Get the User for a netid from the principal cache. The user is merged
+    into the session without being loaded, so relationships still load
+    like normal.
+
+    :param netid:
+    :return:
+    """
+    principal = get_user_principal(netid)
+
+    if principal is None:
+        return None
+
+    user = User(**principal)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
 
 
 def get_current_user() -> User | None:
@@ -40,7 +159,7 @@ def get_current_user() -> User | None:
 
     # Get the user from the decoded jwt
     netid = decoded["netid"]
-    user = User.query.filter_by(netid=netid).first()
+    user = load_user_principal(netid)
 
     if user is not None:
         # Check if the user is disabled
@@ -55,6 +174,22 @@ def get_current_user() -> User | None:
     return user
 
 
+@cache.memoize(timeout=60 * 60, unless=is_debug, response_filter=lambda user_id: user_id is not None)
+def get_user_id(netid: str) -> str | None:
+    """
+    Get the id of the user with a netid. Ids never change for a
+    user, so this lookup can be cached for a long time. This is mostly
+    used to get the cache tags for functions that take a netid.
+
+    Missing users are not cached, as they may be created at any time.
+
+    :param netid:
+    :return:
+    """
+    user_id = User.query.filter(User.netid == netid).with_entities(User.id).scalar()
+    return user_id
+
+
 def verify_users(netids: list[str]) -> tuple[list[User], set[str]]:
     """
     Takes a list of netids, and returns a list of the users that
@@ -1,7 +1,30 @@
+import contextlib
+import functools
+import hashlib
+import inspect
+from typing import Any, Callable
+
 from flask_caching import Cache
 
+from anubis.utils.data import rand
+
 cache = Cache()
 
+# Default timeout for memoized functions that are kept
+# fresh by tag invalidation instead of short timeouts.
+TAGGED_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Prefix for the keys holding the current version of each tag
+_TAG_VERSION_PREFIX = "anubis-cache-tag-"
+
+# Tags staged on a session are bumped once the session commits
+_SESSION_TAGS_KEY = "anubis_cache_tags"
+
+# Tags to use for bulk statements instead of invalidating whole kinds
+_SESSION_BULK_TAGS_KEY = "anubis_bulk_cache_tags"
+
+_cache_invalidation_initialized = False
+
 
 @cache.memoize(timeout=1)
 def cache_health():
@@ -13,3 +36,327 @@ def cache_health():
     :return:
     """
     return None
+
+
+def cache_tag(kind: str, value: Any) -> str:
+    """
+    Get the tag string for an entity. The value can either be
+    the id of the entity, or a sqlalchemy object with an id.
+
+    >>> cache_tag('user', 'abc')
+    >>> 'user:abc'
+
+    :param kind: user, course, assignment, submission
+    :param value: id or sqlalchemy object
+    :return:
+    """
+    value = getattr(value, "id", value)
+    return f"{kind}:{value}"
+
+
+def _kind_tag(tag: str) -> str:
+    """
+    Every tag also depends on the tag for its whole kind. This
+    is bumped for bulk updates where the specific rows are not known.
+
+    :param tag:
+    :return:
+    """
+    kind, _ = tag.split(":", 1)
+    return f"{kind}:*"
+
+
+def get_tag_versions(tags: list[str]) -> tuple[str, ...]:
+    """
+    Read the current version of each tag (and its kind) in a
+    single round trip. Missing versions are initialized with a fresh
+    random version so that a tag evicted from the cache can never fall
+    back onto previously cached results.
+
+    :param tags:
+    :return:
+    """
+    keys = []
+    for tag in tags:
+        keys.append(_TAG_VERSION_PREFIX + tag)
+        keys.append(_TAG_VERSION_PREFIX + _kind_tag(tag))
+
+    versions = list(cache.get_many(*keys)) if len(keys) > 0 else []
+
+    missing = {}
+    for index, version in enumerate(versions):
+        if version is None:
+            versions[index] = missing.setdefault(keys[index], rand(16))
+    if len(missing) > 0:
+        cache.set_many(missing, timeout=0)
+
+    return tuple(versions)
+
+
+def invalidate_tags(*tags: str):
+    """
+    Invalidate all memoized results that depend on any of the
+    specified tags. The previously cached results are not deleted,
+    they simply become unreachable and expire on their own.
+
+    >>> invalidate_tags(cache_tag('assignment', assignment.id))
+
+    :param tags:
+    :return:
+    """
+    tags = set(tags)
+    if len(tags) == 0:
+        return
+    cache.set_many({_TAG_VERSION_PREFIX + tag: rand(16) for tag in tags}, timeout=0)
+
+
+def tagged_memoize(tags: Callable[..., list[str]], timeout: int = TAGGED_CACHE_TIMEOUT, **memoize_kwargs):
+    """
+    Memoize a function whose results depend on the entities returned
+    by tags. The tags callable is given the same arguments as the
+    memoized function. Writes to the models that map onto those
+    entities (see init_cache_invalidation) invalidate the results, so
+    the timeout can be much longer than a plain cache.memoize.
+
+    >>> @tagged_memoize(lambda user_id: [cache_tag('user', user_id)], unless=is_debug)
+    >>> def get_repos(user_id: str):
+    >>>     ...
+
+    :param tags: callable that returns the list of tags for a call
+    :param timeout: cache timeout
+    :param memoize_kwargs: passed along to cache.memoize
+    :return:
+    """
+    unless = memoize_kwargs.get("unless", None)
+    source_check = memoize_kwargs.pop("source_check", False)
+
+    def decorator(function):
+        signature = inspect.signature(function)
+
+        # The source is hashed once here instead of on every call
+        source_hash = hashlib.md5(inspect.getsource(function).encode()).hexdigest() if source_check else ""
+
+        def versioned(tag_versions, *args, **kwargs):
+            return function(*args, **kwargs)
+
+        # flask_caching builds the key namespace from the module and name
+        # of the function, so the inner function takes on the outer name.
+        versioned.__module__ = function.__module__
+        versioned.__name__ = function.__name__
+        versioned.__qualname__ = function.__qualname__
+        versioned = cache.memoize(timeout=timeout, **memoize_kwargs)(versioned)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            # Skip reading versions if the cache is not going to be used
+            if callable(unless) and unless():
+                return function(*args, **kwargs)
+
+            # Normalize args so that positional and keyword calls share keys
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+
+            tag_versions = (source_hash, *get_tag_versions(tags(*bound.args, **bound.kwargs)))
+            return versioned(tag_versions, *bound.args, **bound.kwargs)
+
+        wrapper.uncached = function
+        wrapper.cache_tags = tags
+        wrapper.delete_memoized = versioned.delete_memoized
+
+        return wrapper
+
+    return decorator
+
+
+@contextlib.contextmanager
+def bulk_cache_tags(*tags: str):
+    """
+    Within this block, bulk query.update() and query.delete() calls on the
+    database session will only invalidate the specified tags, instead of
+    invalidating every tag of the affected kinds.
+
+    >>> with bulk_cache_tags(cache_tag('user', user.id), cache_tag('assignment', assignment.id)):
+    >>>     Submission.query.filter(...).delete()
+
+    :param tags:
+    :return:
+    """
+    from anubis.models import db
+
+    session = db.session()
+    previous = session.info.get(_SESSION_BULK_TAGS_KEY, None)
+    session.info[_SESSION_BULK_TAGS_KEY] = set(tags) | (previous or set())
+    try:
+        yield
+    finally:
+        if previous is None:
+            session.info.pop(_SESSION_BULK_TAGS_KEY, None)
+        else:
+            session.info[_SESSION_BULK_TAGS_KEY] = previous
+
+
+def _model_tags(session, instance, model_tags: dict[type, dict[str, str]]) -> set[str]:
+    """
+    Get the tags for a sqlalchemy object that is being written. Both
+    the current and previous values of the tagged columns are used so
+    that moving a row (say changing an owner) invalidates both sides.
+
+    :param session:
+    :param instance:
+    :param model_tags:
+    :return:
+    """
+    from sqlalchemy import inspect as sa_inspect
+
+    tags = set()
+    columns = model_tags.get(type(instance), None)
+    if columns is None:
+        return tags
+
+    state = sa_inspect(instance)
+    for kind, column in columns.items():
+        history = state.attrs[column].history
+        for value in [*history.added, *history.unchanged, *history.deleted]:
+            if value is not None:
+                tags.add(cache_tag(kind, value))
+
+    return tags
+
+
+def init_cache_invalidation():
+    """
+    Register the session hooks that turn database writes into cache tag
+    invalidations. Tags are collected on flush, and only bumped after the
+    transaction commits.
+
+    Bulk inserts, query.update() and query.delete() calls do not know which
+    rows they touched. They should be given explicit cache_tags execution
+    options, or be run inside a bulk_cache_tags block. Untagged bulk
+    statements log a warning, and fall back to invalidating every tag of
+    the affected kinds. Raw text() statements can not be traced back to a
+    model at all, so they only log a warning.
+
+    * The hooks are registered on the sqlalchemy Session class, so this
+    only needs to happen once per process *
+
+    :return:
+    """
+    global _cache_invalidation_initialized
+    if _cache_invalidation_initialized:
+        return
+    _cache_invalidation_initialized = True
+
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+    from sqlalchemy.orm.util import identity_key
+    from sqlalchemy.sql.elements import TextClause
+
+    from anubis.utils.logging import logger
+
+    from anubis.models import (
+        Assignment,
+        AssignmentRepo,
+        AssignmentTest,
+        BestSubmission,
+        Course,
+        InCourse,
+        LateException,
+        ProfessorForCourse,
+        Submission,
+        SubmissionBuild,
+        SubmissionTestResult,
+        TAForCourse,
+        User,
+    )
+
+    # model -> {tag kind: column}
+    model_tags: dict[type, dict[str, str]] = {
+        User:                 {"user": "id"},
+        Course:               {"course": "id"},
+        InCourse:             {"user": "owner_id", "course": "course_id"},
+        TAForCourse:          {"user": "owner_id", "course": "course_id"},
+        ProfessorForCourse:   {"user": "owner_id", "course": "course_id"},
+        Assignment:           {"assignment": "id", "course": "course_id"},
+        AssignmentTest:       {"assignment": "assignment_id"},
+        AssignmentRepo:       {"user": "owner_id", "assignment": "assignment_id"},
+        LateException:        {"user": "owner_id", "assignment": "assignment_id"},
+        Submission:           {"submission": "id", "user": "owner_id", "assignment": "assignment_id"},
+        BestSubmission:       {"user": "owner_id", "assignment": "assignment_id", "submission": "submission_id"},
+        SubmissionBuild:      {"submission": "submission_id"},
+        SubmissionTestResult: {"submission": "submission_id"},
+    }
+
+    # table -> model, for core statements that have no mapper
+    table_models: dict[Any, type] = {model.__table__: model for model in model_tags}
+
+    # Load the previous value of tagged columns when they are set on an
+    # expired row. Otherwise moving the row only invalidates the new side.
+    for model, columns in model_tags.items():
+        for column in columns.values():
+            event.listen(getattr(model, column), "set", lambda *_: None, active_history=True)
+
+    def stage_tags(session, tags: set[str]):
+        session.info.setdefault(_SESSION_TAGS_KEY, set()).update(tags)
+
+    @event.listens_for(Session, "after_flush")
+    def _after_flush(session, _):
+        tags = set()
+        for instance in [*session.new, *session.dirty, *session.deleted]:
+            tags.update(_model_tags(session, instance, model_tags))
+
+        # Results and builds only know their submission. If the submission
+        # is already loaded, then its owner and assignment are invalidated too.
+        for tag in list(tags):
+            kind, value = tag.split(":", 1)
+            if kind != "submission":
+                continue
+            submission = session.identity_map.get(identity_key(Submission, value), None)
+            if submission is not None:
+                tags.update(_model_tags(session, submission, model_tags))
+
+        stage_tags(session, tags)
+
+    @event.listens_for(Session, "do_orm_execute")
+    def _do_orm_execute(orm_execute_state):
+        statement = orm_execute_state.statement
+        if isinstance(statement, TextClause):
+            if statement.text.lstrip().split(" ", 1)[0].upper() in ("INSERT", "UPDATE", "DELETE", "REPLACE"):
+                logger.warning(f"Raw sql statement does not invalidate any cache tags: {statement.text}")
+            return
+
+        if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+            return
+
+        # Bulk statements can specify exactly what they touched with
+        # .execution_options(cache_tags=[...]) or a bulk_cache_tags block
+        tags = orm_execute_state.execution_options.get("cache_tags", None)
+        if tags is None:
+            tags = orm_execute_state.session.info.get(_SESSION_BULK_TAGS_KEY, None)
+        if tags is not None:
+            stage_tags(orm_execute_state.session, set(tags))
+            return
+
+        # Core table statements do not have a mapper
+        mapper = orm_execute_state.bind_mapper
+        model = mapper.class_ if mapper is not None else table_models.get(getattr(statement, "table", None), None)
+        if model not in model_tags:
+            return
+
+        logger.warning(f"Bulk statement on {model.__name__} without cache_tags invalidates every "
+                       f"{', '.join(model_tags[model])} tag")
+        stage_tags(orm_execute_state.session, {f"{kind}:*" for kind in model_tags[model]})
+
+    @event.listens_for(Session, "after_commit")
+    def _after_commit(session):
+        tags = session.info.pop(_SESSION_TAGS_KEY, set())
+        if len(tags) == 0:
+            return
+        try:
+            invalidate_tags(*tags)
+        except Exception:
+            from anubis.utils.logging import logger
+            logger.exception("Failed to invalidate cache tags")
+
+    @event.listens_for(Session, "after_rollback")
+    def _after_rollback(session):
+        session.info.pop(_SESSION_TAGS_KEY, None)
@@ -295,6 +295,22 @@ def row2dict(row) -> dict:
     return raw
 
 
+_context_app = None
+
+
+def _get_context_app():
+    global _context_app
+
+    if _context_app is None:
+        # Do the import here to avoid circular
+        # import issues.
+        from anubis.app import create_job_app
+
+        _context_app = create_job_app()
+
+    return _context_app
+
+
 def with_context(function):
     """
     This decorator is meant to save time and repetitive initialization
@@ -306,17 +322,14 @@ def with_context(function):
 
     @functools.wraps(function)
     def wrapper(*args, **kwargs):
-        # Do the import here to avoid circular
-        # import issues.
-        from anubis.app import create_app
-
         # Only create an app context if
         # there is not already one
         if has_app_context() and has_request_context():
             return function(*args, **kwargs)
 
-        # Create a fresh app
-        app = create_app()
+        # Jobs only need the services, not the views. The
+        # app is built once, then reused for every call.
+        app = _get_context_app()
 
         # Push an app context
         with app.app_context():
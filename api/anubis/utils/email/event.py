@@ -1,11 +1,17 @@
+import threading
+import time
 import traceback
 import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import jinja2
-from googleapiclient.errors import Error
+from flask import current_app
 from datetime import datetime
+from sqlalchemy import insert
 from anubis.constants import EMAIL_FROM
-from anubis.utils.google.gmail import send_message
+from anubis.utils.config import get_config_bool, get_config_int
+from anubis.utils.data import is_debug
+from anubis.utils.google.gmail import get_gmail_service, send_message
 from anubis.models import db, User, EmailTemplate, EmailEvent
 from anubis.utils.email.smtp import create_message
 from anubis.utils.logging import logger
@@ -101,6 +107,10 @@ def send_email_event(
         body,
     )
 
+    # The google api client is slow to import, so it is only
+    # loaded once an email is actually being sent.
+    from googleapiclient.errors import Error
+
     # Send email
     try:
         success = send_message(message) is not False
@@ -120,3 +130,151 @@ def send_email_event(
         )
         db.session.add(event)
         db.session.commit()
+
+
+class _SendRateLimiter(object):
+    """
+    Spread calls to wait out so that they happen at most rate
+    times per second, across all the threads sharing the limiter.
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        time.sleep(slot - now)
+
+
+def send_email_events(
+    users: list[User],
+    reference_id: str,
+    reference_type: str,
+    template_key: str,
+    context: dict,
+) -> int:
+    """
+    Send the same email event to many users. This works like calling
+    send_email_event for each user, but:
+
+    - users that already got the event are found in one query
+    - the templates are compiled once
+    - emails are sent concurrently by EMAIL_SEND_WORKERS threads, at
+      no more than EMAIL_SEND_RATE emails per second
+    - the EmailEvent rows are bulk inserted in chunks as the emails are
+      sent, so an interrupted run does not resend what was already sent
+
+    Each user is added to the template context as user.
+
+    :param users:
+    :param reference_id:
+    :param reference_type:
+    :param template_key:
+    :param context:
+    :return: number of emails sent
+    """
+
+    if len(users) == 0:
+        return 0
+
+    # Get the users that have already been sent this event
+    sent_user_ids: set[str] = set(
+        owner_id
+        for owner_id, in db.session.query(EmailEvent.owner_id).filter(
+            EmailEvent.reference_id == reference_id,
+            EmailEvent.reference_type == reference_type,
+            EmailEvent.owner_id.in_([user.id for user in users]),
+        ).all()
+    )
+
+    # If event already sent, then skip
+    users = [user for user in users if user.id not in sent_user_ids]
+    if len(users) == 0:
+        logger.debug(f'Emails already sent. Skipping reference_id={reference_id} reference_type={reference_type}')
+        return 0
+
+    email_template: EmailTemplate | None = EmailTemplate.query.filter(EmailTemplate.key == template_key).first()
+    if email_template is None:
+        logger.error(f'Email template not found. Aborting sending email template_key={template_key}')
+        return 0
+
+    # Build templates
+    subject_template = jinja2.Template(email_template.subject)
+    body_template = jinja2.Template(email_template.body)
+
+    # Render templates for everyone up front
+    emails: list[tuple[str, str, str, dict[str, str]]] = []
+    for user in users:
+        subject = subject_template.render(**context, user=user)
+        body = body_template.render(**context, user=user)
+        message = create_message(
+            EMAIL_FROM,
+            user.netid + '@nyu.edu',
+            subject,
+            body,
+        )
+        emails.append((user.id, subject, body, message))
+
+    workers = get_config_int('EMAIL_SEND_WORKERS', default=4)
+    limiter = _SendRateLimiter(get_config_int('EMAIL_SEND_RATE', default=5))
+
+    # The gmail service is only needed when emails will actually
+    # be sent. Each thread builds its own, as they are not thread safe.
+    build_service = not is_debug() or get_config_bool('EMAIL_SEND_ENABLED', default=False)
+    thread_local = threading.local()
+    app = current_app._get_current_object()
+
+    def _send(message: dict[str, str]) -> bool:
+        limiter.wait()
+        with app.app_context():
+            try:
+                if build_service and getattr(thread_local, 'service', None) is None:
+                    thread_local.service = get_gmail_service()
+                return send_message(message, service=getattr(thread_local, 'service', None)) is not False
+            except Exception as e:
+                logger.error(f'Failed to send email!\nerror={e}\n\n{traceback.format_exc()}\nemail={message}')
+                return False
+
+    # Rows for sent emails that have not been recorded yet
+    rows: list[dict[str, str]] = []
+    sent = 0
+
+    def _record():
+        nonlocal sent
+        if len(rows) == 0:
+            return
+        db.session.execute(insert(EmailEvent), rows)
+        db.session.commit()
+        sent += len(rows)
+        rows.clear()
+
+    # Send email, recording the sent emails as they complete
+    chunk_size = get_config_int('EMAIL_RECORD_CHUNK_SIZE', default=50)
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='email-send') as executor:
+            futures = {executor.submit(_send, email[3]): email for email in emails}
+            for future in as_completed(futures):
+                if not future.result():
+                    continue
+
+                user_id, subject, body, _ = futures[future]
+                rows.append({
+                    'owner_id':       user_id,
+                    'template_id':    template_key,
+                    'reference_id':   reference_id,
+                    'reference_type': reference_type,
+                    'subject':        subject,
+                    'body':           body,
+                })
+                if len(rows) >= chunk_size:
+                    _record()
+    finally:
+        # Whatever was sent before a failure still gets recorded
+        _record()
+
+    return sent
@@ -1,16 +1,21 @@
 import json
 import traceback
-
-import googleapiclient.discovery
+from typing import TYPE_CHECKING
 
 from anubis.utils.data import is_debug
 from anubis.utils.logging import logger
 from anubis.utils.config import get_config_bool
-from anubis.utils.google.service import build_google_service
 from anubis.constants import GOOGLE_GMAIL_CREDS_SCOPES, GOOGLE_GMAIL_CREDS_SECRET
 
+if TYPE_CHECKING:
+    import googleapiclient.discovery
+
+
+def get_gmail_service() -> "googleapiclient.discovery.Resource":
+    # The google api client (and kubernetes) are slow to import, so
+    # they are only loaded once a service is actually built.
+    from anubis.utils.google.service import build_google_service
 
-def get_gmail_service() -> googleapiclient.discovery.Resource:
     return build_google_service(
         GOOGLE_GMAIL_CREDS_SECRET,
         'gmail',
@@ -24,6 +29,7 @@ def send_message(
     user_id="me",
     force: bool = False,
     raise_: bool = False,
+    service: "googleapiclient.discovery.Resource | None" = None,
 ):
     """Send an email message.
 
@@ -31,13 +37,13 @@ def send_message(
       message: Message to be sent.
       user_id: User's email address. The special value "me"
       can be used to indicate the authenticated user.
+      service: Gmail service to send with. Building the service
+      is slow, so it should be reused when sending many messages.
 
     Returns:
       Sent Message.
     """
 
-    service = get_gmail_service()
-
     email_send_enabled: bool = get_config_bool('EMAIL_SEND_ENABLED', default=False)
 
     logger.debug(f"SENDING EMAIL {json.dumps(message)}")
@@ -46,6 +52,9 @@ def send_message(
                     f'debug={is_debug()} email_send_enabled={email_send_enabled}')
         return
 
+    if service is None:
+        service = get_gmail_service()
+
     try:
         message = service.users().messages().send(userId=user_id, body=message).execute()
         return message
@@ -1,4 +1,4 @@
-from flask import Response, make_response
+from flask import Response, make_response, request
 
 from anubis.lms.courses import course_context
 from anubis.models import StaticFile, db
@@ -93,12 +93,22 @@ def process_file_upload(course_id: str = None) -> StaticFile:
     return blob
 
 
-def make_png_response(blob: bytes) -> Response:
+def make_png_response(blob: bytes, etag: str = None) -> Response:
+    # If the client already has this version of the
+    # image, then there is no need to send it again.
+    if etag is not None and request.if_none_match.contains(etag):
+        return Response(status=304, headers={"ETag": f'"{etag}"'})
+
     # Take the png bytes, and make a flask response
     response = make_response(blob)
 
     # set the response content type
     response.headers["Content-Type"] = "image/png"
 
+    # Have clients check back for a newer version of the image
+    if etag is not None:
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+
     # Pass back the image response
     return response
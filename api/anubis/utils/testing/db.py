@@ -13,6 +13,7 @@ from anubis.models import (
     AssignmentQuestion,
     AssignmentRepo,
     AssignmentTest,
+    BestSubmission,
     ReservedIDETime,
     Course,
     InCourse,
@@ -46,6 +47,7 @@ def clear_database():
     AssignedQuestionResponse.query.delete()
     AssignedStudentQuestion.query.delete()
     AssignmentQuestion.query.delete()
+    BestSubmission.query.delete()
     SubmissionTestResult.query.delete()
     SubmissionBuild.query.delete()
     Submission.query.delete()
@@ -0,0 +1,158 @@
+import argparse
+import json
+import os
+import pkgutil
+import statistics
+import subprocess
+import sys
+
+import anubis.jobs
+
+# Third party packages that are slow to import. Entry points
+# should only load the ones that they actually use.
+HEAVY_MODULES = [
+    "kubernetes",
+    "googleapiclient",
+    "pandas",
+    "numpy",
+    "matplotlib",
+    "plotly",
+    "discord",
+]
+
+# Standalone scripts that do not load anubis
+_SKIPPED_JOBS = {"volume_backup"}
+
+# Run in a fresh interpreter so that nothing is already imported. The
+# child reports how long the entry point took to load, and which of the
+# heavy modules it pulled in.
+_CHILD = """
+import json, sys, time
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+heavy = sorted(name for name in {heavy!r} if name in sys.modules)
+print(json.dumps({{"seconds": elapsed, "modules": len(sys.modules), "heavy": heavy}}))
+"""
+
+
+def get_entry_points() -> dict[str, str]:
+    """
+    Get the code for each entry point to time, keyed by name.
+
+    :return:
+    """
+    entry_points = {
+        "create_app":          "from anubis.app import create_app; create_app()",
+        "create_pipeline_app": "from anubis.app import create_pipeline_app; create_pipeline_app()",
+        "create_job_app":      "from anubis.app import create_job_app; create_job_app()",
+    }
+    for module in pkgutil.iter_modules(anubis.jobs.__path__):
+        if module.name in _SKIPPED_JOBS:
+            continue
+        entry_points[f"jobs.{module.name}"] = f"import anubis.jobs.{module.name}"
+    return entry_points
+
+
+def time_entry_point(code: str) -> dict:
+    env = dict(os.environ)
+    env.setdefault("MINDEBUG", "1")
+    r = subprocess.run(
+        [sys.executable, "-c", _CHILD.format(code=code, heavy=HEAVY_MODULES)],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if r.returncode != 0:
+        return {"error": r.stderr.strip().splitlines()[-1] if r.stderr.strip() else "failed"}
+    return json.loads(r.stdout.strip().splitlines()[-1])
+
+
+def run_timings(names: list[str] = None, runs: int = 3) -> dict[str, dict]:
+    """
+    Time the cold start of each entry point. Each is run several times,
+    and the median time is kept.
+
+    :param names: entry points to time (all by default)
+    :param runs:
+    :return:
+    """
+    entry_points = get_entry_points()
+    if names:
+        entry_points = {name: entry_points[name] for name in names}
+
+    results = {}
+    for name, code in entry_points.items():
+        timings = [time_entry_point(code) for _ in range(runs)]
+        errors = [timing["error"] for timing in timings if "error" in timing]
+        if len(errors) > 0:
+            results[name] = {"error": errors[0]}
+            continue
+
+        results[name] = {
+            "seconds": round(statistics.median(timing["seconds"] for timing in timings), 3),
+            "modules": timings[0]["modules"],
+            "heavy":   timings[0]["heavy"],
+        }
+
+    return results
+
+
+def compare_timings(results: dict[str, dict], baseline: dict[str, dict], tolerance: float) -> list[str]:
+    """
+    Get the entry points that got slower than the baseline by more
+    than tolerance (a fraction), or that picked up heavy modules.
+
+    :param results:
+    :param baseline:
+    :param tolerance:
+    :return:
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline or "error" in result or "error" in baseline[name]:
+            continue
+
+        before = baseline[name]
+        if result["seconds"] > before["seconds"] * (1 + tolerance):
+            regressions.append(f"{name} {before['seconds']:.3f}s -> {result['seconds']:.3f}s")
+        added = sorted(set(result["heavy"]).difference(before["heavy"]))
+        if len(added) > 0:
+            regressions.append(f"{name} now imports {', '.join(added)}")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the cold start of the anubis apps and jobs")
+    parser.add_argument("names", nargs="*", help="entry points to time (default all)")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--save", help="write the results to this json file")
+    parser.add_argument("--baseline", help="compare against results saved with --save")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = run_timings(args.names, runs=args.runs)
+
+    for name, result in results.items():
+        if "error" in result:
+            print(f"{name:<36} ERROR {result['error']}")
+            continue
+        print(f"{name:<36} {result['seconds']:>7.3f}s {result['modules']:>6} modules  {' '.join(result['heavy'])}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_timings(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if len(regressions) > 0:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
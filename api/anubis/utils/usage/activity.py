@@ -0,0 +1,175 @@
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.orm import undefer
+
+from anubis.models import Assignment, DailyActivity, Submission, TheiaSession, User, db
+from anubis.utils.logging import logger
+
+# Number of days kept rolled up by the visuals job. Plots
+# can not reach further back than this.
+DAILY_ACTIVITY_DAYS = 365
+
+
+def _get_day(value: date | datetime | str) -> datetime:
+    # date() comes back as a string from sqlite, and a date from mysql
+    if isinstance(value, str):
+        return datetime.strptime(value[:10], "%Y-%m-%d")
+    return datetime(value.year, value.month, value.day)
+
+
+def _get_rollup_start(first_day: datetime, today: datetime) -> datetime:
+    """
+    Find the first day that needs to be rolled up. That is the first
+    missing day, or the last day that was rolled up (it may have been
+    rolled up before the day was over).
+
+    :param first_day:
+    :param today:
+    :return:
+    """
+    rolled_up: set[datetime] = {
+        _get_day(day)
+        for day, in db.session.query(DailyActivity.day).filter(
+            DailyActivity.course_id == None,
+            DailyActivity.day >= first_day,
+        ).all()
+    }
+
+    days = [first_day + timedelta(days=n) for n in range((today - first_day).days + 1)]
+    redo = [day for day in days if day not in rolled_up]
+    if len(rolled_up) > 0:
+        redo.append(max(rolled_up))
+
+    return min(redo)
+
+
+def update_daily_activity(days: int = DAILY_ACTIVITY_DAYS) -> int:
+    """
+    Roll up the daily activity for the last number of days. Only the days
+    that have not been rolled up yet (and the last one that was) are
+    recalculated, so this is cheap to run on every visuals job.
+
+    :param days:
+    :return: number of days rolled up
+    """
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = _get_rollup_start(today - timedelta(days=days - 1), today)
+
+    # (day, course_id) -> {owner_id: count}
+    submissions: dict[tuple[datetime, str | None], dict[str, int]] = {}
+    theia_sessions: dict[tuple[datetime, str | None], dict[str, int]] = {}
+
+    # Submission activity by day, course and owner
+    submission_day = func.date(Submission.created)
+    for day, course_id, owner_id, count in (
+        db.session.query(submission_day, Assignment.course_id, Submission.owner_id, func.count(Submission.id))
+        .join(Assignment, Assignment.id == Submission.assignment_id)
+        .filter(Submission.created >= start, Submission.owner_id != None)
+        .group_by(submission_day, Assignment.course_id, Submission.owner_id)
+        .all()
+    ):
+        day = _get_day(day)
+        for key in [(day, None), (day, course_id)]:
+            owners = submissions.setdefault(key, {})
+            owners[owner_id] = owners.get(owner_id, 0) + count
+
+    # IDE activity by day, course and owner. Playground sessions
+    # have no course, so they only count towards the platform.
+    theia_day = func.date(TheiaSession.created)
+    for day, course_id, owner_id, count in (
+        db.session.query(theia_day, TheiaSession.course_id, TheiaSession.owner_id, func.count(TheiaSession.id))
+        .filter(TheiaSession.created >= start, TheiaSession.owner_id != None)
+        .group_by(theia_day, TheiaSession.course_id, TheiaSession.owner_id)
+        .all()
+    ):
+        day = _get_day(day)
+        keys = [(day, None)] if course_id is None else [(day, None), (day, course_id)]
+        for key in keys:
+            owners = theia_sessions.setdefault(key, {})
+            owners[owner_id] = owners.get(owner_id, 0) + count
+
+    # Registrations by day
+    user_day = func.date(User.created)
+    new_users: dict[datetime, int] = {
+        _get_day(day): count
+        for day, count in db.session.query(user_day, func.count(User.id))
+        .filter(User.created >= start)
+        .group_by(user_day)
+        .all()
+    }
+    # Users registered before the first day being rolled up
+    total_users: int = User.query.filter(User.created < start).count()
+
+    # Replace the rows for the days being rolled up
+    DailyActivity.query.filter(DailyActivity.day >= start).delete(synchronize_session=False)
+
+    # Every day gets a platform row. Courses only get
+    # a row on the days that they had activity.
+    course_ids: dict[datetime, set[str]] = {}
+    for day, course_id in set(submissions.keys()).union(theia_sessions.keys()):
+        if course_id is not None:
+            course_ids.setdefault(day, set()).add(course_id)
+
+    rows = []
+    n_days = (today - start).days + 1
+    for n in range(n_days):
+        day = start + timedelta(days=n)
+
+        for course_id in [None, *sorted(course_ids.get(day, set()))]:
+            submission_owners = submissions.get((day, course_id), {})
+            theia_owners = theia_sessions.get((day, course_id), {})
+            rows.append(DailyActivity(
+                day=day,
+                course_id=course_id,
+                submission_users=len(submission_owners),
+                theia_users=len(theia_owners),
+                active_users=len(set(submission_owners).union(theia_owners)),
+                submissions=sum(submission_owners.values()),
+                theia_sessions=sum(theia_owners.values()),
+                new_users=new_users.get(day, 0) if course_id is None else 0,
+                total_users=total_users if course_id is None else 0,
+                submission_user_ids=sorted(submission_owners),
+                theia_user_ids=sorted(theia_owners),
+            ))
+
+        # The users registered on this day count from the next day on
+        total_users += new_users.get(day, 0)
+
+    db.session.add_all(rows)
+    db.session.commit()
+
+    logger.info(f"Rolled up daily activity for {n_days} days from {start.date()}")
+    return n_days
+
+
+def get_daily_activity(
+    start: datetime,
+    end: datetime,
+    course_id: str = None,
+    user_ids: bool = False,
+) -> list[DailyActivity]:
+    """
+    Get the rolled up activity for each day from start to end (inclusive),
+    platform wide or for a course. The active user ids are only loaded if
+    asked for, as they are only needed for distinct users across days.
+
+    :param start:
+    :param end:
+    :param course_id:
+    :param user_ids:
+    :return:
+    """
+    query = DailyActivity.query.filter(
+        DailyActivity.course_id == course_id,
+        DailyActivity.day >= start,
+        DailyActivity.day <= end,
+    ).order_by(DailyActivity.day)
+
+    if user_ids:
+        query = query.options(
+            undefer(DailyActivity.submission_user_ids),
+            undefer(DailyActivity.theia_user_ids),
+        )
+
+    return query.all()
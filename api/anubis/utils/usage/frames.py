@@ -0,0 +1,32 @@
+import itertools
+from typing import Iterator
+
+import pandas as pd
+from sqlalchemy.orm import Query
+
+# Number of rows to load from the database at a time
+USAGE_CHUNK_SIZE = 10000
+
+
+def iter_query_frames(query: Query, columns: list[str], chunk_size: int = USAGE_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Stream the rows of a column query as dataframes of up to chunk_size
+    rows. The query should only select the columns that are needed, so
+    that no orm objects are built.
+
+    :param query:
+    :param columns: names of the selected columns
+    :param chunk_size:
+    :return:
+    """
+    rows = iter(query.execution_options(stream_results=True).yield_per(chunk_size))
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if len(chunk) == 0:
+            return
+        yield pd.DataFrame.from_records(chunk, columns=columns)
+
+
+def round_hours(column: pd.Series) -> pd.Series:
+    # Round timestamps to the nearest hour
+    return pd.to_datetime(column).dt.round("h")
@@ -2,8 +2,22 @@ from typing import Any
 
 import pandas as pd
 
-from anubis.models import Submission, Assignment
+from anubis.models import Submission, Assignment, db
 from anubis.utils.cache import cache
+from anubis.utils.usage.frames import iter_query_frames, round_hours
+
+
+def _get_submissions_query(course_id: str, columns: list[str]):
+    # Select only the columns asked for from
+    # submissions to visible assignments
+    return (
+        db.session.query(*[getattr(Submission, column) for column in columns])
+        .join(Assignment, Assignment.id == Submission.assignment_id)
+        .filter(
+            Assignment.hidden == False,
+            Assignment.course_id == course_id,
+        )
+    )
 
 
 def get_submissions(course_id: str) -> pd.DataFrame:
@@ -12,34 +26,42 @@ def get_submissions(course_id: str) -> pd.DataFrame:
 
     :return:
     """
-    # Get the submission sqlalchemy objects
-    raw_submissions = (
-        Submission.query.join(Assignment)
-            .filter(
-            Assignment.hidden == False,
-            Assignment.course_id == course_id,
-        )
-            .all()
-    )
-
     # Specify which columns we want
     columns = ["id", "owner_id", "assignment_id", "processed", "created"]
 
-    # Build a dataframe of from the columns we pull out of each submission object
-    submissions = pd.DataFrame(
-        data=list(
-            map(
-                lambda x: ({column: getattr(x, column) for column in columns}),
-                raw_submissions,
-            )
-        ),
-        columns=columns,
-    )
+    # Build the dataframe a chunk at a time, rounding
+    # the submission timestamps to the nearest hour
+    frames = []
+    for frame in iter_query_frames(_get_submissions_query(course_id, columns), columns):
+        frame["created"] = round_hours(frame["created"])
+        frames.append(frame)
+
+    if len(frames) == 0:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
+
+
+def get_submission_counts(course_id: str) -> pd.DataFrame:
+    """
+    Count the submissions to each visible assignment in each hour. The
+    counts are added up a chunk at a time, so only the counts are ever
+    held in memory.
+
+    columns = ["assignment_id", "created", "count"]
+
+    :param course_id:
+    :return:
+    """
+    columns = ["assignment_id", "created"]
 
-    # Round the submission timestamps to the nearest hour
-    submissions["created"] = submissions["created"].apply(lambda date: pd.to_datetime(date).round("H"))
+    counts = []
+    for frame in iter_query_frames(_get_submissions_query(course_id, columns), columns):
+        frame["created"] = round_hours(frame["created"])
+        counts.append(frame.groupby(columns).size())
 
-    return submissions
+    if len(counts) == 0:
+        return pd.DataFrame(columns=[*columns, "count"])
+    return pd.concat(counts).groupby(level=[0, 1]).sum().reset_index(name="count")
 
 
 @cache.memoize(timeout=360)
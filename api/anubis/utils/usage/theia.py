@@ -2,15 +2,20 @@ import numpy as np
 import pandas as pd
 from datetime import datetime
 
-from anubis.models import TheiaSession, Assignment
+from anubis.models import TheiaSession, Assignment, db
+from anubis.utils.usage.frames import iter_query_frames, round_hours
 
 
-def get_theia_sessions(course_id: str = None, start: datetime = None) -> pd.DataFrame:
+def _get_theia_session_frame(columns: list[str], course_id: str = None, start: datetime = None) -> pd.DataFrame:
     """
-    Get all theia session objects, and throw them into a dataframe
-
-    When ``course_id`` is None will return playground sessions.
+    Load only the columns asked for from the theia sessions for a course
+    (or playground sessions when course_id is None). The timestamps are
+    rounded to the nearest hour, and sessions with outlier durations are
+    dropped.
 
+    :param columns:
+    :param course_id:
+    :param start:
     :return:
     """
 
@@ -19,46 +24,33 @@ def get_theia_sessions(course_id: str = None, start: datetime = None) -> pd.Data
     if start is not None:
         filters.append(TheiaSession.created >= start)
 
-    # Get all the theia session sqlalchemy objects
+    # The duration needs the start and end times
+    selected = list(dict.fromkeys([*columns, "created", "ended"]))
+    query = db.session.query(*[getattr(TheiaSession, column) for column in selected])
     if course_id is not None:
-        raw_theia_sessions = TheiaSession.query.join(Assignment).filter(
+        query = query.join(Assignment, Assignment.id == TheiaSession.assignment_id).filter(
             Assignment.course_id == course_id,
             *filters,
-        ).all()
+        )
     else:
-        raw_theia_sessions = TheiaSession.query.filter(
+        query = query.filter(
             TheiaSession.playground == True,
             *filters,
-        ).all()
+        )
 
-    # Specify which columns we want
-    columns = ["id", "owner_id", "assignment_id", "image_id", "created", "ended"]
+    frames = []
+    for frame in iter_query_frames(query, selected):
+        # Round the timestamps to the nearest hour
+        frame["created"] = round_hours(frame["created"])
+        frame["ended"] = round_hours(frame["ended"])
 
-    # Build a dataframe of from the columns we pull out of each theia session object
-    theia_sessions = pd.DataFrame(
-        data=list(
-            map(
-                lambda x: ({column: getattr(x, column) for column in columns}),
-                raw_theia_sessions,
-            )
-        ),
-        columns=columns,
-    )
-
-    # Round the timestamps to the nearest hour
-    theia_sessions["created"] = theia_sessions["created"].apply(lambda date: pd.to_datetime(date).round("H"))
-    theia_sessions["ended"] = theia_sessions["ended"].apply(lambda date: pd.to_datetime(date).round("H"))
-
-    # Add a duration column
-    if len(theia_sessions) > 0:
         # Get the duration from subtracting the end from the start time, and converting to minutes
-        theia_sessions["duration"] = theia_sessions[["ended", "created"]].apply(
-            lambda row: (row[0] - row[1]).seconds / 60, axis=1
-        )
+        frame["duration"] = (frame["ended"] - frame["created"]).dt.seconds / 60
+        frames.append(frame)
 
-    # The apply breaks if there are no rows, so make it empty in that case
-    else:
-        theia_sessions["duration"] = []
+    if len(frames) == 0:
+        return pd.DataFrame(columns=[*selected, "duration"])
+    theia_sessions = pd.concat(frames, ignore_index=True)
 
     # Drop outliers based on duration
     theia_sessions = theia_sessions[
@@ -66,3 +58,36 @@ def get_theia_sessions(course_id: str = None, start: datetime = None) -> pd.Data
         ]
 
     return theia_sessions
+
+
+def get_theia_sessions(course_id: str = None, start: datetime = None) -> pd.DataFrame:
+    """
+    Get all theia session objects, and throw them into a dataframe
+
+    When ``course_id`` is None will return playground sessions.
+
+    :return:
+    """
+
+    # Specify which columns we want
+    columns = ["id", "owner_id", "assignment_id", "image_id", "created", "ended"]
+
+    return _get_theia_session_frame(columns, course_id, start)
+
+
+def get_theia_session_counts(by: str, course_id: str = None, start: datetime = None) -> pd.DataFrame:
+    """
+    Count the theia sessions started in each hour, grouped by a column
+    (like assignment_id or image_id).
+
+    When ``course_id`` is None will count playground sessions.
+
+    columns = [by, "created", "count"]
+
+    :param by:
+    :param course_id:
+    :param start:
+    :return:
+    """
+    theia_sessions = _get_theia_session_frame([by], course_id, start)
+    return theia_sessions.groupby([by, "created"]).size().reset_index(name="count")
@@ -2,19 +2,23 @@ from typing import Any
 
 import numpy as np
 import pandas as pd
+from sqlalchemy import and_, case, func
 
 from anubis.lms.autograde import bulk_autograde
 from anubis.lms.submissions import get_submission_tests
-from anubis.models import Assignment, AssignmentTest, Submission, TheiaSession, User, db
+from anubis.models import (
+    Assignment,
+    AssignmentTest,
+    InCourse,
+    Submission,
+    SubmissionTestResult,
+    TheiaSession,
+    User,
+    db,
+)
 from anubis.utils.cache import cache
 from anubis.utils.data import is_debug, is_job
 from anubis.utils.logging import verbose_call
-from anubis.utils.visuals.queries import (
-    assignment_test_fail_count_sql,
-    assignment_test_fail_nosub_sql,
-    assignment_test_pass_count_sql,
-    time_to_pass_test_sql,
-)
 
 
 @cache.memoize(timeout=60, unless=is_debug)
@@ -24,6 +28,9 @@ def get_admin_assignment_visual_data(assignment_id: str) -> list[dict[str, Any]]
     Get the admin visual data for an assignment. Visual data is generated
     for each assignment test that is part of the assignment.
 
+    The data for all the tests is loaded with two grouped queries over the
+    whole assignment, then split up by test.
+
     :param assignment_id:
     :return:
     """
@@ -31,54 +38,128 @@ def get_admin_assignment_visual_data(assignment_id: str) -> list[dict[str, Any]]
     # Get all the assignment tests for the specified assignment
     assignment_tests = AssignmentTest.query.filter(AssignmentTest.assignment_id == assignment_id).all()
 
+    # Load the per student and per test results for the whole assignment
+    students_df = get_assignment_student_frame(assignment_id)
+    results_df = get_assignment_test_result_frame(assignment_id, students_df)
+
+    # Students in the course that have not submitted anything
+    nosub_count = int(students_df.first_sub.isna().sum())
+
+    # Split the results up by test
+    test_results = dict(tuple(results_df.groupby("assignment_test_id")))
+    empty_results = results_df.iloc[0:0]
+
     # Build a list of visual data for each assignment test
     response = []
     for assignment_test in assignment_tests:
+        test_df = test_results.get(assignment_test.id, empty_results)
         response.append(
             {
                 "title":             assignment_test.name,
-                "pass_time_scatter": get_assignment_tests_pass_times(assignment_test),
-                "pass_count_radial": get_assignment_tests_pass_counts(assignment_test),
+                "pass_time_scatter": get_assignment_tests_pass_times(test_df),
+                "pass_count_radial": get_assignment_tests_pass_counts(test_df, nosub_count),
             }
         )
 
     return response
 
 
-def get_assignment_tests_pass_times(assignment_test: AssignmentTest):
+def get_assignment_student_frame(assignment_id: str) -> pd.DataFrame:
     """
-    Calculate the amount of time it took each student in the class
-    to get their test to pass. This is measured as the time between
-    their first submission for the assignment and the first submission
-    that passed the specific test.
+    Get a dataframe of the students in the course of an assignment, along
+    with the time of their first submission for the assignment (NaT if they
+    have not submitted).
 
-    :param assignment_test:
-    :return:
+    :param assignment_id:
+    :return: dataframe with columns owner_id, first_sub
     """
 
-    # Run the very long query to generate the list of netids and timedetlas
-    result = db.session.execute(
-        time_to_pass_test_sql,
-        {
-            "assignment_id":      assignment_test.assignment_id,
-            "assignment_test_id": assignment_test.id,
-        },
+    query = (
+        db.session.query(
+            InCourse.owner_id,
+            func.min(Submission.created).label("first_sub"),
+        )
+        .join(Assignment, Assignment.course_id == InCourse.course_id)
+        .outerjoin(
+            Submission,
+            and_(
+                Submission.owner_id == InCourse.owner_id,
+                Submission.assignment_id == Assignment.id,
+            ),
+        )
+        .filter(Assignment.id == assignment_id)
+        .group_by(InCourse.owner_id)
     )
 
-    # Build a dataframe of the durations, converted to hours
-    df = pd.DataFrame(
-        data=[x[2].total_seconds() // 3600 for x in result.fetchall()],
-        columns=["duration"],
+    df = pd.DataFrame(query.all(), columns=["owner_id", "first_sub"])
+    df["first_sub"] = pd.to_datetime(df.first_sub)
+    return df
+
+
+def get_assignment_test_result_frame(assignment_id: str, students_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Get a dataframe with a row for each student and assignment test that
+    the student has results for. Each row has if the student ever passed
+    the test, and how long (in hours) it took them to pass it. This is
+    measured as the time between their first submission for the assignment
+    and the first submission that passed the specific test.
+
+    :param assignment_id:
+    :param students_df: dataframe from get_assignment_student_frame
+    :return: dataframe with columns owner_id, assignment_test_id, passed, duration
+    """
+
+    passed = case((SubmissionTestResult.passed == True, 1), else_=0)
+    query = (
+        db.session.query(
+            Submission.owner_id,
+            SubmissionTestResult.assignment_test_id,
+            func.max(passed).label("passed"),
+            func.min(case((SubmissionTestResult.passed == True, Submission.created), else_=None)).label("first_pass"),
+        )
+        .join(Submission, Submission.id == SubmissionTestResult.submission_id)
+        .join(Assignment, Assignment.id == Submission.assignment_id)
+        .join(
+            InCourse,
+            and_(
+                InCourse.owner_id == Submission.owner_id,
+                InCourse.course_id == Assignment.course_id,
+            ),
+        )
+        .filter(Submission.assignment_id == assignment_id)
+        .group_by(Submission.owner_id, SubmissionTestResult.assignment_test_id)
     )
 
+    df = pd.DataFrame(query.all(), columns=["owner_id", "assignment_test_id", "passed", "first_pass"])
+    df["passed"] = df.passed.astype(bool)
+    df["first_pass"] = pd.to_datetime(df.first_pass)
+
+    # Time to pass each test, in hours
+    df = df.merge(students_df, on="owner_id", how="left")
+    df["duration"] = (df.first_pass - df.first_sub).dt.total_seconds() // 3600
+
+    return df[["owner_id", "assignment_test_id", "passed", "duration"]]
+
+
+def get_assignment_tests_pass_times(test_df: pd.DataFrame):
+    """
+    Calculate the amount of time it took each student in the class
+    to get their test to pass.
+
+    :param test_df: rows of get_assignment_test_result_frame for the test
+    :return:
+    """
+
+    duration = test_df.duration.dropna()
+
     # Drop outlier values (> 3 sigma)
-    df = df[np.abs(df.duration - df.duration.mean()) <= (3 * df.duration.std())].value_counts().to_dict()
+    duration = duration[np.abs(duration - duration.mean()) <= (3 * duration.std())].value_counts()
 
     # Return the x and y plot data for the scatter visual
-    return [{"x": np.abs(x[0]), "y": y, "size": 3} for x, y in df.items()]
+    return [{"x": float(np.abs(x)), "y": int(y), "size": 3} for x, y in duration.items()]
 
 
-def get_assignment_tests_pass_counts(assignment_test: AssignmentTest):
+def get_assignment_tests_pass_counts(test_df: pd.DataFrame, nosub_count: int):
     """
     Get the number of students that had:
     - no submission
@@ -89,42 +170,13 @@ def get_assignment_tests_pass_counts(assignment_test: AssignmentTest):
     The data from this function is turned into the pass counts
     radial donut on the autograde page.
 
-    :param assignment_test:
+    :param test_df: rows of get_assignment_test_result_frame for the test
+    :param nosub_count: number of students with no submission
     :return:
     """
 
-    # Run a query to find the number of students with no submission
-    result = db.session.execute(
-        assignment_test_fail_nosub_sql,
-        {
-            "assignment_id":      assignment_test.assignment_id,
-            "assignment_test_id": assignment_test.id,
-        },
-    )
-    n = result.fetchone()[0]
-    nosub_count = int(n if n is not None else 0)
-
-    # Run a query to find the number of students that failed the test
-    result = db.session.execute(
-        assignment_test_fail_count_sql,
-        {
-            "assignment_id":      assignment_test.assignment_id,
-            "assignment_test_id": assignment_test.id,
-        },
-    )
-    n = result.fetchone()[0]
-    fail_count = int(n if n is not None else 0)
-
-    # Run a query to find the number of students that passed the test
-    result = db.session.execute(
-        assignment_test_pass_count_sql,
-        {
-            "assignment_id":      assignment_test.assignment_id,
-            "assignment_test_id": assignment_test.id,
-        },
-    )
-    n = result.fetchone()[0]
-    pass_count = int(n if n is not None else 0)
+    pass_count = int(test_df.passed.sum())
+    fail_count = len(test_df) - pass_count
 
     # Format the response to fit what the frontend is expecting
     return [
@@ -0,0 +1,227 @@
+import hashlib
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable
+
+from redis.exceptions import RedisError
+from sqlalchemy import func
+
+from anubis.models import Assignment, DailyActivity, Submission, TheiaImage, TheiaSession, db
+from anubis.utils.config import get_config_int
+from anubis.utils.data import with_context
+from anubis.utils.logging import logger
+from anubis.utils.redis import redis
+from anubis.utils.visuals.usage import get_usage_plot, get_usage_plot_active, get_usage_plot_playgrounds
+from anubis.utils.visuals.users import get_platform_users_plot
+
+# Bump this when the plots change, so that every plot is rendered again
+PLOT_VERSION = 1
+
+# Rendered plots are kept (as a hash of png, etag and fingerprint)
+# until they are replaced. The prefix is followed by kind and params.
+_PLOT_PREFIX = "anubis-plot-"
+
+# kind -> function that renders the png for the params
+PLOT_RENDERERS: dict[str, Callable[..., bytes | None]] = {
+    "usage":       get_usage_plot,
+    "playgrounds": get_usage_plot_playgrounds,
+    "active":      get_usage_plot_active,
+    "users":       get_platform_users_plot,
+}
+
+
+def _get_activity_version(days: int, **_) -> list:
+    now = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return [
+        list(row)
+        for row in db.session.query(
+            DailyActivity.day,
+            DailyActivity.submission_users,
+            DailyActivity.theia_users,
+            DailyActivity.active_users,
+            DailyActivity.total_users,
+        ).filter(
+            DailyActivity.course_id == None,
+            DailyActivity.day >= now - timedelta(days=days - 1),
+        ).order_by(DailyActivity.day).all()
+    ]
+
+
+def _get_usage_version(course_id: str) -> list:
+    assignments = db.session.query(
+        Assignment.id, Assignment.name, Assignment.release_date, Assignment.due_date,
+    ).filter(
+        Assignment.hidden == False,
+        Assignment.release_date <= datetime.now(),
+        Assignment.course_id == course_id,
+    ).order_by(Assignment.id).all()
+    submissions = db.session.query(
+        func.count(Submission.id), func.max(Submission.created),
+    ).join(Assignment, Assignment.id == Submission.assignment_id).filter(
+        Assignment.hidden == False,
+        Assignment.course_id == course_id,
+    ).first()
+    theia_sessions = db.session.query(
+        func.count(TheiaSession.id), func.max(TheiaSession.created), func.max(TheiaSession.ended),
+    ).join(Assignment, Assignment.id == TheiaSession.assignment_id).filter(
+        Assignment.course_id == course_id,
+    ).first()
+    return [[list(row) for row in assignments], list(submissions), list(theia_sessions)]
+
+
+def _get_playgrounds_version(start: datetime = None) -> list:
+    images = db.session.query(TheiaImage.id, TheiaImage.title).filter(
+        TheiaImage.public == True,
+    ).order_by(TheiaImage.id).all()
+    filters = [] if start is None else [TheiaSession.created >= start]
+    theia_sessions = db.session.query(
+        func.count(TheiaSession.id), func.max(TheiaSession.created), func.max(TheiaSession.ended),
+    ).filter(TheiaSession.playground == True, *filters).first()
+    return [[list(row) for row in images], list(theia_sessions)]
+
+
+# kind -> function that gets the data a plot is rendered from. This
+# should be much cheaper than rendering (counts and last updated times,
+# or the pre-aggregated rows).
+_PLOT_VERSIONS: dict[str, Callable[..., list]] = {
+    "usage":       _get_usage_version,
+    "playgrounds": _get_playgrounds_version,
+    "active":      _get_activity_version,
+    "users":       _get_activity_version,
+}
+
+
+def _get_plot_key(kind: str, params: dict[str, Any]) -> str:
+    return _PLOT_PREFIX + kind + "-" + json.dumps(params, sort_keys=True, default=str)
+
+
+def get_plot_fingerprint(kind: str, params: dict[str, Any]) -> str:
+    """
+    Get a hash of everything that a plot is rendered from. If the
+    fingerprint has not changed, then the plot does not need to be
+    rendered again.
+
+    :param kind:
+    :param params:
+    :return:
+    """
+    version = [PLOT_VERSION, kind, params, _PLOT_VERSIONS[kind](**params)]
+    return hashlib.sha256(json.dumps(version, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def get_stored_plot(kind: str, params: dict[str, Any]) -> dict[str, Any] | None:
+    """
+    Get a rendered plot from the store.
+
+    response = {
+      "png": b"...",
+      "etag": "...",
+      "fingerprint": "...",
+    }
+
+    :param kind:
+    :param params:
+    :return:
+    """
+    try:
+        stored = redis.hgetall(_get_plot_key(kind, params))
+    except RedisError as e:
+        logger.warning(f"Unable to get stored plot {e}")
+        return None
+
+    if b"png" not in stored:
+        return None
+
+    return {
+        "png":         stored[b"png"],
+        "etag":        stored[b"etag"].decode(),
+        "fingerprint": stored[b"fingerprint"].decode(),
+    }
+
+
+def _store_plot(kind: str, params: dict[str, Any], png: bytes, fingerprint: str) -> dict[str, Any]:
+    plot = {
+        "png":         png,
+        "etag":        hashlib.sha256(png).hexdigest(),
+        "fingerprint": fingerprint,
+    }
+    try:
+        redis.hset(_get_plot_key(kind, params), mapping=plot)
+    except RedisError as e:
+        logger.warning(f"Unable to store plot {e}")
+    return plot
+
+
+def get_plot(kind: str, **params) -> dict[str, Any] | None:
+    """
+    Get a rendered plot. Plots are kept up to date by the visuals job,
+    so this only renders the plot if it has never been rendered.
+
+    >>> get_plot("active", days=14, step=1)
+
+    :param kind: usage, playgrounds, active or users
+    :param params: params for the plot renderer
+    :return: {png, etag, fingerprint} or None if there is no plot
+    """
+    plot = get_stored_plot(kind, params)
+    if plot is not None:
+        return plot
+
+    fingerprint = get_plot_fingerprint(kind, params)
+    png = PLOT_RENDERERS[kind](**params)
+    if png is None:
+        return None
+
+    return _store_plot(kind, params, png, fingerprint)
+
+
+@with_context
+def _render_plot(kind: str, params: dict[str, Any]) -> bytes | None:
+    # Runs in the render pool processes
+    return PLOT_RENDERERS[kind](**params)
+
+
+def refresh_plots(plots: list[tuple[str, dict[str, Any]]], workers: int = None) -> int:
+    """
+    Render the plots that have changed since they were last rendered.
+    Plots whose fingerprint matches the stored plot are skipped. The
+    rest are rendered in a pool of VISUALS_RENDER_WORKERS processes,
+    as matplotlib is neither fast nor thread safe.
+
+    :param plots: list of (kind, params)
+    :param workers:
+    :return: number of plots rendered
+    """
+    stale = []
+    for kind, params in plots:
+        fingerprint = get_plot_fingerprint(kind, params)
+        stored = get_stored_plot(kind, params)
+        if stored is not None and stored["fingerprint"] == fingerprint:
+            continue
+        stale.append((kind, params, fingerprint))
+
+    logger.info(f"Rendering {len(stale)} of {len(plots)} plots")
+    if len(stale) == 0:
+        return 0
+
+    if workers is None:
+        workers = get_config_int("VISUALS_RENDER_WORKERS", default=4)
+    workers = min(workers, len(stale))
+
+    kinds = [kind for kind, _, _ in stale]
+    params_list = [params for _, params, _ in stale]
+    if workers <= 1:
+        pngs = list(map(_render_plot, kinds, params_list))
+    else:
+        # The workers are spawned rather than forked so that they
+        # do not share the database connections of this process.
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            pngs = list(executor.map(_render_plot, kinds, params_list))
+
+    for (kind, params, fingerprint), png in zip(stale, pngs):
+        if png is not None:
+            _store_plot(kind, params, png, fingerprint)
+
+    return len(stale)
@@ -2,18 +2,15 @@ import itertools
 from datetime import datetime, timedelta
 
 from anubis.models import Assignment, Course, TheiaImage
-from anubis.utils.cache import cache
-from anubis.utils.data import is_debug, is_job
 from anubis.utils.logging import logger
 from anubis.utils.logging import verbose_call
-from anubis.utils.usage.submissions import get_submissions
-from anubis.utils.usage.theia import get_theia_sessions
-from anubis.utils.usage.users import get_active_submission_users, get_active_theia_users
+from anubis.utils.usage.activity import get_daily_activity
+from anubis.utils.usage.submissions import get_submission_counts
+from anubis.utils.usage.theia import get_theia_session_counts
 from anubis.utils.visuals.files import convert_fig_bytes
 from anubis.utils.visuals.watermark import add_watermark
 
 
-@cache.memoize(timeout=-1, forced_update=is_job, unless=is_debug)
 @verbose_call()
 def get_usage_plot(course_id: str) -> bytes | None:
     import matplotlib.colors as mcolors
@@ -31,20 +28,14 @@ def get_usage_plot(course_id: str) -> bytes | None:
         Assignment.release_date <= datetime.now(),
         Assignment.course_id == course_id,
     ).order_by(Assignment.release_date.desc()).all()
-    submissions = get_submissions(course_id)
-    theia_sessions = get_theia_sessions(course_id)
 
     fig, axs = plt.subplots(2, 1, figsize=(12, 10))
 
     # submissions over hour line
-    ss = submissions.groupby(["assignment_id", "created"])["id"].count().reset_index().rename(
-        columns={"id": "count"}
-    ).groupby("assignment_id")
+    ss = get_submission_counts(course_id).groupby("assignment_id")
 
     # ides over hour line
-    tt = theia_sessions.groupby(["assignment_id", "created"])["id"].count().reset_index().rename(
-        columns={"id": "count"}
-    ).groupby("assignment_id")
+    tt = get_theia_session_counts("assignment_id", course_id).groupby("assignment_id")
 
     assignment_colors = {
         assignment.id: color
@@ -104,7 +95,6 @@ def get_usage_plot(course_id: str) -> bytes | None:
     return convert_fig_bytes(plt, fig)
 
 
-@cache.memoize(timeout=-1, forced_update=is_job, unless=is_debug)
 @verbose_call()
 def get_usage_plot_playgrounds(start: datetime = None):
     import matplotlib.pyplot as plt
@@ -117,13 +107,8 @@ def get_usage_plot_playgrounds(start: datetime = None):
     # id so that they are always in the same order.
     images = TheiaImage.query.filter(TheiaImage.public == True).order_by(TheiaImage.id.desc()).all()
 
-    # Get all playground theia sessions after start datetime
-    theia_sessions = get_theia_sessions(None, start)
-
-    # Count number of playground IDEs per hour using some pandas df witchcraft
-    s = theia_sessions.groupby(["image_id", "created"])["id"].count().reset_index().rename(
-        columns={"id": "count"}
-    )
+    # Count number of playground IDEs per hour after start datetime
+    s = get_theia_session_counts("image_id", None, start)
 
     # Value counts outside 4 std devs
     # should be brought down to 4 std devs
@@ -134,7 +119,7 @@ def get_usage_plot_playgrounds(start: datetime = None):
     s_std = s['count'].std()
     s_mean = s['count'].mean()
     s_max = s_mean + (4 * s_std)
-    s[s['count'] >= s_max] = s_max
+    s.loc[s['count'] >= s_max, 'count'] = s_max
 
     # Group by image
     for key, group in s.groupby("image_id"):
@@ -156,14 +141,20 @@ def get_usage_plot_playgrounds(start: datetime = None):
     return convert_fig_bytes(plt, fig)
 
 
-@cache.memoize(timeout=-1, forced_update=is_job, unless=is_debug)
 @verbose_call()
 def get_usage_plot_active(days: int = 14, step: int = 1):
     import matplotlib.pyplot as plt
 
-    now = datetime.now().replace(hour=0, second=0, microsecond=0)
+    now = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
     start_datetime = now - timedelta(days=days - 1)
 
+    # Distinct users across more than one day
+    # need the ids of the users active each day.
+    activity = {
+        row.day: row
+        for row in get_daily_activity(start_datetime, now, user_ids=step > 1)
+    }
+
     xx = []
     total_y = []
     theia_y = []
@@ -171,10 +162,22 @@ def get_usage_plot_active(days: int = 14, step: int = 1):
 
     for n in range(0, days, step):
         start_day = start_datetime + timedelta(days=n)
-        end_day = start_day + timedelta(days=step - 1)
-        submission_set = get_active_submission_users(start_day, end_day)
-        theia_set = get_active_theia_users(start_day, end_day)
         xx.append(start_day)
+
+        if step == 1:
+            row = activity.get(start_day, None)
+            total_y.append(row.active_users if row is not None else 0)
+            autograde_y.append(row.submission_users if row is not None else 0)
+            theia_y.append(row.theia_users if row is not None else 0)
+            continue
+
+        submission_set = set()
+        theia_set = set()
+        for i in range(step):
+            row = activity.get(start_day + timedelta(days=i), None)
+            if row is not None:
+                submission_set.update(row.submission_user_ids or [])
+                theia_set.update(row.theia_user_ids or [])
         total_y.append(len(submission_set.union(theia_set)))
         autograde_y.append(len(submission_set))
         theia_y.append(len(theia_set))
@@ -1,20 +1,22 @@
 from datetime import datetime, timedelta
 
-from anubis.utils.cache import cache
-from anubis.utils.data import is_debug, is_job
-from anubis.utils.usage.users import get_platform_users
+from anubis.utils.usage.activity import get_daily_activity
 from anubis.utils.visuals.files import convert_fig_bytes
 from anubis.utils.visuals.watermark import add_watermark
 from anubis.utils.logging import verbose_call
 
-@cache.memoize(timeout=-1, forced_update=is_job, unless=is_debug)
 @verbose_call()
 def get_platform_users_plot(days: int, step: int = 1):
     import matplotlib.pyplot as plt
 
-    now = datetime.now().replace(hour=0, second=0, microsecond=0)
+    now = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
     start_datetime = now - timedelta(days=days - 1)
 
+    activity = {
+        row.day: row
+        for row in get_daily_activity(start_datetime, now)
+    }
+
     xx = []
     yy = []
 
@@ -22,10 +24,10 @@ def get_platform_users_plot(days: int, step: int = 1):
 
     for n in range(0, days, step):
         day = start_datetime + timedelta(days=n)
-        y = get_platform_users(day)
+        row = activity.get(day, None)
 
         xx.append(day)
-        yy.append(y)
+        yy.append(row.total_users if row is not None else 0)
 
     ax.plot(xx, yy, 'b--', label='Total users registered on platform')
 
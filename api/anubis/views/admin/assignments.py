@@ -6,7 +6,7 @@ from dateutil.parser import parse as dateparse
 from flask import Blueprint
 from sqlalchemy.exc import DataError, IntegrityError
 
-from anubis.github.repos import delete_assignment_repo
+from anubis.github.repos import delete_assignment_repo, get_repo_provision_progress
 from anubis.lms.assignments import assignment_sync, delete_assignment, delete_assignment_repos, get_assignment_tests
 from anubis.lms.courses import assert_course_context, course_context, is_course_superuser
 from anubis.lms.questions import get_assigned_questions
@@ -16,6 +16,7 @@ from anubis.lms.shell_autograde import (
     verify_shell_exercise_repo_format,
     autograde_shell_assignment_sync,
 )
+from anubis.lms.repo_index import index_assignments
 from anubis.lms.repos import list_repos_with_latest_commit
 from anubis.models import Assignment, AssignmentRepo, AssignmentTest, SubmissionTestResult, User, db
 from anubis.rpc.enqueue import enqueue_make_shared_assignment, enqueue_recalculate_late
@@ -60,6 +61,24 @@ def admin_assignments_shared_id(assignment: Assignment, groups: list[list[str]],
     )
 
 
+@assignments.get("/shared/<string:id>/progress")
+@require_admin()
+@load_from_id(Assignment, verify_owner=False)
+@json_response
+def admin_assignments_shared_id_progress(assignment: Assignment):
+    """
+    Get the progress of making a shared assignment. Each
+    repo will be pending, creating, configuring, done or failed.
+
+    :param assignment:
+    :return:
+    """
+
+    assert_course_context(assignment)
+
+    return success_response({"progress": get_repo_provision_progress(assignment.id)})
+
+
 @assignments.delete("/reset-repos/<string:id>")
 @require_admin()
 @load_from_id(Assignment, verify_owner=False)
@@ -449,6 +468,9 @@ def admin_assignments_save(assignment: dict):
         # Tell frontend what error happened
         return error_response(str(e))
 
+    # The webhook reads the late and autograde settings from the index
+    index_assignments([db_assignment])
+
     # Return status
     return success_response(
         {
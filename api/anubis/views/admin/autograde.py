@@ -6,7 +6,7 @@ from anubis.lms.courses import assert_course_context
 from anubis.lms.questions import get_assigned_questions
 from anubis.models import Assignment, InCourse, Submission, User
 from anubis.utils.auth.http import require_admin
-from anubis.utils.cache import cache
+from anubis.utils.cache import cache, cache_tag, invalidate_tags
 from anubis.utils.data import req_assert
 from anubis.utils.http import success_response
 from anubis.utils.http.decorators import json_response
@@ -40,8 +40,8 @@ def admin_autograde_cache_reset(assignment_id: str):
     # Verify that the current course context, and the assignment course match
     assert_course_context(assignment)
 
-    cache.delete_memoized(bulk_autograde)
-    cache.delete_memoized(autograde)
+    invalidate_tags(cache_tag("assignment", assignment.id))
+    autograde.delete_memoized()
     cache.delete_memoized(get_assignment_history)
     cache.delete_memoized(get_admin_assignment_visual_data)
     cache.delete_memoized(get_assignment_sundial)
@@ -150,7 +150,7 @@ def admin_autograde_for_assignment_id_user_id(assignment_id, user_id):
 
     # If force load, then skip any caching
     if force:
-        cache.delete_memoized(autograde, student.id, assignment.id)
+        invalidate_tags(cache_tag("user", student.id))
 
     # Calculate the best submission for this student and assignment
     submission_id = autograde(student.id, assignment.id)
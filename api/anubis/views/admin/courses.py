@@ -3,6 +3,7 @@ from sqlalchemy.exc import DataError, IntegrityError
 
 from anubis.github.team import add_github_team_member, remote_github_team_member
 from anubis.lms.courses import assert_course_superuser, course_context, valid_join_code
+from anubis.lms.repo_index import index_course
 from anubis.models import Course, InCourse, ProfessorForCourse, TAForCourse, User, db
 from anubis.rpc.enqueue import enqueue_bulk_create_students
 from anubis.utils.auth.http import require_admin, require_superuser
@@ -131,6 +132,9 @@ def admin_courses_save_id(course: dict):
         db.session.rollback()
         return error_response("Unable to save " + str(e))
 
+    # The webhook reads the github org from the index
+    index_course(db_course)
+
     # Return the status
     return success_response({"course": db_course.data, "status": "Changes saved."})
 
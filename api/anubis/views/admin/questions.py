@@ -2,13 +2,14 @@ import io
 from datetime import datetime
 
 import sqlalchemy.exc
-from flask import Blueprint, send_file
+from flask import Blueprint, Response, request, send_file
 
 from anubis.lms.courses import assert_course_context, assert_course_superuser
 from anubis.lms.questions import (
     assign_questions,
     export_assignment_questions,
     export_assignment_question_history,
+    get_assignment_questions_export_etag,
     get_all_questions,
     get_question_assignments,
     hard_reset_questions,
@@ -364,18 +365,30 @@ def admin_assignments_export(assignment_id: str):
     # Verify that the assignment is accessible to the user in the current course context
     assert_course_context(assignment)
 
+    # Get a hash of the export contents. If the client already has
+    # this version of the export, then we can skip building it.
+    etag = get_assignment_questions_export_etag(assignment.id)
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers={"ETag": f'"{etag}"'})
+
     # Get now datetime
     now = datetime.now().replace(microsecond=0)
 
     # Generate an export of the assignment data
-    zip_blob = export_assignment_questions(assignment.id)
+    zip_file = export_assignment_questions(assignment.id)
 
     # Get a filename from the assignment name and datetime
     assignment_name = clean_assignment_name(assignment)
     filename = f"anubis-question-assignments-{assignment_name}-{str(now)}.zip".replace(" ", "_").replace(":", "")
 
-    # Send the file back
-    return send_file(io.BytesIO(zip_blob), attachment_filename=filename, as_attachment=True)
+    # Stream the file back
+    return send_file(
+        zip_file,
+        mimetype="application/zip",
+        download_name=filename,
+        as_attachment=True,
+        etag=etag,
+    )
 
 
 @questions.get("/history/<string:assignment_id>/<string:user_id>")
@@ -3,15 +3,14 @@ import math
 from flask import Blueprint
 from sqlalchemy import or_
 
-from anubis.lms.autograde import autograde, bulk_autograde
+from anubis.k8s.pipeline.scheduler import PRIORITY_REGRADE
 from anubis.lms.courses import assert_course_context
-from anubis.lms.submissions import bulk_regrade_submissions
 from anubis.lms.submissions import init_submission
 from anubis.models import Assignment, Submission, User
 from anubis.rpc.enqueue import enqueue_bulk_regrade_assignment, enqueue_bulk_regrade_submissions_of_student
-from anubis.rpc.enqueue import rpc_enqueue, enqueue_autograde_pipeline
+from anubis.rpc.enqueue import enqueue_autograde_pipeline, enqueue_bulk_regrade_submission_chunks
 from anubis.utils.auth.http import require_admin
-from anubis.utils.cache import cache
+from anubis.utils.cache import cache_tag, invalidate_tags
 from anubis.utils.data import req_assert, split_chunks
 from anubis.utils.http import get_number_arg, success_response
 from anubis.utils.http.decorators import json_response, load_from_id
@@ -133,7 +132,7 @@ def admin_regrade_submission_commit(commit: str):
     init_submission(submission)
 
     # Enqueue the submission pipeline
-    enqueue_autograde_pipeline(submission.id)
+    enqueue_autograde_pipeline(submission.id, priority=PRIORITY_REGRADE)
 
     # Return status
     return success_response({"submission": submission.data, "user": submission.owner.data})
@@ -179,13 +178,11 @@ def private_regrade_student_assignment_netid(assignment_id: str, netid: str):
     submission_ids = [s.id for s in submissions]
     submission_chunks = split_chunks(submission_ids, 100)
 
-    # Enqueue each chunk as a job for the rpc workers
-    for chunk in submission_chunks:
-        rpc_enqueue(bulk_regrade_submissions, "regrade", args=[chunk])
+    # Enqueue all the chunks as jobs for the rpc workers
+    enqueue_bulk_regrade_submission_chunks(submission_chunks)
 
     # Clear cache of autograde results
-    cache.delete_memoized(bulk_autograde, assignment.id)
-    cache.delete_memoized(autograde, student.id, assignment.id)
+    invalidate_tags(cache_tag("assignment", assignment.id), cache_tag("user", student.id))
 
     return success_response(
         {
@@ -3,12 +3,9 @@ from flask import Blueprint
 from flask import Blueprint
 
 from anubis.github.repos import delete_assignment_repo
-from anubis.lms.assignments import get_assignment_data
 from anubis.lms.courses import assert_course_context
-from anubis.lms.repos import get_repos
 from anubis.models import Assignment, AssignmentRepo, User
 from anubis.utils.auth.http import require_user
-from anubis.utils.cache import cache
 from anubis.utils.http import req_assert, success_response
 from anubis.utils.http.decorators import json_response
 
@@ -51,17 +48,9 @@ def admin_repos_delete(repo_id: str):
     # If the repo is shared, then student can not delete
     req_assert(not repo.shared, message="Repo is shared. Please reach out to Anubis support to delete/reset this repo.")
 
-    # save this now, or get a database error after the delete operation
-    assignment_id = repo.assignment_id
-
-    # Delete the repo
+    # Delete the repo. The cached repos and assignment data
+    # for the student are invalidated when the deletes commit.
     delete_assignment_repo(student, assignment)
 
-    # Delete cache entry
-    cache.delete_memoized(get_repos, student.id)
-
-    # Clear cache entry
-    cache.delete_memoized(get_assignment_data, student.id, assignment_id)
-
     # Pass them back
     return success_response({"status": "Github Repo & Submissions deleted"})
@@ -1,8 +1,10 @@
 from flask import Blueprint
 
+from anubis.lms.autograde import delete_best_submissions
 from anubis.lms.courses import assert_course_context
 from anubis.models import SubmissionTestResult, Submission, SubmissionBuild, TheiaSession, db
 from anubis.utils.auth.http import require_admin
+from anubis.utils.cache import bulk_cache_tags, cache_tag
 from anubis.utils.data import req_assert
 from anubis.utils.http import success_response
 from anubis.utils.http.decorators import json_response, load_from_id
@@ -39,12 +41,18 @@ def admin_submissions_delete_id(submission: Submission):
         # Unlink submission from theia session
         theia_session.submission_id = None
 
-    # Delete submission sub-table rows
-    SubmissionBuild.query.filter(SubmissionBuild.submission_id == submission.id).delete()
-    SubmissionTestResult.query.filter(SubmissionTestResult.submission_id == submission.id).delete()
-
-    # Delete submission
-    Submission.query.filter(Submission.id == submission.id).delete()
+    with bulk_cache_tags(
+        cache_tag("submission", submission.id),
+        cache_tag("user", submission.owner_id),
+        cache_tag("assignment", submission.assignment_id),
+    ):
+        # Delete submission sub-table rows
+        delete_best_submissions([submission.id])
+        SubmissionBuild.query.filter(SubmissionBuild.submission_id == submission.id).delete()
+        SubmissionTestResult.query.filter(SubmissionTestResult.submission_id == submission.id).delete()
+
+        # Delete submission
+        Submission.query.filter(Submission.id == submission.id).delete()
 
     # Commit deletes
     db.session.commit()
@@ -3,9 +3,10 @@ import json
 from flask import Blueprint, request
 from parse import parse
 
-from anubis.models import AssignmentTest, Submission, SubmissionTestResult, db
+from anubis.lms.autograde import update_best_submission
+from anubis.models import AssignmentTest, Submission, SubmissionBuild, SubmissionTestResult, db
 from anubis.utils.data import MYSQL_TEXT_MAX_LENGTH
-from anubis.utils.http import success_response
+from anubis.utils.http import error_response, success_response
 from anubis.utils.http.decorators import json_endpoint, json_response
 from anubis.utils.logging import logger
 from anubis.utils.pipeline.decorators import check_submission_token
@@ -13,6 +14,42 @@ from anubis.lms.submissions import init_submission
 
 pipeline = Blueprint("pipeline", __name__, url_prefix="/pipeline")
 
+# Fields (and their types) of each test result in a batch report
+_TEST_REPORT_FIELDS = [("test_name", str), ("passed", bool), ("message", str), ("output_type", str), ("output", str)]
+
+
+def _is_hidden_test_state(submission: Submission, state: str) -> bool:
+    """
+    Figure out if a reported state is for a hidden test. We do this by
+    checking the state that was given, to read the name of the test. If
+    the assignment test that was found is marked as hidden, then we should
+    not update the state of the submission model.
+
+    If we were to update the state of the submission when a hidden test
+    is reported, then it would be visible to the students in the frontend.
+
+    :param submission:
+    :param state:
+    :return:
+    """
+
+    # Do a basic match on the expected test
+    match = parse("Running test: {}", state)
+    if not match:
+        return False
+
+    # Get the parsed assignment test name
+    test_name = match[0]
+
+    # Try to get the assignment test
+    assignment_test = AssignmentTest.query.filter(
+        AssignmentTest.assignment_id == submission.assignment_id,
+        AssignmentTest.name == test_name,
+    ).first()
+
+    # hidden if the test exists, and if it is marked as hidden
+    return assignment_test is not None and assignment_test.hidden
+
 
 @pipeline.post("/report/panic/<string:submission_id>")
 @check_submission_token
@@ -184,6 +221,9 @@ def pipeline_report_test(submission: Submission, test_name: str, passed: bool, m
     db.session.add(submission_test_result)
     db.session.commit()
 
+    # Update the materialized best submission for the student
+    update_best_submission(submission)
+
     return success_response("Test data successfully added.")
 
 
@@ -227,37 +267,8 @@ def pipeline_report_state(submission: Submission, state: str, **__):
     # set the processed field if it was specified
     submission.processed = processed != "0"
 
-    # Figure out if the test is hidden
-    # We do this by checking the state that was given,
-    # to read the name of the test. If the assignment
-    # test that was found is marked as hidden, then
-    # we should not update the state of the submission
-    # model.
-    #
-    # If we were to update the state of the submission
-    # when a hidden test is reported, then it would be
-    # visible to the students in the frontend.
-    hidden_test = False
-
-    # Do a basic match on the expected test
-    match = parse("Running test: {}", state)
-
-    # If we got a match
-    if match:
-        # Get the parsed assignment test name
-        test_name = match[0]
-
-        # Try to get the assignment test
-        assignment_test = AssignmentTest.query.filter(
-            AssignmentTest.assignment_id == submission.assignment_id,
-            AssignmentTest.name == test_name,
-        ).first()
-
-        # set hidden_test to True if the test exists, and if it is marked as hidden
-        hidden_test = assignment_test is not None and assignment_test.hidden
-
     # Update state field if the state report is not for a hidden test
-    if not hidden_test:
+    if not _is_hidden_test_state(submission, state):
         submission.state = state
 
     # If processed was specified and is of type bool, then update that too
@@ -272,6 +283,153 @@ def pipeline_report_state(submission: Submission, state: str, **__):
 from anubis.constants import SHELL_AUTOGRADE_SUBMISSION_STATE_MESSAGE
 
 
+@pipeline.post("/report/batch/<string:submission_id>")
+@check_submission_token
+@json_endpoint(required_fields=[])
+def pipeline_report_batch(
+    submission: Submission,
+    build: dict | None = None,
+    tests: list[dict] | None = None,
+    state: str | None = None,
+    processed: bool | None = None,
+    **_,
+):
+    """
+    Submission pipelines can report the build, all the test results and
+    the final state in a single request, instead of one request for each.
+    Everything is written in a single transaction.
+
+    All fields are optional. They are applied in the same order the
+    pipeline would report them individually (build, tests, state).
+
+    POSTed json should be of the shape:
+
+    {
+      "build": {
+        "stdout": "build logs...",
+        "passed": True
+      },
+      "tests": [
+        {
+          "test_name": "name of the test",
+          "passed": True,
+          "message": "This test worked",
+          "output_type": "diff",
+          "output": "--- \n\n+++ \n\n@@ -1,3 +1,3 @@\n\n a\n-c\n+b\n d"
+        },
+        ...
+      ],
+      "state": "Tests completed",
+      "processed": True
+    }
+
+    :param submission:
+    :param build:
+    :param tests:
+    :param state:
+    :param processed:
+    :return:
+    """
+
+    tests = tests if tests is not None else []
+
+    # Verify the shape of the report before touching anything
+    if build is not None and not (
+        isinstance(build, dict) and isinstance(build.get("stdout"), str) and isinstance(build.get("passed"), bool)
+    ):
+        return error_response("Malformed requests. Invalid build."), 406
+    if not isinstance(tests, list):
+        return error_response("Malformed requests. Invalid tests."), 406
+    for test in tests:
+        if not isinstance(test, dict) or any(
+            not isinstance(test.get(field), field_type) for field, field_type in _TEST_REPORT_FIELDS
+        ):
+            return error_response("Malformed requests. Invalid test."), 406
+    if state is not None and not isinstance(state, str):
+        return error_response("Malformed requests. Invalid state."), 406
+    if processed is not None and not isinstance(processed, bool):
+        return error_response("Malformed requests. Invalid processed."), 406
+
+    # Log the batch
+    logger.info(
+        "submission batch reported",
+        extra={
+            "type":          "batch_report",
+            "submission_id": submission.id,
+            "assignment_id": submission.assignment_id,
+            "owner_id":      submission.owner_id,
+            "build_passed":  build["passed"] if build is not None else None,
+            "tests":         len(tests),
+            "state":         state,
+        },
+    )
+
+    # Update submission build
+    if build is not None:
+        if submission.build is None:
+            submission.build = SubmissionBuild(submission_id=submission.id)
+
+        submission.build.stdout = build["stdout"][:MYSQL_TEXT_MAX_LENGTH]
+        submission.build.passed = build["passed"]
+
+        # If the build did not passed, then the
+        # submission pipeline is done
+        if build["passed"] is False:
+            submission.processed = True
+            submission.state = "Build did not succeed"
+
+    invalid_test_names = []
+    if len(tests) > 0:
+        # Get the existing results for the submission (with their test
+        # names) in one query. Like the single test report, only tests
+        # that have a result are accepted. Results are created when the
+        # submission is initialized.
+        test_results: dict[str, SubmissionTestResult] = {
+            test_name: test_result
+            for test_result, test_name in db.session.query(SubmissionTestResult, AssignmentTest.name)
+            .join(AssignmentTest, AssignmentTest.id == SubmissionTestResult.assignment_test_id)
+            .filter(SubmissionTestResult.submission_id == submission.id)
+            .all()
+        }
+
+        for test in tests:
+            submission_test_result = test_results.get(test["test_name"], None)
+            if submission_test_result is None:
+                invalid_test_names.append(test["test_name"])
+                continue
+
+            # Update the fields
+            submission_test_result.passed = test["passed"]
+            submission_test_result.message = test["message"]
+            submission_test_result.output_type = test["output_type"]
+            submission_test_result.output = test["output"][:MYSQL_TEXT_MAX_LENGTH]
+
+    if len(invalid_test_names) > 0:
+        logger.error(
+            "Invalid submission test results reported",
+            extra={"submission_id": submission.id, "test_names": invalid_test_names},
+        )
+
+    # Update state field if the state report is not for a hidden test
+    if state is not None and not _is_hidden_test_state(submission, state):
+        submission.state = state
+
+    if processed is not None:
+        submission.processed = processed
+
+    # Commit everything at once
+    db.session.commit()
+
+    # Update the materialized best submission for the student
+    if len(tests) > 0:
+        update_best_submission(submission)
+
+    return success_response({
+        "status":             "Batch successfully reported.",
+        "invalid_test_names": invalid_test_names,
+    })
+
+
 @pipeline.get("/reset/<string:submission_id>")
 @check_submission_token
 @json_response
@@ -2,14 +2,11 @@ from typing import Any
 
 from flask import Blueprint
 
-from anubis.lms.assignments import get_assignments
 from anubis.lms.courses import get_courses, get_courses_with_visuals, valid_join_code, get_course_data
-from anubis.lms.students import get_students
 from anubis.models import Course, InCourse, db
 from anubis.rpc.enqueue import enqueue_assign_missing_questions
 from anubis.utils.auth.http import require_user
 from anubis.utils.auth.user import current_user
-from anubis.utils.cache import cache
 from anubis.utils.data import req_assert
 from anubis.utils.http import error_response, success_response
 from anubis.utils.http.decorators import json_response
@@ -102,12 +99,6 @@ def public_courses_join(join_code):
     db.session.add(in_course)
     db.session.commit()
 
-    # Clear the cached entries for getting course data
-    cache.delete_memoized(get_courses, current_user.netid)
-    cache.delete_memoized(get_assignments, current_user.netid)
-    cache.delete_memoized(get_assignments, current_user.netid, course.id)
-    cache.delete_memoized(get_students, course.id)
-
     # Enqueue fixing missing questions job
     enqueue_assign_missing_questions(current_user.id)
 
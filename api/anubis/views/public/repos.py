@@ -9,7 +9,6 @@ from anubis.lms.repos import get_repos
 from anubis.models import db, Assignment, AssignmentRepo
 from anubis.utils.auth.http import require_user
 from anubis.utils.auth.user import current_user
-from anubis.utils.cache import cache
 from anubis.utils.http import error_response, req_assert, success_response
 from anubis.utils.http.decorators import json_response
 
@@ -107,9 +106,6 @@ def public_repos_create(assignment_id: str):
 
     repo, errors = create_assignment_student_repo(current_user, assignment)
 
-    # Clear cache entry
-    cache.delete_memoized(get_assignment_data, current_user.id, assignment_id)
-
     if len(errors) > 0:
         return success_response({
             "repo": repo.data,
@@ -160,14 +156,9 @@ def public_repos_delete(assignment_id: str):
     # If the repo is shared, then student can not delete
     req_assert(not repo.shared, message="Repo is shared. Please reach out to Anubis support to delete/reset this repo.")
 
-    # Delete the repo
+    # Delete the repo. The cached repos and assignment data
+    # for the student are invalidated when the deletes commit.
     delete_assignment_repo(current_user, assignment)
 
-    # Delete cache entry
-    cache.delete_memoized(get_repos, current_user.id)
-
-    # Clear cache entry
-    cache.delete_memoized(get_assignment_data, current_user.id, assignment_id)
-
     # Pass them back
     return success_response({"status": "Github Repo & Submissions deleted"})
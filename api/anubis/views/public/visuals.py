@@ -3,19 +3,20 @@ from flask import Blueprint
 from anubis.models import Course
 from anubis.utils.http import req_assert
 from anubis.utils.http.files import make_png_response
-from anubis.utils.visuals.usage import get_usage_plot, get_usage_plot_playgrounds, get_usage_plot_active
-from anubis.utils.visuals.users import get_platform_users_plot
+from anubis.utils.visuals.store import get_plot
 
 visuals_ = Blueprint("public-visuals", __name__, url_prefix="/public/visuals")
 
 
 @visuals_.route("/playgrounds")
 def public_visuals_usage_playgrounds():
-    # Get the png blob of the usage graph.
-    # The get_usage_plot is itself a cached function.
-    blob = get_usage_plot_playgrounds()
+    # Get the rendered usage graph. Plots are kept
+    # up to date in the plot store by the visuals job.
+    plot = get_plot("playgrounds")
 
-    return make_png_response(blob)
+    req_assert(plot is not None, message="Plot is not available")
+
+    return make_png_response(plot["png"], etag=plot["etag"])
 
 
 @visuals_.route("/course/<string:course_id>")
@@ -37,62 +38,76 @@ def public_visuals_usage(course_id: str):
     # Confirm that the course has visuals enabled
     req_assert(course.display_visuals, message="Course does not support usage visuals")
 
-    # Get the png blob of the usage graph.
-    # The get_usage_plot is itself a cached function.
-    blob = get_usage_plot(course.id)
+    # Get the rendered usage graph. Plots are kept
+    # up to date in the plot store by the visuals job.
+    plot = get_plot("usage", course_id=course.id)
+
+    req_assert(plot is not None, message="Plot is not available")
 
-    return make_png_response(blob)
+    return make_png_response(plot["png"], etag=plot["etag"])
 
 
 @visuals_.route("/active/14/1")
 def public_visuals_usage_active_14_1():
-    # Get the png blob of the usage graph.
-    # The get_usage_plot is itself a cached function.
-    blob = get_usage_plot_active(days=14, step=1)
+    # Get the rendered usage graph. Plots are kept
+    # up to date in the plot store by the visuals job.
+    plot = get_plot("active", days=14, step=1)
 
-    return make_png_response(blob)
+    req_assert(plot is not None, message="Plot is not available")
+
+    return make_png_response(plot["png"], etag=plot["etag"])
 
 
 @visuals_.route("/active/180/1")
 def public_visuals_usage_active_180_1():
-    # Get the png blob of the usage graph.
-    # The get_usage_plot is itself a cached function.
-    blob = get_usage_plot_active(days=180, step=1)
+    # Get the rendered usage graph. Plots are kept
+    # up to date in the plot store by the visuals job.
+    plot = get_plot("active", days=180, step=1)
+
+    req_assert(plot is not None, message="Plot is not available")
 
-    return make_png_response(blob)
+    return make_png_response(plot["png"], etag=plot["etag"])
 
 
 @visuals_.route("/active/90/7")
 def public_visuals_usage_active_90_7():
-    # Get the png blob of the usage graph.
-    # The get_usage_plot is itself a cached function.
-    blob = get_usage_plot_active(days=90, step=7)
+    # Get the rendered usage graph. Plots are kept
+    # up to date in the plot store by the visuals job.
+    plot = get_plot("active", days=90, step=7)
 
-    return make_png_response(blob)
+    req_assert(plot is not None, message="Plot is not available")
+
+    return make_png_response(plot["png"], etag=plot["etag"])
 
 
 @visuals_.route("/active/365/30")
 def public_visuals_usage_active_365_30():
-    # Get the png blob of the usage graph.
-    # The get_usage_plot is itself a cached function.
-    blob = get_usage_plot_active(days=365, step=30)
+    # Get the rendered usage graph. Plots are kept
+    # up to date in the plot store by the visuals job.
+    plot = get_plot("active", days=365, step=30)
+
+    req_assert(plot is not None, message="Plot is not available")
 
-    return make_png_response(blob)
+    return make_png_response(plot["png"], etag=plot["etag"])
 
 
 @visuals_.route("/users/365/1")
 def public_visuals_users_365_1():
-    # Get the png blob of the usage graph.
-    # The get_usage_plot is itself a cached function.
-    blob = get_platform_users_plot(days=365, step=1)
+    # Get the rendered usage graph. Plots are kept
+    # up to date in the plot store by the visuals job.
+    plot = get_plot("users", days=365, step=1)
 
-    return make_png_response(blob)
+    req_assert(plot is not None, message="Plot is not available")
+
+    return make_png_response(plot["png"], etag=plot["etag"])
 
 
 @visuals_.route("/users/365/30")
 def public_visuals_users_365_30():
-    # Get the png blob of the usage graph.
-    # The get_usage_plot is itself a cached function.
-    blob = get_platform_users_plot(days=365, step=30)
+    # Get the rendered usage graph. Plots are kept
+    # up to date in the plot store by the visuals job.
+    plot = get_plot("users", days=365, step=30)
+
+    req_assert(plot is not None, message="Plot is not available")
 
-    return make_png_response(blob)
+    return make_png_response(plot["png"], etag=plot["etag"])
@@ -4,6 +4,9 @@ def register_super_views(app):
     from anubis.views.super.playgrounds import playgrounds_
     from anubis.views.super.students import students_
     from anubis.views.super.email import email_
+    from anubis.views.super.pipeline import pipeline_
+    from anubis.views.super.auth import auth_
+    from anubis.views.super.rpc import rpc_
 
     views = [
         ide_,
@@ -11,6 +14,9 @@ def register_super_views(app):
         playgrounds_,
         students_,
         email_,
+        pipeline_,
+        auth_,
+        rpc_,
     ]
 
     for view in views:
@@ -0,0 +1,21 @@
+from flask import Blueprint
+
+from anubis.utils.auth.http import require_superuser
+from anubis.utils.auth.user import get_principal_cache_stats
+from anubis.utils.http import success_response
+from anubis.utils.http.decorators import json_response
+
+auth_ = Blueprint("super-auth", __name__, url_prefix="/super/auth")
+
+
+@auth_.route("/principal-cache/stats")
+@require_superuser()
+@json_response
+def super_auth_principal_cache_stats():
+    """
+    Get the hit rate of the user principal cache.
+
+    :return:
+    """
+
+    return success_response({"stats": get_principal_cache_stats()})
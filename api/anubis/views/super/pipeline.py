@@ -0,0 +1,24 @@
+from flask import Blueprint
+
+from anubis.k8s.pipeline.scheduler import get_pipeline_scheduler_stats
+from anubis.utils.auth.http import require_superuser
+from anubis.utils.http import success_response
+from anubis.utils.http.decorators import json_response
+
+pipeline_ = Blueprint("super-pipeline", __name__, url_prefix="/super/pipeline")
+
+
+@pipeline_.route("/stats")
+@require_superuser()
+@json_response
+def super_pipeline_stats():
+    """
+    Get the pipeline scheduler queue depths and recent
+    wait times for each priority.
+
+    :return:
+    """
+
+    return success_response({
+        "priorities": get_pipeline_scheduler_stats(),
+    })
@@ -0,0 +1,22 @@
+from flask import Blueprint
+
+from anubis.rpc.worker import get_rpc_job_stats
+from anubis.utils.auth.http import require_superuser
+from anubis.utils.http import success_response
+from anubis.utils.http.decorators import json_response
+
+rpc_ = Blueprint("super-rpc", __name__, url_prefix="/super/rpc")
+
+
+@rpc_.route("/stats")
+@require_superuser()
+@json_response
+def super_rpc_stats():
+    """
+    Get the average setup and execution time of
+    the rpc jobs for each function.
+
+    :return:
+    """
+
+    return success_response({"jobs": get_rpc_job_stats()})
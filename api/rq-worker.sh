@@ -1,4 +1,4 @@
 #!/bin/sh
 
 echo "starting rq worker"
-exec rq worker -u redis://:${REDIS_PASS}@redis-master --results-ttl 5 $@
+exec rq worker -u redis://:${REDIS_PASS}@redis-master -w ${RQ_WORKER_CLASS:-anubis.rpc.worker.AnubisWorker} --results-ttl 5 $@
@@ -0,0 +1,220 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from anubis.lms import autograde
+from anubis.lms.autograde import get_best_submission_ids, refresh_best_submissions, update_best_submission
+from anubis.models import (
+    db,
+    Assignment,
+    AssignmentTest,
+    BestSubmission,
+    Course,
+    Submission,
+    SubmissionTestResult,
+    User,
+)
+from anubis.utils.data import rand
+from utils import with_context, create_user
+
+TEST_COUNT = 3
+
+
+@pytest.fixture(scope="module")
+@with_context
+def assignment_id():
+    course = Course.query.filter(Course.name == "Intro to OS").first()
+    now = datetime.now()
+    assignment = Assignment(
+        name=f"best submission {rand(8)}",
+        unique_code=rand(8),
+        hidden=True,
+        pipeline_image="registry.digitalocean.com/anubis/assignment/test",
+        release_date=now - timedelta(days=1),
+        due_date=now + timedelta(days=1),
+        grace_date=now + timedelta(days=1),
+        course_id=course.id,
+    )
+    db.session.add(assignment)
+    db.session.flush()
+    for i in range(TEST_COUNT):
+        db.session.add(AssignmentTest(name=f"test {i}", assignment_id=assignment.id, order=i))
+    db.session.commit()
+    return assignment.id
+
+
+@pytest.fixture
+@with_context
+def student_id():
+    netid, _, _ = create_user("student")
+    return User.query.filter(User.netid == netid).first().id
+
+
+def create_submission(assignment_id: str, owner_id: str, passed: int, minutes_ago: int, accepted: bool = True) -> str:
+    submission = Submission(
+        owner_id=owner_id,
+        assignment_id=assignment_id,
+        commit=rand(40),
+        processed=True,
+        accepted=accepted,
+        created=datetime.now() - timedelta(minutes=minutes_ago),
+    )
+    db.session.add(submission)
+    db.session.flush()
+
+    tests = AssignmentTest.query.filter(AssignmentTest.assignment_id == assignment_id).order_by(AssignmentTest.order)
+    for index, test in enumerate(tests):
+        db.session.add(SubmissionTestResult(
+            submission_id=submission.id,
+            assignment_test_id=test.id,
+            passed=index < passed,
+        ))
+    db.session.commit()
+    return submission.id
+
+
+def get_materialized(assignment_id: str, owner_id: str) -> str | None:
+    db.session.expire_all()
+    best = BestSubmission.query.filter(
+        BestSubmission.assignment_id == assignment_id,
+        BestSubmission.owner_id == owner_id,
+    ).first()
+    return best.submission_id if best is not None else None
+
+
+@with_context
+def test_best_most_tests_passed(assignment_id, student_id):
+    create_submission(assignment_id, student_id, passed=1, minutes_ago=30)
+    best = create_submission(assignment_id, student_id, passed=2, minutes_ago=20)
+    create_submission(assignment_id, student_id, passed=0, minutes_ago=10)
+
+    assert get_best_submission_ids(assignment_id, [student_id]) == {student_id: best}
+
+
+@with_context
+def test_best_tie_keeps_oldest(assignment_id, student_id):
+    best = create_submission(assignment_id, student_id, passed=2, minutes_ago=30)
+    create_submission(assignment_id, student_id, passed=2, minutes_ago=20)
+
+    assert get_best_submission_ids(assignment_id, [student_id]) == {student_id: best}
+
+
+@with_context
+def test_best_all_passed_keeps_newest(assignment_id, student_id):
+    create_submission(assignment_id, student_id, passed=TEST_COUNT, minutes_ago=30)
+    best = create_submission(assignment_id, student_id, passed=TEST_COUNT, minutes_ago=20)
+
+    assert get_best_submission_ids(assignment_id, [student_id]) == {student_id: best}
+
+
+@with_context
+def test_best_ignores_rejected_and_late(assignment_id, student_id):
+    best = create_submission(assignment_id, student_id, passed=1, minutes_ago=30)
+    create_submission(assignment_id, student_id, passed=TEST_COUNT, minutes_ago=20, accepted=False)
+    create_submission(assignment_id, student_id, passed=TEST_COUNT, minutes_ago=10)
+
+    max_time = datetime.now() - timedelta(minutes=15)
+    assert get_best_submission_ids(assignment_id, [student_id], max_time=max_time) == {student_id: best}
+
+
+@with_context
+def test_refresh_best_submissions(assignment_id, student_id):
+    assert refresh_best_submissions(assignment_id, [student_id]) == {}
+    assert get_materialized(assignment_id, student_id) is None
+
+    first = create_submission(assignment_id, student_id, passed=1, minutes_ago=30)
+    assert refresh_best_submissions(assignment_id, [student_id]) == {student_id: first}
+    assert get_materialized(assignment_id, student_id) == first
+
+    # Refreshing again does not change anything
+    assert refresh_best_submissions(assignment_id, [student_id]) == {student_id: first}
+    assert get_materialized(assignment_id, student_id) == first
+
+    better = create_submission(assignment_id, student_id, passed=2, minutes_ago=20)
+    refresh_best_submissions(assignment_id)
+    assert get_materialized(assignment_id, student_id) == better
+
+    # Students with no accepted submissions lose their row
+    Submission.query.filter(Submission.owner_id == student_id).update({"accepted": False})
+    db.session.commit()
+    assert refresh_best_submissions(assignment_id, [student_id]) == {}
+    assert get_materialized(assignment_id, student_id) is None
+
+
+@with_context
+def test_refresh_overwrites_concurrent_row(assignment_id, student_id, monkeypatch):
+    older = create_submission(assignment_id, student_id, passed=1, minutes_ago=30)
+    best = create_submission(assignment_id, student_id, passed=2, minutes_ago=20)
+
+    # Another worker materializes a row after this refresh has read the table
+    upsert = autograde._upsert_best_submissions
+
+    def racing_upsert(rows, cache_tags):
+        db.session.add(BestSubmission(owner_id=student_id, assignment_id=assignment_id, submission_id=older))
+        db.session.flush()
+        upsert(rows, cache_tags)
+
+    monkeypatch.setattr(autograde, "_upsert_best_submissions", racing_upsert)
+
+    assert refresh_best_submissions(assignment_id, [student_id]) == {student_id: best}
+    assert get_materialized(assignment_id, student_id) == best
+
+
+@with_context
+def test_update_best_submission(assignment_id, student_id):
+    first = create_submission(assignment_id, student_id, passed=2, minutes_ago=30)
+    second = create_submission(assignment_id, student_id, passed=1, minutes_ago=20)
+    refresh_best_submissions(assignment_id, [student_id])
+    assert get_materialized(assignment_id, student_id) == first
+
+    # The newer submission gets better after a regrade
+    SubmissionTestResult.query.filter(SubmissionTestResult.submission_id == second).update({"passed": True})
+    db.session.commit()
+    update_best_submission(Submission.query.filter(Submission.id == second).first())
+    assert get_materialized(assignment_id, student_id) == second
+
+    # Then it gets worse again
+    SubmissionTestResult.query.filter(SubmissionTestResult.submission_id == second).update({"passed": False})
+    db.session.commit()
+    update_best_submission(Submission.query.filter(Submission.id == second).first())
+    assert get_materialized(assignment_id, student_id) == first
+    assert get_materialized(assignment_id, student_id) == get_best_submission_ids(assignment_id)[student_id]
+
+
+@with_context
+def test_update_best_submission_concurrent_row(assignment_id, student_id, monkeypatch):
+    best = create_submission(assignment_id, student_id, passed=1, minutes_ago=30)
+    second = create_submission(assignment_id, student_id, passed=0, minutes_ago=20)
+    third = create_submission(assignment_id, student_id, passed=0, minutes_ago=10)
+    refresh_best_submissions(assignment_id, [student_id])
+    assert get_materialized(assignment_id, student_id) == best
+
+    # Both newer submissions get regraded. Another worker moves the row to
+    # the third submission after this update read it.
+    SubmissionTestResult.query.filter(SubmissionTestResult.submission_id.in_([second, third])).update(
+        {"passed": True}, synchronize_session=False,
+    )
+    SubmissionTestResult.query.filter(
+        SubmissionTestResult.submission_id == second,
+        SubmissionTestResult.assignment_test_id == AssignmentTest.query.filter(
+            AssignmentTest.assignment_id == assignment_id,
+        ).order_by(AssignmentTest.order).first().id,
+    ).update({"passed": False}, synchronize_session=False)
+    db.session.commit()
+    count = autograde.get_submission_tests_passed
+
+    def racing_count(submission_id):
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(BestSubmission)
+                .where(BestSubmission.owner_id == student_id, BestSubmission.assignment_id == assignment_id)
+                .values(submission_id=third, tests_passed=TEST_COUNT)
+            )
+        return count(submission_id)
+
+    monkeypatch.setattr(autograde, "get_submission_tests_passed", racing_count)
+
+    # The update must not overwrite the better row it did not read
+    update_best_submission(Submission.query.filter(Submission.id == second).first())
+    assert get_materialized(assignment_id, student_id) == third
@@ -0,0 +1,121 @@
+import pytest
+from sqlalchemy import text
+
+from anubis.lms.autograde import bulk_autograde
+from anubis.models import db, Assignment, AssignmentRepo, Submission, User
+from anubis.utils import cache
+from anubis.utils.cache import bulk_cache_tags, cache_tag
+from anubis.utils.data import rand
+from utils import with_context, create_user
+
+
+@pytest.fixture
+def invalidated(monkeypatch):
+    """
+    Collect the tags that are invalidated when the session commits,
+    instead of bumping them in the cache.
+    """
+    tags = set()
+    monkeypatch.setattr(cache, "invalidate_tags", lambda *t: tags.update(t))
+    return tags
+
+
+def get_student() -> User:
+    netid, _, _ = create_user("student")
+    return User.query.filter(User.netid == netid).first()
+
+
+def test_cache_tag():
+    assert cache_tag("user", "abc") == "user:abc"
+    assert cache_tag("user", User(id="abc")) == "user:abc"
+
+
+@with_context
+def test_invalidate_on_commit(invalidated):
+    submission: Submission = Submission.query.filter(Submission.owner_id != None).first()
+
+    submission.state = rand(8)
+    db.session.flush()
+
+    # Nothing is invalidated until the transaction commits
+    assert invalidated == set()
+
+    db.session.commit()
+    assert {
+        cache_tag("submission", submission.id),
+        cache_tag("user", submission.owner_id),
+        cache_tag("assignment", submission.assignment_id),
+    }.issubset(invalidated)
+
+
+@with_context
+def test_invalidate_moved_row(invalidated):
+    repo: AssignmentRepo = AssignmentRepo.query.filter(AssignmentRepo.owner_id != None).first()
+    old_owner_id = repo.owner_id
+    new_owner = get_student()
+    invalidated.clear()
+
+    # Moving a row invalidates both the old and new owner
+    repo.owner_id = new_owner.id
+    db.session.commit()
+    assert {cache_tag("user", old_owner_id), cache_tag("user", new_owner.id)}.issubset(invalidated)
+
+    repo.owner_id = old_owner_id
+    db.session.commit()
+
+
+@with_context
+def test_invalidate_bulk_kinds(invalidated):
+    student = get_student()
+    invalidated.clear()
+
+    # Bulk statements do not know the rows they touched
+    Submission.query.filter(Submission.owner_id == student.id).update({"state": ""})
+    db.session.commit()
+    assert {"submission:*", "user:*", "assignment:*"}.issubset(invalidated)
+    invalidated.clear()
+
+    # Core table statements are traced back to their model
+    db.session.execute(Submission.__table__.update().where(Submission.owner_id == student.id).values(state=""))
+    db.session.commit()
+    assert {"submission:*", "user:*", "assignment:*"}.issubset(invalidated)
+
+
+@with_context
+def test_invalidate_raw_sql_warns(invalidated, caplog):
+    student = get_student()
+    invalidated.clear()
+
+    db.session.execute(text("UPDATE submission SET state = '' WHERE owner_id = :owner_id"), {"owner_id": student.id})
+    db.session.commit()
+    assert invalidated == set()
+    assert "Raw sql statement does not invalidate any cache tags" in caplog.text
+
+
+@with_context
+def test_invalidate_bulk_tags(invalidated):
+    student = get_student()
+    invalidated.clear()
+
+    with bulk_cache_tags(cache_tag("user", student.id)):
+        Submission.query.filter(Submission.owner_id == student.id).update({"state": ""})
+    db.session.commit()
+    assert invalidated == {cache_tag("user", student.id)}
+    invalidated.clear()
+
+    db.session.execute(
+        Submission.__table__.update().where(Submission.owner_id == student.id).values(state=""),
+        execution_options={"cache_tags": [cache_tag("user", student.id)]},
+    )
+    db.session.commit()
+    assert invalidated == {cache_tag("user", student.id)}
+
+
+@with_context
+def test_bulk_autograde_tags():
+    assignment = Assignment.query.first()
+    tags = [cache_tag("assignment", assignment.id), cache_tag("course", assignment.course_id)]
+
+    # The assignment can be given by name or id
+    assert bulk_autograde.cache_tags(assignment.name) == tags
+    assert bulk_autograde.cache_tags(assignment.id) == tags
@@ -0,0 +1,99 @@
+import pytest
+
+from anubis.models import db, EmailEvent, EmailTemplate, User
+from anubis.utils.data import rand
+from anubis.utils.email import event
+from anubis.utils.email.event import send_email_events
+from utils import with_context, create_user
+
+
+@pytest.fixture(scope="module")
+@with_context
+def template_key():
+    key = f"test-{rand(8)}"
+    db.session.add(EmailTemplate(key=key, subject="Hello {{ user.netid }}", body="Body for {{ name }}"))
+    db.session.commit()
+    return key
+
+
+@pytest.fixture
+@with_context
+def user_ids():
+    return [User.query.filter(User.netid == create_user("student")[0]).first().id for _ in range(4)]
+
+
+def get_recorded(reference_id: str) -> dict[str, EmailEvent]:
+    db.session.expire_all()
+    return {
+        email_event.owner_id: email_event
+        for email_event in EmailEvent.query.filter(EmailEvent.reference_id == reference_id)
+    }
+
+
+@with_context
+def test_send_email_events(template_key, user_ids, monkeypatch):
+    users = User.query.filter(User.id.in_(user_ids)).all()
+    failed_netid, raised_netid = users[0].netid, users[1].netid
+    reference_id = rand(16)
+
+    sent_to = []
+
+    def send_message(message, service=None):
+        to = message["to"]
+        sent_to.append(to)
+        if to.startswith(failed_netid):
+            return False
+        if to.startswith(raised_netid):
+            raise RuntimeError("gmail is down")
+        return {}
+
+    monkeypatch.setattr(event, "send_message", send_message)
+    monkeypatch.setattr(event, "create_message", lambda sender, to, subject, body: {"to": to})
+    monkeypatch.setattr(event, "get_config_int", lambda key, default=None: 1 if key == "EMAIL_RECORD_CHUNK_SIZE" else 100)
+
+    # Only the emails that were sent are recorded
+    assert send_email_events(users, reference_id, "test", template_key, {"name": "abc"}) == 2
+    recorded = get_recorded(reference_id)
+    assert set(recorded) == {user.id for user in users[2:]}
+    assert recorded[users[2].id].subject == f"Hello {users[2].netid}"
+    assert recorded[users[2].id].body == "Body for abc"
+    assert len(sent_to) == 4
+
+    # Sending again only retries the users that did not get it
+    sent_to.clear()
+    monkeypatch.setattr(event, "send_message", lambda message, service=None: sent_to.append(message["to"]) or {})
+    assert send_email_events(users, reference_id, "test", template_key, {"name": "abc"}) == 2
+    assert sorted(sent_to) == sorted(f"{netid}@nyu.edu" for netid in [failed_netid, raised_netid])
+    assert set(get_recorded(reference_id)) == set(user_ids)
+
+    sent_to.clear()
+    assert send_email_events(users, reference_id, "test", template_key, {"name": "abc"}) == 0
+    assert sent_to == []
+
+
+@with_context
+def test_send_email_events_records_before_failure(template_key, user_ids, monkeypatch):
+    users = User.query.filter(User.id.in_(user_ids)).all()
+    reference_id = rand(16)
+
+    # Recording fails part way through the run
+    insert = event.insert
+    inserts = []
+
+    def failing_insert(table):
+        inserts.append(table)
+        if len(inserts) > 1:
+            raise RuntimeError("database went away")
+        return insert(table)
+
+    monkeypatch.setattr(event, "insert", failing_insert)
+    monkeypatch.setattr(event, "send_message", lambda message, service=None: {})
+    monkeypatch.setattr(event, "create_message", lambda sender, to, subject, body: {"to": to})
+    monkeypatch.setattr(event, "get_config_int", lambda key, default=None: 1 if key == "EMAIL_RECORD_CHUNK_SIZE" else 100)
+
+    with pytest.raises(RuntimeError):
+        send_email_events(users, reference_id, "test", template_key, {"name": "abc"})
+    db.session.rollback()
+
+    # The first chunk was committed before the failure
+    assert len(get_recorded(reference_id)) == 1
@@ -0,0 +1,166 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from kubernetes import client
+
+from anubis.k8s.pipeline import reap
+from anubis.k8s.pipeline.reap import PipelineJobReaper
+from anubis.k8s.pipeline.tracker import PipelineJobTracker
+from anubis.models import db, Submission
+from anubis.utils.data import rand
+from utils import with_context
+
+
+def gen_job(submission_id: str = None, minutes_ago: int = 0, succeeded: int = None, failed: int = None) -> client.V1Job:
+    return client.V1Job(
+        metadata=client.V1ObjectMeta(
+            name=f"submission-pipeline-{rand(8)}",
+            namespace="anubis",
+            labels={"submission-id": submission_id or rand(8)},
+            creation_timestamp=datetime.utcnow() - timedelta(minutes=minutes_ago),
+        ),
+        spec=client.V1JobSpec(template=client.V1PodTemplateSpec(), backoff_limit=0),
+        status=client.V1JobStatus(succeeded=succeeded, failed=failed),
+    )
+
+
+def gen_pod(phase: str, minutes_ago: int) -> client.V1Pod:
+    return client.V1Pod(
+        metadata=client.V1ObjectMeta(
+            name=f"pod-{rand(8)}",
+            namespace="anubis",
+            creation_timestamp=datetime.utcnow() - timedelta(minutes=minutes_ago),
+        ),
+        status=client.V1PodStatus(phase=phase),
+    )
+
+
+class FakeLock(object):
+    def acquire(self, blocking=True):
+        return True
+
+    def release(self):
+        pass
+
+
+@pytest.fixture
+def tracker():
+    return PipelineJobTracker()
+
+
+def test_tracker_reapable(tracker):
+    running = gen_job()
+    succeeded = gen_job(succeeded=1)
+    failed = gen_job(failed=1)
+    timed_out = gen_job(minutes_ago=10)
+    for job in [running, succeeded, failed, timed_out]:
+        tracker.add(job)
+    assert tracker.active_count == 2
+
+    reapable = tracker.pop_reapable(timedelta(minutes=5))
+    assert {job.metadata.name for job in reapable} == {
+        succeeded.metadata.name,
+        failed.metadata.name,
+        timed_out.metadata.name,
+    }
+
+    # Jobs are only handed out once until they are done
+    assert tracker.pop_reapable(timedelta(minutes=5)) == []
+
+    # Jobs that were not deleted are handed out again
+    tracker.done(failed, deleted=False)
+    tracker.done(succeeded)
+    assert [job.metadata.name for job in tracker.pop_reapable(timedelta(minutes=5))] == [failed.metadata.name]
+    assert tracker.active_count == 2
+
+
+def test_tracker_events(tracker):
+    running = gen_job()
+    finished = gen_job(succeeded=1)
+    with tracker._lock:
+        tracker._replace([running, finished])
+    assert tracker.active_count == 1
+
+    # Jobs missing from a relist are dropped
+    with tracker._lock:
+        tracker._replace([running])
+    assert tracker.pop_reapable(timedelta(minutes=5)) == []
+
+    # The job finishing, then being deleted
+    running.status.succeeded = 1
+    with tracker._lock:
+        tracker._apply("MODIFIED", running)
+    assert tracker.active_count == 0
+    assert tracker.pop_reapable(timedelta(minutes=5)) == [running]
+    with tracker._lock:
+        tracker._apply("DELETED", running)
+    assert tracker._jobs == {}
+
+
+def wait_for_reaper(reaper: PipelineJobReaper):
+    for _ in range(100):
+        reaper.reap()
+        if len(reaper._pending) == 0 and len(reaper._deleting) == 0:
+            return
+        time.sleep(0.01)
+    raise TimeoutError()
+
+
+@with_context
+def test_reaper(tracker, monkeypatch):
+    submission = Submission.query.first()
+    job = gen_job(submission.id, succeeded=1)
+    tracker.add(job)
+
+    deletes = []
+    delete_results = [False, True]
+
+    def delete_pipeline_job(_job):
+        deletes.append(_job)
+        return delete_results.pop(0)
+
+    log = rand(32)
+    monkeypatch.setattr(reap, "create_redis_lock", lambda *_, **__: FakeLock())
+    monkeypatch.setattr(reap, "_read_pipeline_job_log", lambda _job: log)
+    monkeypatch.setattr(reap, "delete_pipeline_job", delete_pipeline_job)
+
+    reaper = PipelineJobReaper(tracker)
+
+    # The log is saved, but the delete fails so the job is kept
+    wait_for_reaper(reaper)
+    db.session.expire_all()
+    assert Submission.query.filter(Submission.id == submission.id).first().pipeline_log == log
+    assert deletes == [job]
+    assert job.metadata.name in tracker._jobs
+
+    # The job is handed out again, and only dropped once it is deleted
+    wait_for_reaper(reaper)
+    assert deletes == [job, job]
+    assert tracker._jobs == {}
+
+
+def test_read_pipeline_job_log(monkeypatch):
+    succeeded = gen_pod("Succeeded", minutes_ago=10)
+    old_failed = gen_pod("Failed", minutes_ago=5)
+    failed = gen_pod("Failed", minutes_ago=1)
+    pods = [old_failed, gen_pod("Running", minutes_ago=0), failed]
+
+    class FakeCoreV1Api(object):
+        def list_namespaced_pod(self, namespace, label_selector):
+            return client.V1PodList(items=pods)
+
+        def read_namespaced_pod_log(self, name, namespace, container):
+            return name
+
+    monkeypatch.setattr(reap.client, "CoreV1Api", FakeCoreV1Api)
+    job = gen_job(failed=1)
+
+    # The most recent failed attempt is used when nothing succeeded
+    assert reap._read_pipeline_job_log(job) == failed.metadata.name
+
+    pods.append(succeeded)
+    assert reap._read_pipeline_job_log(job) == succeeded.metadata.name
+
+    pods.clear()
+    assert reap._read_pipeline_job_log(job) == ''
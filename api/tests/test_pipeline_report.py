@@ -0,0 +1,180 @@
+import pytest
+
+from anubis.app import create_pipeline_app
+from anubis.lms.submissions import init_submission
+from anubis.models import (
+    db,
+    Assignment,
+    AssignmentTest,
+    BestSubmission,
+    Course,
+    Submission,
+    SubmissionTestResult,
+    User,
+)
+from anubis.utils.data import rand
+from utils import with_context, create_user
+
+
+@pytest.fixture(scope="module")
+def client():
+    return create_pipeline_app().test_client()
+
+
+@pytest.fixture
+@with_context
+def submission():
+    netid, _, _ = create_user("student")
+    user = User.query.filter(User.netid == netid).first()
+    assignment = (
+        Assignment.query.join(Course)
+        .join(AssignmentTest, AssignmentTest.assignment_id == Assignment.id)
+        .filter(Course.name == "Intro to OS", AssignmentTest.hidden == False)
+        .first()
+    )
+
+    submission = Submission(owner_id=user.id, assignment_id=assignment.id, commit=rand(40))
+    db.session.add(submission)
+    db.session.commit()
+    init_submission(submission)
+    return submission.id, submission.token
+
+
+@with_context
+def get_test_names(submission_id: str) -> list[str]:
+    submission = Submission.query.filter(Submission.id == submission_id).first()
+    return [
+        test.name
+        for test in AssignmentTest.query.filter(
+            AssignmentTest.assignment_id == submission.assignment_id,
+        ).order_by(AssignmentTest.order).all()
+    ]
+
+
+def post_batch(client, submission_id: str, token: str, report: dict):
+    return client.post(f"/pipeline/report/batch/{submission_id}?token={token}", json=report)
+
+
+def test_batch_report(client, submission):
+    submission_id, token = submission
+    test_names = get_test_names(submission_id)
+
+    r = post_batch(client, submission_id, token, {
+        "build": {"stdout": "build logs", "passed": True},
+        "tests": [
+            {"test_name": name, "passed": index == 0, "message": name, "output_type": "text", "output": "out"}
+            for index, name in enumerate([*test_names, "not a test"])
+        ],
+        "state": "Tests completed",
+        "processed": True,
+    })
+    assert r.status_code == 200
+    assert r.json["data"]["invalid_test_names"] == ["not a test"]
+
+    @with_context
+    def verify():
+        db.session.expire_all()
+        db_submission = Submission.query.filter(Submission.id == submission_id).first()
+        assert db_submission.processed is True
+        assert db_submission.state == "Tests completed"
+        assert db_submission.build.stdout == "build logs"
+        assert db_submission.build.passed is True
+
+        results = {
+            result.assignment_test.name: result
+            for result in SubmissionTestResult.query.filter(SubmissionTestResult.submission_id == submission_id)
+        }
+        assert set(results) == set(test_names)
+        assert [results[name].passed for name in test_names] == [index == 0 for index in range(len(test_names))]
+        assert results[test_names[0]].message == test_names[0]
+
+        best = BestSubmission.query.filter(BestSubmission.owner_id == db_submission.owner_id).first()
+        assert best.submission_id == submission_id
+        assert best.tests_passed == 1
+
+    verify()
+
+
+def test_batch_report_missing_result(client, submission):
+    submission_id, token = submission
+    test_names = get_test_names(submission_id)
+
+    @with_context
+    def delete_result():
+        result = (
+            SubmissionTestResult.query.join(AssignmentTest)
+            .filter(SubmissionTestResult.submission_id == submission_id, AssignmentTest.name == test_names[0])
+            .first()
+        )
+        db.session.delete(result)
+        db.session.commit()
+
+    delete_result()
+
+    # Like single test reports, tests without a result are not accepted
+    r = post_batch(client, submission_id, token, {
+        "tests": [
+            {"test_name": name, "passed": True, "message": name, "output_type": "text", "output": "out"}
+            for name in test_names
+        ],
+    })
+    assert r.status_code == 200
+    assert r.json["data"]["invalid_test_names"] == [test_names[0]]
+
+    @with_context
+    def verify():
+        results = {
+            result.assignment_test.name: result
+            for result in SubmissionTestResult.query.filter(SubmissionTestResult.submission_id == submission_id)
+        }
+        assert set(results) == set(test_names[1:])
+        assert all(result.passed for result in results.values())
+
+    verify()
+
+
+def test_batch_report_build_failed(client, submission):
+    submission_id, token = submission
+
+    r = post_batch(client, submission_id, token, {"build": {"stdout": "error", "passed": False}})
+    assert r.status_code == 200
+
+    @with_context
+    def verify():
+        db_submission = Submission.query.filter(Submission.id == submission_id).first()
+        assert db_submission.processed is True
+        assert db_submission.state == "Build did not succeed"
+
+    verify()
+
+
+@pytest.mark.parametrize("report", [
+    {"build": {"stdout": "logs"}},
+    {"tests": {"test_name": "test 0"}},
+    {"tests": [{"test_name": "test 0", "passed": "yes", "message": "", "output_type": "text", "output": ""}]},
+    {"state": 1},
+    {"processed": "1"},
+])
+def test_batch_report_malformed(client, submission, report):
+    submission_id, token = submission
+
+    r = post_batch(client, submission_id, token, {"state": "should not be saved", **report})
+    assert r.status_code == 406
+
+    @with_context
+    def verify():
+        db_submission = Submission.query.filter(Submission.id == submission_id).first()
+        assert db_submission.state != "should not be saved"
+        assert all(
+            result.message is None
+            for result in SubmissionTestResult.query.filter(SubmissionTestResult.submission_id == submission_id)
+        )
+
+    verify()
+
+
+def test_batch_report_token(client, submission):
+    submission_id, token = submission
+
+    assert post_batch(client, submission_id, "bad", {"state": "x"}).status_code == 406
+    assert post_batch(client, "bad", token, {"state": "x"}).status_code == 406
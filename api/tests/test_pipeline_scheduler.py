@@ -0,0 +1,136 @@
+import pytest
+
+from anubis.k8s.pipeline import create, scheduler
+from anubis.k8s.pipeline.scheduler import (
+    PRIORITY_BULK_REGRADE,
+    PRIORITY_PUSH,
+    PRIORITY_REGRADE,
+    admit_scheduled_pipelines,
+    get_pipeline_scheduler_stats,
+    pop_scheduled_submissions,
+    schedule_submission_pipelines,
+)
+from anubis.models import db, Assignment, Submission, User
+from anubis.utils.data import rand
+from anubis.utils.redis import redis
+from utils import with_context, create_user
+
+
+class FakeTracker(object):
+    def __init__(self, active_count: int = 0):
+        self.active_count = active_count
+        self.jobs = []
+
+    def add(self, job):
+        self.jobs.append(job)
+        self.active_count += 1
+
+
+@pytest.fixture(autouse=True)
+def clear_scheduler():
+    keys = [scheduler._PENDING_KEY, scheduler._DEPTH_KEY]
+    for priority in scheduler.PRIORITIES:
+        keys.append(scheduler._owners_key(priority))
+        keys.append(scheduler._waits_key(priority))
+        keys.extend(redis.keys(scheduler._owner_queue_prefix(priority) + "*"))
+    redis.delete(*keys)
+    yield
+
+
+def create_submissions(n: int) -> list[str]:
+    netid, _, _ = create_user("student")
+    user = User.query.filter(User.netid == netid).first()
+    assignment = Assignment.query.first()
+
+    submissions = [
+        Submission(owner_id=user.id, assignment_id=assignment.id, commit=rand(40))
+        for _ in range(n)
+    ]
+    db.session.add_all(submissions)
+    db.session.commit()
+    return [submission.id for submission in submissions]
+
+
+@with_context
+def test_schedule_skips_pending():
+    submission_ids = create_submissions(2)
+
+    assert schedule_submission_pipelines(submission_ids) == 2
+    assert schedule_submission_pipelines(submission_ids) == 0
+    assert schedule_submission_pipelines(submission_ids, PRIORITY_REGRADE) == 0
+    assert get_pipeline_scheduler_stats()["push"]["depth"] == 2
+
+    assert pop_scheduled_submissions(10) == [(submission_id, PRIORITY_PUSH) for submission_id in submission_ids]
+    assert schedule_submission_pipelines(submission_ids) == 2
+
+
+@with_context
+def test_pop_priority_order():
+    bulk = create_submissions(1)
+    regrade = create_submissions(1)
+    push = create_submissions(1)
+
+    schedule_submission_pipelines(bulk, PRIORITY_BULK_REGRADE)
+    schedule_submission_pipelines(regrade, PRIORITY_REGRADE)
+    schedule_submission_pipelines(push, PRIORITY_PUSH)
+
+    assert pop_scheduled_submissions(2) == [(push[0], PRIORITY_PUSH), (regrade[0], PRIORITY_REGRADE)]
+    assert pop_scheduled_submissions(2) == [(bulk[0], PRIORITY_BULK_REGRADE)]
+    assert pop_scheduled_submissions(2) == []
+
+
+@with_context
+def test_pop_fair_share():
+    a = create_submissions(3)
+    b = create_submissions(1)
+    c = create_submissions(2)
+
+    schedule_submission_pipelines(a)
+    schedule_submission_pipelines(b)
+    schedule_submission_pipelines(c)
+
+    # One owner can not starve the others
+    order = [submission_id for submission_id, _ in pop_scheduled_submissions(10)]
+    assert order == [a[0], b[0], c[0], a[1], c[1], a[2]]
+
+    stats = get_pipeline_scheduler_stats()
+    assert stats["push"]["depth"] == 0
+    assert stats["push"]["owners"] == 0
+    assert stats["push"]["max_wait"] is not None
+
+
+@with_context
+def test_admit_free_slots(monkeypatch):
+    submission_ids = create_submissions(3)
+    schedule_submission_pipelines(submission_ids)
+
+    created = []
+    monkeypatch.setattr(create, "create_submission_pipeline", lambda submission_id: created.append(submission_id))
+    monkeypatch.setattr(scheduler, "get_config_int", lambda *_, **__: 2)
+
+    # No room for more jobs
+    assert admit_scheduled_pipelines(FakeTracker(active_count=2)) == []
+    assert created == []
+
+    assert admit_scheduled_pipelines(FakeTracker(active_count=1)) == submission_ids[:1]
+    assert admit_scheduled_pipelines(FakeTracker()) == submission_ids[1:]
+    assert created == submission_ids
+
+
+@with_context
+def test_admit_failed_rescheduled(monkeypatch):
+    push = create_submissions(1)
+    regrade = create_submissions(1)
+    schedule_submission_pipelines(push, PRIORITY_PUSH)
+    schedule_submission_pipelines(regrade, PRIORITY_REGRADE)
+
+    def create_submission_pipeline(submission_id: str):
+        if submission_id in regrade:
+            raise Exception("unable to create job")
+
+    monkeypatch.setattr(create, "create_submission_pipeline", create_submission_pipeline)
+    monkeypatch.setattr(scheduler, "get_config_int", lambda *_, **__: 10)
+
+    # The failed submission goes back in the scheduler with its priority
+    assert admit_scheduled_pipelines(FakeTracker()) == push
+    assert pop_scheduled_submissions(10) == [(regrade[0], PRIORITY_REGRADE)]
@@ -0,0 +1,173 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from anubis.lms import repo_index
+from anubis.lms.assignments import delete_assignment
+from anubis.lms.repo_index import (
+    get_indexed_assignment,
+    get_indexed_repo,
+    index_assignments,
+    index_course,
+    index_repos,
+    unindex_repo,
+)
+from anubis.models import db, Assignment, AssignmentRepo, Course, User
+from anubis.utils.data import rand
+from utils import with_context, create_user
+
+
+@pytest.fixture
+@with_context
+def assignment_id():
+    course = Course.query.filter(Course.name == "Intro to OS").first()
+    now = datetime.now()
+    assignment = Assignment(
+        name=f"repo index {rand(8)}",
+        unique_code=rand(8),
+        hidden=True,
+        pipeline_image="registry.digitalocean.com/anubis/assignment/test",
+        release_date=now - timedelta(days=1),
+        due_date=now + timedelta(days=1),
+        grace_date=now + timedelta(days=1),
+        course_id=course.id,
+        accept_late=True,
+    )
+    db.session.add(assignment)
+    db.session.commit()
+    return assignment.id
+
+
+def get_repo_name(assignment: Assignment, netid: str) -> str:
+    return f"{assignment.course.course_code}-{assignment.unique_code}-{netid}"
+
+
+@with_context
+def test_indexed_assignment(assignment_id):
+    assignment = Assignment.query.filter(Assignment.id == assignment_id).first()
+    repo_name = get_repo_name(assignment, "abc123")
+
+    entry = get_indexed_assignment(repo_name)
+    assert entry["id"] == assignment.id
+    assert entry["unique_code"] == assignment.unique_code
+    assert entry["github_org"] == assignment.course.github_org
+    assert entry["accept_late"] is True
+
+    assert get_indexed_assignment("not-an-assignment") is None
+    assert get_indexed_assignment("") is None
+
+    # Settings changes are picked up once the assignment is reindexed
+    assignment.accept_late = False
+    db.session.commit()
+    index_assignments([assignment])
+    assert get_indexed_assignment(repo_name)["accept_late"] is False
+
+
+@with_context
+def test_indexed_assignment_course_change(assignment_id):
+    assignment = Assignment.query.filter(Assignment.id == assignment_id).first()
+    course = assignment.course
+    repo_name = get_repo_name(assignment, "abc123")
+    github_org = course.github_org
+
+    assert get_indexed_assignment(repo_name)["github_org"] == github_org
+    try:
+        course.github_org = "other-org"
+        db.session.commit()
+        index_course(course)
+        assert get_indexed_assignment(repo_name)["github_org"] == "other-org"
+    finally:
+        course.github_org = github_org
+        db.session.commit()
+        index_course(course)
+
+
+@with_context
+def test_indexed_assignment_deleted(assignment_id):
+    assignment = Assignment.query.filter(Assignment.id == assignment_id).first()
+    repo_name = get_repo_name(assignment, "abc123")
+    assert get_indexed_assignment(repo_name) is not None
+
+    delete_assignment(assignment)
+    assert get_indexed_assignment(repo_name) is None
+
+
+@with_context
+def test_indexed_repo(assignment_id):
+    netid, _, _ = create_user("student")
+    user = User.query.filter(User.netid == netid).first()
+    repo = AssignmentRepo(
+        owner_id=user.id,
+        assignment_id=assignment_id,
+        netid=netid,
+        repo_url=f"https://github.com/os3224/{rand(16)}",
+    )
+    db.session.add(repo)
+    db.session.commit()
+
+    # Looked up from the database, then from the index
+    for _ in range(2):
+        assert get_indexed_repo(repo.repo_url) == {
+            "assignment_id": assignment_id,
+            "repo_id":       repo.id,
+            "owner_id":      user.id,
+        }
+    assert get_indexed_repo(repo.repo_url + "-missing") is None
+
+    # Dangling repos are indexed without an owner until they are claimed
+    repo.owner_id = None
+    db.session.commit()
+    unindex_repo(repo.repo_url)
+    assert get_indexed_repo(repo.repo_url)["owner_id"] is None
+
+    repo.owner_id = user.id
+    db.session.commit()
+    index_repos([repo])
+    assert get_indexed_repo(repo.repo_url)["owner_id"] == user.id
+
+
+@with_context
+def test_local_index_generation(assignment_id, monkeypatch):
+    assignment = Assignment.query.filter(Assignment.id == assignment_id).first()
+    repo_name = get_repo_name(assignment, "abc123")
+    assert get_indexed_assignment(repo_name)["accept_late"] is True
+
+    # Another process changes the assignment without this one knowing
+    Assignment.query.filter(Assignment.id == assignment_id).update({"accept_late": False})
+    db.session.commit()
+    monkeypatch.setattr(repo_index, "_redis_hmget", lambda key, fields: [None] * len(fields))
+    assert get_indexed_assignment(repo_name)["accept_late"] is True
+
+    # The local index is dropped when the generation changes
+    monkeypatch.setattr(repo_index, "_get_generation", lambda: rand(8).encode())
+    monkeypatch.setattr(repo_index, "_local_checked", 0.0)
+    assert get_indexed_assignment(repo_name)["accept_late"] is False
+
+
+@with_context
+def test_index_repos_generation(assignment_id, monkeypatch):
+    netid, _, _ = create_user("student")
+    user = User.query.filter(User.netid == netid).first()
+    repo = AssignmentRepo(
+        owner_id=None,
+        assignment_id=assignment_id,
+        netid=netid,
+        repo_url=f"https://github.com/os3224/{rand(16)}",
+    )
+    db.session.add(repo)
+    db.session.commit()
+
+    bumps = []
+    monkeypatch.setattr(repo_index, "_bump_generation", lambda: bumps.append(1))
+
+    # New and unchanged entries do not need other processes to drop theirs
+    index_repos([repo])
+    index_repos([repo])
+    assert bumps == []
+
+    # A changed entry does
+    repo.owner_id = user.id
+    db.session.commit()
+    index_repos([repo])
+    assert bumps == [1]
+    assert get_indexed_repo(repo.repo_url)["owner_id"] == user.id
@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+
+from anubis.github import repos
+from anubis.github.repos import verify_collaborators_assignments
+from anubis.models import db, Assignment, AssignmentRepo, Course, User
+from anubis.utils.data import rand
+from utils import with_context, create_user
+
+
+def get_student() -> User:
+    netid, _, _ = create_user("student")
+    return User.query.filter(User.netid == netid).first()
+
+
+def create_repo(assignment: Assignment, user: User, repo_name: str):
+    db.session.add(AssignmentRepo(
+        owner_id=user.id,
+        assignment_id=assignment.id,
+        netid=user.netid,
+        repo_url=f"https://github.com/{assignment.course.github_org}/{repo_name}",
+    ))
+
+
+@with_context
+def test_verify_collaborators_assignments(monkeypatch):
+    course = Course.query.filter(Course.name == "Intro to OS").first()
+    now = datetime.now()
+    assignment = Assignment(
+        name=f"verify collaborators {rand(8)}",
+        unique_code=rand(8),
+        hidden=True,
+        pipeline_image="registry.digitalocean.com/anubis/assignment/test",
+        release_date=now - timedelta(days=1),
+        due_date=now + timedelta(days=1),
+        grace_date=now + timedelta(days=1),
+        course_id=course.id,
+    )
+    db.session.add(assignment)
+    db.session.flush()
+
+    complete, missing, group_a, group_b, no_github = (get_student() for _ in range(5))
+    no_github.github_username = None
+
+    create_repo(assignment, complete, "complete")
+    create_repo(assignment, missing, "missing")
+    create_repo(assignment, group_a, "group")
+    create_repo(assignment, group_b, "group")
+    create_repo(assignment, no_github, "group")
+    create_repo(assignment, no_github, "no-github")
+    db.session.commit()
+
+    github_org = course.github_org
+    collaborators = {
+        "complete": [complete.github_username],
+        "missing":  [],
+        "group":    [group_a.github_username],
+    }
+    queried = []
+
+    def github_graphql(query, variables):
+        repo_names = [variables[f"n{i}"] for i in range(len(variables) // 2)]
+        queried.extend(repo_names)
+        return {
+            f"r{i}": {"collaborators": {"nodes": [{"login": login} for login in collaborators[repo_name]]}}
+            for i, repo_name in enumerate(repo_names)
+        }
+
+    added = []
+    monkeypatch.setattr(repos, "github_graphql", github_graphql)
+    monkeypatch.setattr(repos, "add_collaborator", lambda *args: added.append(args))
+
+    verify_collaborators_assignments([assignment])
+
+    # Repos are listed once, and only the missing collaborators are added
+    assert sorted(queried) == ["complete", "group", "missing"]
+    assert sorted(added) == sorted([
+        (github_org, "missing", missing.github_username),
+        (github_org, "group", group_b.github_username),
+    ])
@@ -0,0 +1,98 @@
+import pytest
+
+from anubis.lms.webhook import process_push_events, record_push_event
+from anubis.models import db, Assignment, Course, Submission, User, WebhookEvent
+from anubis.rpc import enqueue
+from anubis.utils.data import rand
+from anubis.utils.exceptions import AssertError
+from utils import with_context, create_user
+
+
+def gen_push(assignment: Assignment, github_username: str, commit: str = None, ref: str = "refs/heads/main") -> dict:
+    name = f"{assignment.name}-{assignment.unique_code}-{github_username}"
+    return {
+        "ref": ref,
+        "repository": {
+            "html_url": f"https://github.com/{assignment.course.github_org}/{name}",
+            "name": name,
+            "default_branch": "main",
+        },
+        "pusher": {
+            "name": github_username,
+        },
+        "after": commit or rand(40),
+        "before": rand(40),
+    }
+
+
+@pytest.fixture
+@with_context
+def student():
+    netid, _, _ = create_user("student")
+    return User.query.filter(User.netid == netid).first().github_username
+
+
+def get_assignment() -> Assignment:
+    return Assignment.query.join(Course).filter(Course.name == "Intro to OS").first()
+
+
+@with_context
+def test_record_push_event_dedup(student):
+    push = gen_push(get_assignment(), student)
+    delivery_id = rand(16)
+
+    event = record_push_event(push, delivery_id)
+    assert event is not None
+    assert event.ref == "refs/heads/main"
+    assert event.processed is False
+
+    # Github retrying the delivery
+    assert record_push_event(push, delivery_id) is None
+
+    # The same commit pushed again
+    assert record_push_event(push, rand(16)) is None
+    assert record_push_event(push) is None
+
+
+@with_context
+def test_record_push_event_other_ref(student):
+    assignment = get_assignment()
+    commit = rand(40)
+
+    # The same commit on another branch, then on the default branch
+    assert record_push_event(gen_push(assignment, student, commit, ref="refs/heads/feature")) is not None
+    assert record_push_event(gen_push(assignment, student, commit)) is not None
+    assert record_push_event(gen_push(assignment, student, commit)) is None
+
+
+@with_context
+def test_record_push_event_malformed():
+    with pytest.raises(AssertError):
+        record_push_event({"repository": {}})
+
+
+@with_context
+def test_process_push_events(student, monkeypatch):
+    assignment = get_assignment()
+    pushes = [
+        gen_push(assignment, student),
+        gen_push(assignment, student, ref="refs/heads/feature"),
+        gen_push(assignment, student + "-unknown"),
+    ]
+    event_ids = [record_push_event(push).id for push in pushes]
+
+    enqueued = []
+    monkeypatch.setattr(enqueue, "enqueue_autograde_pipelines", lambda submission_ids, **_: enqueued.extend(submission_ids))
+
+    assert process_push_events(max_seconds=30) >= len(event_ids)
+
+    db.session.expire_all()
+    events = {event.id: event for event in WebhookEvent.query.filter(WebhookEvent.id.in_(event_ids))}
+    assert all(event.processed for event in events.values())
+    assert events[event_ids[0]].result == "submission accepted"
+    assert "not a push to default branch" in events[event_ids[1]].result
+    assert "dangling submission" in events[event_ids[2]].result
+
+    submission = Submission.query.filter(Submission.commit == pushes[0]["after"]).first()
+    assert submission is not None
+    assert enqueued == [submission.id]